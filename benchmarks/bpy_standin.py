@@ -0,0 +1,249 @@
+# Copyright (c) 2022 Tomas Karabela
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Lightweight stand-in for the `bpy` module, for benchmarking the add-on outside Blender
+
+Only the parts of the API used when building meshes are implemented: mesh element
+collections store their data in NumPy arrays and ``foreach_set()`` copies the given
+array into them (converting dtype like Blender does), so that the benchmarks measure
+the array path of the add-on itself. Work done by Blender (``mesh.update()``,
+``mesh.validate()``) is not emulated - use the import profile inside Blender to measure that.
+
+Call `install()` before importing `blender_ensightreader`.
+
+"""
+
+import sys
+import types
+from typing import Dict, Tuple, Any
+import numpy as np
+
+
+class ElementCollection:
+    """Mesh vertices/loops/polygons/edges, or attribute data"""
+
+    def __init__(self, fields: Dict[str, Tuple[Any, int]], length: int = 0):
+        self._fields = fields
+        self._arrays = {name: np.zeros((length * k,), dtype=dtype) for name, (dtype, k) in fields.items()}
+        self._length = length
+
+    def __len__(self) -> int:
+        return self._length
+
+    def add(self, count: int):
+        self._length += count
+        for name, (dtype, k) in self._fields.items():
+            arr = np.zeros((self._length * k,), dtype=dtype)
+            old = self._arrays[name]
+            arr[:old.shape[0]] = old
+            self._arrays[name] = arr
+
+    def foreach_set(self, name: str, seq):
+        arr = self._arrays[name]
+        values = np.asarray(seq)
+        if values.size != arr.shape[0]:
+            raise RuntimeError(f"internal error setting the array ({name}: expected {arr.shape[0]}, got {values.size})")
+        np.copyto(arr, values.reshape(-1), casting="unsafe")
+
+    def foreach_get(self, name: str, seq):
+        np.copyto(seq, self._arrays[name].reshape(seq.shape), casting="unsafe")
+
+
+class Attribute:
+    def __init__(self, name: str, data_type: str, domain: str, length: int):
+        self.name = name
+        self.data_type = data_type
+        self.domain = domain
+        if data_type == "FLOAT_VECTOR":
+            fields = {"vector": (np.float32, 3)}
+        elif data_type == "INT":
+            fields = {"value": (np.int32, 1)}
+        else:
+            fields = {"value": (np.float32, 1)}
+        self.data = ElementCollection(fields, length)
+
+
+class AttributeCollection:
+    def __init__(self, mesh: "Mesh"):
+        self._mesh = mesh
+        self._attributes: Dict[str, Attribute] = {}
+
+    def new(self, name: str, data_type: str, domain: str) -> Attribute:
+        length = {"POINT": len(self._mesh.vertices), "EDGE": len(self._mesh.edges),
+                  "FACE": len(self._mesh.polygons), "CORNER": len(self._mesh.loops)}[domain]
+        attr = self._attributes[name] = Attribute(name, data_type, domain, length)
+        return attr
+
+    def get(self, name: str, default=None):
+        return self._attributes.get(name, default)
+
+    def __getitem__(self, name: str) -> Attribute:
+        return self._attributes[name]
+
+    def __iter__(self):
+        return iter(self._attributes.values())
+
+
+class ID:
+    """Datablock with custom properties"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._properties: Dict[str, Any] = {}
+
+    def __getitem__(self, key: str):
+        return self._properties[key]
+
+    def __setitem__(self, key: str, value):
+        self._properties[key] = value
+
+    def __delitem__(self, key: str):
+        del self._properties[key]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._properties
+
+    def get(self, key: str, default=None):
+        return self._properties.get(key, default)
+
+    def keys(self):
+        return self._properties.keys()
+
+
+class Mesh(ID):
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.vertices = ElementCollection({"co": (np.float32, 3)})
+        self.edges = ElementCollection({"vertices": (np.int32, 2)})
+        self.loops = ElementCollection({"vertex_index": (np.int32, 1)})
+        self.polygons = ElementCollection({"loop_start": (np.int32, 1), "loop_total": (np.int32, 1)})
+        self.attributes = AttributeCollection(self)
+        self.materials = []
+
+    def update(self, *args, **kwargs):
+        pass
+
+    def validate(self, *args, **kwargs) -> bool:
+        return False
+
+
+class Object(ID):
+    def __init__(self, name: str, data):
+        super().__init__(name)
+        self.data = data
+        self.type = "MESH" if isinstance(data, Mesh) else "EMPTY"
+
+
+class Material(ID):
+    pass
+
+
+class DataCollection:
+    def __init__(self, factory):
+        self._factory = factory
+        self._items = []
+
+    def new(self, name: str, *args):
+        item = self._factory(name, *args)
+        self._items.append(item)
+        return item
+
+    def remove(self, item):
+        self._items.remove(item)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+
+class BlendData:
+    def __init__(self):
+        self.meshes = DataCollection(Mesh)
+        self.objects = DataCollection(Object)
+        self.materials = DataCollection(Material)
+
+    def batch_remove(self, ids):
+        for item in ids:
+            for collection in (self.meshes, self.objects, self.materials):
+                if item in collection._items:
+                    collection.remove(item)
+
+
+class Operator:
+    def report(self, level, message: str):
+        pass
+
+    def as_keywords(self, ignore=()) -> Dict[str, Any]:
+        return {}
+
+
+def _property(**kwargs):
+    return kwargs
+
+
+def _persistent(func):
+    return func
+
+
+def install():
+    """Register the stand-in modules in `sys.modules` (does nothing if they're there already)"""
+    if "bpy" in sys.modules:
+        return
+
+    bpy = types.ModuleType("bpy")
+    bpy.data = BlendData()
+    bpy.context = None
+
+    bpy.types = types.ModuleType("bpy.types")
+    for cls in (Operator, Object, Mesh, Material, ID):
+        setattr(bpy.types, cls.__name__, cls)
+
+    bpy.props = types.ModuleType("bpy.props")
+    for name in ("StringProperty", "IntProperty", "BoolProperty", "FloatProperty", "EnumProperty",
+                 "FloatVectorProperty", "IntVectorProperty", "PointerProperty", "CollectionProperty"):
+        setattr(bpy.props, name, _property)
+
+    bpy.app = types.ModuleType("bpy.app")
+    bpy.app.background = True
+    bpy.app.version_string = "bpy stand-in"
+    bpy.app.handlers = types.ModuleType("bpy.app.handlers")
+    bpy.app.handlers.persistent = _persistent
+    bpy.app.handlers.frame_change_pre = []
+
+    bpy.path = types.ModuleType("bpy.path")
+    bpy.path.abspath = lambda path: path
+
+    bpy_extras = types.ModuleType("bpy_extras")
+    bpy_extras.io_utils = types.ModuleType("bpy_extras.io_utils")
+    bpy_extras.io_utils.ImportHelper = type("ImportHelper", (), {})
+
+    sys.modules.update({
+        "bpy": bpy,
+        "bpy.types": bpy.types,
+        "bpy.props": bpy.props,
+        "bpy.app": bpy.app,
+        "bpy.app.handlers": bpy.app.handlers,
+        "bpy.path": bpy.path,
+        "bpy_extras": bpy_extras,
+        "bpy_extras.io_utils": bpy_extras.io_utils,
+    })
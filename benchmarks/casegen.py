@@ -0,0 +1,467 @@
+#!/usr/bin/env python
+# Copyright (c) 2022 Tomas Karabela
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Generator of synthetic EnSight Gold "C Binary" cases
+
+Each part has one element block per requested element type, each block with its own
+grid of nodes: surface elements (``tria3``, ``quad4``, ``quad8``, ``nsided``) are made from
+a rectangular grid, ``bar2`` and ``bar3`` from a polyline and volume elements (``hexa8``, ``tetra4``)
+from a box grid. All arrays are generated and written in chunks, so that cases with
+100M elements can be written with modest memory.
+
+Usage::
+
+    python benchmarks/casegen.py --elements 1M --element-types quad4,hexa8 --parts 4 out/
+
+"""
+
+import argparse
+import math
+import os
+import os.path as op
+from typing import List, BinaryIO, Iterator, Tuple
+import numpy as np
+
+
+ELEMENT_TYPES = ["tria3", "quad4", "quad8", "nsided", "bar2", "bar3", "hexa8", "tetra4"]
+
+CHUNK_SIZE = 1 << 20  # nodes or elements generated at once
+
+# Kuhn decomposition of hexahedron into 6 tetrahedra, vertices of the hexahedron
+# are numbered by bits (x, y, z) of their position
+_KUHN_TETRAS = [(0, 1, 3, 7), (0, 1, 5, 7), (0, 2, 3, 7), (0, 2, 6, 7), (0, 4, 5, 7), (0, 4, 6, 7)]
+
+
+def parse_size(s: str) -> int:
+    """Parse number like ``10000``, ``10k``, ``1.5M`` or ``1G``"""
+    s = s.strip().upper()
+    multiplier = {"K": 10**3, "M": 10**6, "G": 10**9}.get(s[-1:], 1)
+    if multiplier != 1:
+        s = s[:-1]
+    return int(float(s) * multiplier)
+
+
+def write_line(fp: BinaryIO, s: str):
+    fp.write(s.encode("ascii").ljust(80, b"\0"))
+
+
+def write_ints(fp: BinaryIO, arr):
+    np.asarray(arr, dtype="<i4").tofile(fp)
+
+
+def write_floats(fp: BinaryIO, arr):
+    np.asarray(arr, dtype="<f4").tofile(fp)
+
+
+class Block:
+    """
+    Element block of synthetic part, with its own grid of nodes
+
+    Subclasses define the grid and its connectivity; nodes are numbered from 0
+    within the block and shifted by ``node_offset`` when written.
+    """
+    element_type = ""
+    dimension = 2
+
+    def __init__(self, number_of_elements: int, origin: Tuple[float, float, float]):
+        self.origin = origin
+        self.node_offset = 0
+        self.setup(number_of_elements)
+
+    def setup(self, number_of_elements: int):
+        raise NotImplementedError
+
+    @property
+    def number_of_nodes(self) -> int:
+        raise NotImplementedError
+
+    @property
+    def number_of_elements(self) -> int:
+        raise NotImplementedError
+
+    def node_coordinates(self, start: int, stop: int) -> np.ndarray:
+        """Return ``(stop-start, 3)`` array with coordinates of given nodes"""
+        raise NotImplementedError
+
+    def iter_connectivity(self) -> Iterator[np.ndarray]:
+        """Yield ``(n, k)`` arrays of 0-based node indices, in chunks"""
+        raise NotImplementedError
+
+    def write(self, fp: BinaryIO):
+        write_line(fp, self.element_type)
+        write_ints(fp, [self.number_of_elements])
+        for connectivity in self.iter_connectivity():
+            write_ints(fp, connectivity + (self.node_offset + 1))
+
+
+class SurfaceBlock(Block):
+    element_type = "quad4"
+    elements_per_cell = 1
+
+    def setup(self, number_of_elements: int):
+        cells = max(1, -(-number_of_elements // self.elements_per_cell))
+        self.cx = max(1, math.isqrt(cells))
+        self.cy = -(-cells // self.cx)
+
+    @property
+    def number_of_nodes(self) -> int:
+        return (self.cx + 1) * (self.cy + 1)
+
+    @property
+    def number_of_elements(self) -> int:
+        return self.cx * self.cy * self.elements_per_cell
+
+    def node_coordinates(self, start: int, stop: int) -> np.ndarray:
+        n = np.arange(start, stop, dtype=np.int64)
+        j, i = np.divmod(n, self.cx + 1)
+        x0, y0, z0 = self.origin
+        return np.stack([x0 + i, y0 + j, np.full(n.shape, z0)], axis=1).astype(np.float32)
+
+    def iter_cells(self) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+        """Yield corner nodes ``(a, b, c, d)`` of grid cells in counter-clockwise order, in chunks"""
+        w = self.cx + 1
+        rows_per_chunk = max(1, CHUNK_SIZE // self.cx)
+        for row_start in range(0, self.cy, rows_per_chunk):
+            rows = np.arange(row_start, min(row_start + rows_per_chunk, self.cy), dtype=np.int64)
+            a = (rows[:, np.newaxis] * w + np.arange(self.cx)).ravel()
+            yield a, a + 1, a + 1 + w, a + w
+
+    def iter_connectivity(self) -> Iterator[np.ndarray]:
+        for a, b, c, d in self.iter_cells():
+            yield np.stack([a, b, c, d], axis=1)
+
+
+class TriaBlock(SurfaceBlock):
+    element_type = "tria3"
+    elements_per_cell = 2
+
+    def iter_connectivity(self) -> Iterator[np.ndarray]:
+        for a, b, c, d in self.iter_cells():
+            yield np.stack([np.stack([a, b, c], axis=1), np.stack([a, c, d], axis=1)], axis=1).reshape((-1, 3))
+
+
+class NsidedBlock(SurfaceBlock):
+    element_type = "nsided"
+
+    def write(self, fp: BinaryIO):
+        # grid cells written as 4-sided polygons: counts of all elements come first, then connectivity
+        write_line(fp, self.element_type)
+        write_ints(fp, [self.number_of_elements])
+        for start in range(0, self.number_of_elements, CHUNK_SIZE):
+            write_ints(fp, np.full((min(CHUNK_SIZE, self.number_of_elements - start),), 4))
+        for connectivity in self.iter_connectivity():
+            write_ints(fp, connectivity + (self.node_offset + 1))
+
+
+class Quad8Block(SurfaceBlock):
+    element_type = "quad8"
+
+    # nodes are on a grid with half the cell size: cell corners, edge midpoints (and unused cell centers)
+
+    @property
+    def number_of_nodes(self) -> int:
+        return (2*self.cx + 1) * (2*self.cy + 1)
+
+    def node_coordinates(self, start: int, stop: int) -> np.ndarray:
+        n = np.arange(start, stop, dtype=np.int64)
+        j, i = np.divmod(n, 2*self.cx + 1)
+        x0, y0, z0 = self.origin
+        return np.stack([x0 + 0.5*i, y0 + 0.5*j, np.full(n.shape, z0)], axis=1).astype(np.float32)
+
+    def iter_connectivity(self) -> Iterator[np.ndarray]:
+        w = 2*self.cx + 1
+        rows_per_chunk = max(1, CHUNK_SIZE // self.cx)
+        for row_start in range(0, self.cy, rows_per_chunk):
+            rows = np.arange(row_start, min(row_start + rows_per_chunk, self.cy), dtype=np.int64)
+            a = (rows[:, np.newaxis] * (2*w) + 2*np.arange(self.cx)).ravel()
+            # corners counter-clockwise, then midpoints of edges starting from the first corner
+            yield np.stack([a, a + 2, a + 2 + 2*w, a + 2*w, a + 1, a + 2 + w, a + 1 + 2*w, a + w], axis=1)
+
+
+class BarBlock(Block):
+    element_type = "bar2"
+    dimension = 1
+
+    def setup(self, number_of_elements: int):
+        self.n = max(1, number_of_elements)
+
+    @property
+    def number_of_nodes(self) -> int:
+        return self.n + 1
+
+    @property
+    def number_of_elements(self) -> int:
+        return self.n
+
+    def node_coordinates(self, start: int, stop: int) -> np.ndarray:
+        t = np.arange(start, stop, dtype=np.float64)
+        x0, y0, z0 = self.origin
+        return np.stack([x0 + 0.01*t, y0 + np.sin(0.01*t), np.full(t.shape, z0)], axis=1).astype(np.float32)
+
+    def iter_connectivity(self) -> Iterator[np.ndarray]:
+        for start in range(0, self.n, CHUNK_SIZE):
+            a = np.arange(start, min(start + CHUNK_SIZE, self.n), dtype=np.int64)
+            yield np.stack([a, a + 1], axis=1)
+
+
+class Bar3Block(BarBlock):
+    element_type = "bar3"
+
+    @property
+    def number_of_nodes(self) -> int:
+        return 2*self.n + 1
+
+    def node_coordinates(self, start: int, stop: int) -> np.ndarray:
+        # the same polyline as bar2, with midpoints
+        t = 0.5 * np.arange(start, stop, dtype=np.float64)
+        x0, y0, z0 = self.origin
+        return np.stack([x0 + 0.01*t, y0 + np.sin(0.01*t), np.full(t.shape, z0)], axis=1).astype(np.float32)
+
+    def iter_connectivity(self) -> Iterator[np.ndarray]:
+        for start in range(0, self.n, CHUNK_SIZE):
+            a = 2*np.arange(start, min(start + CHUNK_SIZE, self.n), dtype=np.int64)
+            yield np.stack([a, a + 2, a + 1], axis=1)
+
+
+class HexaBlock(Block):
+    element_type = "hexa8"
+    dimension = 3
+    elements_per_cell = 1
+
+    def setup(self, number_of_elements: int):
+        cells = max(1, -(-number_of_elements // self.elements_per_cell))
+        self.cx = max(1, round(cells ** (1/3)))
+        self.cy = max(1, round(math.sqrt(cells / self.cx)))
+        self.cz = -(-cells // (self.cx * self.cy))
+
+    @property
+    def number_of_nodes(self) -> int:
+        return (self.cx + 1) * (self.cy + 1) * (self.cz + 1)
+
+    @property
+    def number_of_elements(self) -> int:
+        return self.cx * self.cy * self.cz * self.elements_per_cell
+
+    def node_coordinates(self, start: int, stop: int) -> np.ndarray:
+        n = np.arange(start, stop, dtype=np.int64)
+        w, h = self.cx + 1, self.cy + 1
+        k, rest = np.divmod(n, w*h)
+        j, i = np.divmod(rest, w)
+        x0, y0, z0 = self.origin
+        return np.stack([x0 + i, y0 + j, z0 + k], axis=1).astype(np.float32)
+
+    def iter_cell_corners(self) -> Iterator[np.ndarray]:
+        """Yield ``(n, 8)`` arrays of cell corners, numbered by bits (x, y, z), in chunks"""
+        w, h = self.cx + 1, self.cy + 1
+        cells_per_layer = self.cx * self.cy
+        layer_nodes = (np.arange(self.cy, dtype=np.int64)[:, np.newaxis] * w + np.arange(self.cx)).ravel()
+        corner_offsets = np.array([(b & 1) + ((b >> 1) & 1)*w + ((b >> 2) & 1)*w*h for b in range(8)])
+        layers_per_chunk = max(1, CHUNK_SIZE // cells_per_layer)
+        for layer_start in range(0, self.cz, layers_per_chunk):
+            layers = np.arange(layer_start, min(layer_start + layers_per_chunk, self.cz), dtype=np.int64)
+            a = (layers[:, np.newaxis] * (w*h) + layer_nodes).ravel()
+            yield a[:, np.newaxis] + corner_offsets
+
+    def iter_connectivity(self) -> Iterator[np.ndarray]:
+        for corners in self.iter_cell_corners():
+            # EnSight order: bottom face counter-clockwise, then top face
+            yield corners[:, [0, 1, 3, 2, 4, 5, 7, 6]]
+
+
+class TetraBlock(HexaBlock):
+    element_type = "tetra4"
+    elements_per_cell = 6
+
+    def iter_connectivity(self) -> Iterator[np.ndarray]:
+        tetras = np.asarray(_KUHN_TETRAS)
+        for corners in self.iter_cell_corners():
+            yield corners[:, tetras].reshape((-1, 4))
+
+
+BLOCK_TYPES = {cls.element_type: cls for cls in [TriaBlock, SurfaceBlock, Quad8Block, NsidedBlock, BarBlock, Bar3Block,
+                                                   HexaBlock, TetraBlock]}
+
+
+class Part:
+    def __init__(self, part_id: int, name: str, blocks: List[Block]):
+        self.part_id = part_id
+        self.name = name
+        self.blocks = blocks
+        offset = 0
+        for block in blocks:
+            block.node_offset = offset
+            offset += block.number_of_nodes
+        self.number_of_nodes = offset
+
+    @property
+    def number_of_elements(self) -> int:
+        return sum(block.number_of_elements for block in self.blocks)
+
+    def iter_node_coordinates(self) -> Iterator[np.ndarray]:
+        """Yield ``(n, 3)`` arrays with coordinates of all nodes, in chunks"""
+        for block in self.blocks:
+            for start in range(0, block.number_of_nodes, CHUNK_SIZE):
+                yield block.node_coordinates(start, min(start + CHUNK_SIZE, block.number_of_nodes))
+
+    def write(self, fp: BinaryIO, timestep: int = 0, transient_geometry: bool = False):
+        write_line(fp, "part")
+        write_ints(fp, [self.part_id])
+        write_line(fp, self.name)
+        write_line(fp, "coordinates")
+        write_ints(fp, [self.number_of_nodes])
+        for component in range(3):
+            for coordinates in self.iter_node_coordinates():
+                values = coordinates[:, component]
+                if transient_geometry and component == 2:
+                    values = values + 0.1*timestep
+                write_floats(fp, values)
+        for block in self.blocks:
+            block.write(fp)
+
+
+def scalar_values(coordinates: np.ndarray, i: int, timestep: int) -> np.ndarray:
+    x, y, z = coordinates.T
+    return np.sin(0.05*x + 0.3*timestep + i) + 0.01*y + 0.1*z
+
+
+def vector_values(coordinates: np.ndarray, i: int, timestep: int) -> np.ndarray:
+    x, y, z = coordinates.T
+    phase = 0.3*timestep + i
+    return np.stack([np.cos(0.05*y + phase), np.sin(0.05*x + phase), 0.01*z], axis=1)
+
+
+def make_parts(number_of_elements: int, element_types: List[str], number_of_parts: int) -> List[Part]:
+    """Split given number of elements evenly among parts and element types"""
+    elements_per_block = max(1, number_of_elements // (number_of_parts * len(element_types)))
+    parts = []
+    for p in range(number_of_parts):
+        blocks = []
+        for b, element_type in enumerate(element_types):
+            origin = (0.0, 0.0, 0.0)
+            block = BLOCK_TYPES[element_type](elements_per_block, origin)
+            # spread the blocks apart, so that the case is easy to look at
+            block.origin = (1.1 * b * max(getattr(block, "cx", 0), 10), 0.0, 1.1 * p * max(getattr(block, "cz", 0), 10))
+            blocks.append(block)
+        parts.append(Part(p + 1, f"part{p + 1}", blocks))
+    return parts
+
+
+def write_case(directory: str, number_of_elements: int, element_types: List[str], number_of_parts: int = 1,
+               scalars: int = 1, vectors: int = 1, timesteps: int = 1, transient_geometry: bool = False,
+               case_name: str = "synthetic") -> str:
+    """
+    Write synthetic case into given directory
+
+    Returns:
+        path to the ``.case`` file
+    """
+    os.makedirs(directory, exist_ok=True)
+    parts = make_parts(number_of_elements, element_types, number_of_parts)
+    transient = timesteps > 1
+
+    def file_name(name: str, timestep: int) -> str:
+        return f"{name}.{timestep:04d}" if transient else name
+
+    geometry_steps = range(timesteps) if transient_geometry and transient else [0]
+    for timestep in geometry_steps:
+        with open(op.join(directory, file_name("geometry", timestep) if transient_geometry else "geometry"), "wb") as fp:
+            write_line(fp, "C Binary")
+            write_line(fp, "Synthetic case generated by blender-ensight-reader benchmarks")
+            write_line(fp, f"{number_of_elements} elements")
+            write_line(fp, "node id off")
+            write_line(fp, "element id off")
+            for part in parts:
+                part.write(fp, timestep, transient_geometry)
+
+    variables = [(f"scalar{i}", "scalar", i) for i in range(scalars)] + \
+                [(f"vector{i}", "vector", i) for i in range(vectors)]
+    for timestep in range(timesteps):
+        for name, kind, i in variables:
+            with open(op.join(directory, file_name(name, timestep)), "wb") as fp:
+                write_line(fp, f"{kind} variable {name}")
+                for part in parts:
+                    write_line(fp, "part")
+                    write_ints(fp, [part.part_id])
+                    write_line(fp, "coordinates")
+                    if kind == "scalar":
+                        for coordinates in part.iter_node_coordinates():
+                            write_floats(fp, scalar_values(coordinates, i, timestep))
+                    else:
+                        for component in range(3):
+                            for coordinates in part.iter_node_coordinates():
+                                write_floats(fp, vector_values(coordinates, i, timestep)[:, component])
+
+    ts = " 1" if transient else ""
+    geometry_ts = ts if transient_geometry else ""
+    lines = [
+        "FORMAT",
+        "type: ensight gold",
+        "",
+        "GEOMETRY",
+        f"model:{geometry_ts} geometry{'.****' if transient_geometry and transient else ''}",
+        "",
+        "VARIABLE",
+    ]
+    for name, kind, _ in variables:
+        lines.append(f"{kind} per node:{ts} {name} {name}{'.****' if transient else ''}")
+    if transient:
+        lines += [
+            "",
+            "TIME",
+            "time set: 1",
+            f"number of steps: {timesteps}",
+            "filename start number: 0",
+            "filename increment: 1",
+            "time values: " + " ".join(f"{0.1*t:g}" for t in range(timesteps)),
+        ]
+
+    case_path = op.join(directory, f"{case_name}.case")
+    with open(case_path, "w") as fp:
+        fp.write("\n".join(lines) + "\n")
+    return case_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic EnSight Gold C Binary case")
+    parser.add_argument("output_dir")
+    parser.add_argument("--elements", default="100k", help="total number of elements, eg. 10k, 1M (default: %(default)s)")
+    parser.add_argument("--element-types", default="quad4",
+                        help=f"comma-separated element types, from: {', '.join(ELEMENT_TYPES)} (default: %(default)s)")
+    parser.add_argument("--parts", type=int, default=1, help="number of parts (default: %(default)s)")
+    parser.add_argument("--scalars", type=int, default=1, help="number of scalar variables (default: %(default)s)")
+    parser.add_argument("--vectors", type=int, default=1, help="number of vector variables (default: %(default)s)")
+    parser.add_argument("--timesteps", type=int, default=1, help="number of time steps (default: %(default)s)")
+    parser.add_argument("--transient-geometry", action="store_true", help="write geometry for each time step")
+    args = parser.parse_args()
+
+    element_types = args.element_types.split(",")
+    for element_type in element_types:
+        if element_type not in BLOCK_TYPES:
+            parser.error(f"unknown element type {element_type!r}")
+
+    case_path = write_case(args.output_dir, parse_size(args.elements), element_types, args.parts,
+                           args.scalars, args.vectors, args.timesteps, args.transient_geometry)
+    print("wrote", case_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+# Copyright (c) 2022 Tomas Karabela
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Benchmarks of the import path outside Blender
+
+For each size and element type, a synthetic case is generated (see `casegen`) and these phases are timed:
+
+- ``decode`` - `read_part_mesh_data()` for all parts: node coordinates, connectivity,
+  loop assembly, skin of volume elements and per-node variables, followed by `check_part_mesh_data()`
+  (the default mesh validation of the importer)
+- ``build`` - `ImportEnsightGold.convert_ensight_part_to_blender_object()` with the `bpy` stand-in
+  (see `bpy_standin`), ie. the array path of mesh creation without Blender's own processing
+- ``timesteps`` - reading variables (and coordinates) of all time steps through `TransientCasePlayer`,
+  only when there is more than one time step
+
+Results are reported as throughput in elements/s and MB/s (bytes read from EnSight files
+for ``decode``, size of the mesh arrays for ``build`` and of the time step arrays for ``timesteps``).
+Case files are read right after they're written, so they will usually be in the page cache.
+
+Usage::
+
+    python benchmarks/run_benchmarks.py --sizes 10k,100k,1M --element-types quad4,tria3,nsided,hexa8
+
+Element types can be combined with ``+`` (eg. ``quad4+bar2``) to get parts with more blocks.
+
+"""
+
+import argparse
+import json
+import os
+import os.path as op
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Tuple
+
+# make the add-on importable from the repository
+sys.path.insert(0, op.dirname(op.dirname(op.realpath(__file__))))
+
+import numpy as np
+import bpy_standin
+from casegen import write_case, parse_size, BLOCK_TYPES
+
+bpy_standin.install()
+
+from blender_ensightreader.ensightreader import read_case
+from blender_ensightreader.meshdata import PartMeshData, PerThreadFiles, read_part_mesh_data, check_part_mesh_data
+from blender_ensightreader.importer import ImportEnsightGold
+from blender_ensightreader.playback import TransientCasePlayer, COORDINATES_KEY
+from blender_ensightreader.profiling import ImportProfile
+
+
+def run_to_completion(generator):
+    """Exhaust generator and return its return value"""
+    try:
+        while True:
+            next(generator)
+    except StopIteration as e:
+        return e.value
+
+
+def benchmark_decode(case_path: str, threads: int) -> Tuple[float, int, List[PartMeshData]]:
+    case = read_case(case_path)
+    geofile = case.get_geometry_model(0)
+    variables = [case.get_variable(name, 0) for name in case.get_variables()]
+    files = PerThreadFiles(geofile.file_path, {v.variable_name: v.file_path for v in variables})
+
+    def decode(part) -> Tuple[PartMeshData, int]:
+        fp_geo, variables_fp_dict = files.get()
+        bytes_read = files.bytes_read()
+        mesh_data = read_part_mesh_data(part, variables, fp_geo, variables_fp_dict, extract_volume_skin=True)
+        mesh_data = check_part_mesh_data(mesh_data)
+        return mesh_data, files.bytes_read() - bytes_read
+
+    t0 = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            results = list(executor.map(decode, geofile.parts.values()))
+    finally:
+        files.close()
+    seconds = time.perf_counter() - t0
+
+    return seconds, sum(n for _, n in results), [mesh_data for mesh_data, _ in results]
+
+
+def benchmark_build(mesh_data_list: List[PartMeshData]) -> Tuple[float, int]:
+    operator = ImportEnsightGold()
+    operator._profile = ImportProfile(enabled=False)
+    operator._new_datablocks = []
+    operator.validate_mesh = "NUMPY"  # meshes were checked while decoding
+
+    t0 = time.perf_counter()
+    for mesh_data in mesh_data_list:
+        run_to_completion(operator.convert_ensight_part_to_blender_object(mesh_data))
+    seconds = time.perf_counter() - t0
+
+    return seconds, sum(mesh_data.nbytes for mesh_data in mesh_data_list)
+
+
+def benchmark_timesteps(case_path: str) -> Tuple[float, int]:
+    case = read_case(case_path)
+    requests = {part_id: [COORDINATES_KEY] + case.get_variables()
+                for part_id in case.get_geometry_model(0).parts}
+    player = TransientCasePlayer(case_path, cache_size_mb=0, prefetch_steps=0)
+
+    total_bytes = 0
+    t0 = time.perf_counter()
+    try:
+        for timestep in range(player.number_of_timesteps()):
+            arrays = player.get_timestep(timestep, requests)
+            total_bytes += sum(arr.nbytes for arr in arrays.values())
+    finally:
+        player.shutdown()
+    seconds = time.perf_counter() - t0
+
+    return seconds, total_bytes
+
+
+def make_result(label: str, phase: str, elements: int, seconds: float, nbytes: int) -> Dict[str, Any]:
+    return {
+        "case": label,
+        "phase": phase,
+        "elements": elements,
+        "seconds": seconds,
+        "elements_per_second": elements / seconds if seconds > 0 else float("inf"),
+        "megabytes": nbytes / 2**20,
+        "megabytes_per_second": nbytes / 2**20 / seconds if seconds > 0 else float("inf"),
+    }
+
+
+def run_case(case_path: str, label: str, args: argparse.Namespace) -> List[Dict[str, Any]]:
+    case = read_case(case_path)
+    elements = sum(block.number_of_elements
+                   for part in case.get_geometry_model(0).parts.values()
+                   for block in part.element_blocks)
+
+    best: Dict[str, Tuple[float, int]] = {}
+
+    def record(phase: str, seconds: float, nbytes: int):
+        if phase not in best or seconds < best[phase][0]:
+            best[phase] = seconds, nbytes
+
+    for _ in range(args.repeat):
+        seconds, bytes_read, mesh_data_list = benchmark_decode(case_path, args.threads)
+        record("decode", seconds, bytes_read)
+        record("build", *benchmark_build(mesh_data_list))
+        del mesh_data_list
+        if args.timesteps > 1:
+            record("timesteps", *benchmark_timesteps(case_path))
+
+    return [make_result(label, phase, elements * (args.timesteps if phase == "timesteps" else 1), seconds, nbytes)
+            for phase, (seconds, nbytes) in best.items()]
+
+
+def print_results(results: List[Dict[str, Any]]):
+    header = f"{'case':<24} {'phase':<10} {'elements':>12} {'seconds':>10} {'Melem/s':>10} {'MB':>10} {'MB/s':>10}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['case']:<24} {r['phase']:<10} {r['elements']:>12} {r['seconds']:>10.4f}"
+              f" {r['elements_per_second'] / 1e6:>10.2f} {r['megabytes']:>10.1f} {r['megabytes_per_second']:>10.1f}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark decoding and mesh building on synthetic EnSight cases")
+    parser.add_argument("--sizes", default="10k,100k,1M",
+                        help="comma-separated total numbers of elements, eg. 10k,1M,100M (default: %(default)s)")
+    parser.add_argument("--element-types", default="quad4,tria3,nsided,bar2,hexa8,tetra4",
+                        help="comma-separated element types to benchmark, types joined with '+' are put"
+                             " in the same case (default: %(default)s)")
+    parser.add_argument("--parts", type=int, default=1, help="number of parts (default: %(default)s)")
+    parser.add_argument("--scalars", type=int, default=1, help="number of scalar variables (default: %(default)s)")
+    parser.add_argument("--vectors", type=int, default=1, help="number of vector variables (default: %(default)s)")
+    parser.add_argument("--timesteps", type=int, default=1, help="number of time steps (default: %(default)s)")
+    parser.add_argument("--threads", type=int, default=1, help="decoding threads (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of each benchmark, best is reported"
+                                                              " (default: %(default)s)")
+    parser.add_argument("--work-dir", help="where to generate cases; existing cases are reused"
+                                           " (default: temporary directory, removed afterwards)")
+    parser.add_argument("--output", help="write results as JSON into this file")
+    args = parser.parse_args()
+
+    element_type_groups = [group.split("+") for group in args.element_types.split(",")]
+    for group in element_type_groups:
+        for element_type in group:
+            if element_type not in BLOCK_TYPES:
+                parser.error(f"unknown element type {element_type!r}")
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="ensight-benchmarks-")
+    results = []
+    try:
+        for size in args.sizes.split(","):
+            for group in element_type_groups:
+                label = f"{size} {'+'.join(group)}"
+                case_dir = op.join(work_dir, f"{size}_{'+'.join(group)}_{args.parts}p_{args.scalars}s"
+                                             f"_{args.vectors}v_{args.timesteps}t")
+                case_path = op.join(case_dir, "synthetic.case")
+                if not op.exists(case_path):
+                    print(f"Generating case {label} ...", file=sys.stderr)
+                    write_case(case_dir, parse_size(size), group, args.parts, args.scalars, args.vectors,
+                               args.timesteps)
+                print(f"Running {label} ...", file=sys.stderr)
+                results.extend(run_case(case_path, label, args))
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_results(results)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            json.dump({
+                "environment": {
+                    "platform": platform.platform(),
+                    "processor": platform.processor(),
+                    "cpu_count": os.cpu_count(),
+                    "python_version": platform.python_version(),
+                    "numpy_version": np.__version__,
+                },
+                "options": vars(args),
+                "results": results,
+            }, fp, indent=2)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
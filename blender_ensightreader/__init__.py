@@ -21,6 +21,9 @@
 
 try:
     from .importer import ImportEnsightGold
+    from .proxy import LoadEnsightParts, menu_func_load_parts
+    from .reload import ReloadEnsightCase, menu_func_reload
+    from .playback import ensight_frame_change_pre, shutdown_players
     import bpy
 except ImportError:
     ImportSomeData = None
@@ -48,12 +51,23 @@ def menu_func_import(self, context):
 # Register and add to the "file selector" menu (required to use F3 search "Text Import Operator" for quick access)
 def register():
     bpy.utils.register_class(ImportEnsightGold)
+    bpy.utils.register_class(LoadEnsightParts)
+    bpy.utils.register_class(ReloadEnsightCase)
     bpy.types.TOPBAR_MT_file_import.append(menu_func_import)
+    bpy.types.VIEW3D_MT_object.append(menu_func_load_parts)
+    bpy.types.VIEW3D_MT_object.append(menu_func_reload)
+    bpy.app.handlers.frame_change_pre.append(ensight_frame_change_pre)
 
 
 def unregister():
     bpy.utils.unregister_class(ImportEnsightGold)
+    bpy.utils.unregister_class(LoadEnsightParts)
+    bpy.utils.unregister_class(ReloadEnsightCase)
     bpy.types.TOPBAR_MT_file_import.remove(menu_func_import)
+    bpy.types.VIEW3D_MT_object.remove(menu_func_load_parts)
+    bpy.types.VIEW3D_MT_object.remove(menu_func_reload)
+    bpy.app.handlers.frame_change_pre.remove(ensight_frame_change_pre)
+    shutdown_players()
 
 
 if __name__ == "__main__":
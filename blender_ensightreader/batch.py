@@ -0,0 +1,358 @@
+# Copyright (c) 2022 Tomas Karabela
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Batch conversion of EnSight Gold cases into .blend (or Alembic) files
+
+Run it in background Blender, passing arguments after ``--``::
+
+    blender --background --python blender_ensightreader/batch.py -- \\
+        --timesteps 0:400 --workers 8 --output-dir out/ --variables p,U case.case
+
+Each (case, time step) pair is imported into an empty scene and saved as separate file.
+The work is split into chunks of time steps and spread over a pool of Blender worker processes,
+each started as ``blender --background --factory-startup --python batch.py -- --worker-jobs ...``.
+The coordinating process itself doesn't need Blender, so you can also run this script with
+regular Python and pass path to Blender executable with ``--blender``.
+
+"""
+
+import argparse
+import json
+import os
+import os.path as op
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+try:
+    import bpy
+except ImportError:
+    bpy = None
+
+if __package__:
+    from .ensightreader import read_case
+    from .timesets import get_number_of_timesteps
+else:
+    # executed as script, make the add-on importable (and don't shadow modules with its own files)
+    _addon_dir = op.dirname(op.realpath(__file__))
+    sys.path = [path for path in sys.path if op.realpath(path or ".") != _addon_dir]
+    sys.path.insert(0, op.dirname(_addon_dir))
+    from blender_ensightreader.ensightreader import read_case
+    from blender_ensightreader.timesets import get_number_of_timesteps
+
+
+Job = Tuple[str, int, str]  # (case path, time step, output path)
+JobErrors = Dict[str, Optional[str]]  # output path -> error message, or None if the job succeeded
+
+
+def parse_timesteps(spec: str, number_of_timesteps: int) -> Sequence[int]:
+    """Parse time step range like ``5``, ``0:100``, ``0:100:10`` or ``all`` (stop is exclusive)"""
+    if spec == "all":
+        return range(number_of_timesteps)
+    parts = [int(x) if x else None for x in spec.split(":")]
+    if len(parts) == 1:
+        return [parts[0]]
+    return range(number_of_timesteps)[slice(*parts)]
+
+
+def get_jobs(args: argparse.Namespace) -> List[Job]:
+    jobs = []
+    for case_path in args.cases:
+        case_path = op.abspath(case_path)
+        output_dir = op.abspath(args.output_dir or op.dirname(case_path))
+        case_name = op.splitext(op.basename(case_path))[0]
+        for timestep in parse_timesteps(args.timesteps, get_number_of_timesteps(read_case(case_path))):
+            output_path = op.join(output_dir, f"{case_name}_{timestep:04d}.{args.format}")
+            jobs.append((case_path, timestep, output_path))
+    return jobs
+
+
+def run_worker_process(blender_path: str, jobs: List[Job],
+                       args: argparse.Namespace) -> Tuple[List[Job], int, JobErrors]:
+    """Run Blender worker converting given jobs, return its exit code and result of each job it got to"""
+    cmd = [
+        blender_path, "--background", "--factory-startup", "--python-exit-code", "1",
+        "--python", op.realpath(__file__), "--",
+        "--worker-jobs", json.dumps(jobs),
+        "--format", args.format,
+        "--variables", args.variables,
+        "--derived-variables", args.derived_variables,
+        "--tensor-output", args.tensor_output,
+        "--parts-include", args.parts_include,
+        "--parts-exclude", args.parts_exclude,
+        "--threads", str(args.threads),
+        "--palette-range", args.palette_range,
+        "--validate-mesh", args.validate_mesh,
+        "--structured-surface", args.structured_surface,
+        "--structured-plane-index", str(args.structured_plane_index),
+        "--point-clouds", args.point_clouds,
+        "--point-cloud-max-points", str(args.point_cloud_max_points),
+        "--point-cloud-subsample", args.point_cloud_subsample,
+    ]
+    if args.roi:
+        cmd += ["--roi", args.roi]
+    if args.roi_no_crop:
+        cmd.append("--roi-no-crop")
+    if args.extract_volume_skin:
+        cmd.append("--extract-volume-skin")
+    if args.merge_parts:
+        cmd.append("--merge-parts")
+    if args.cache_dir:
+        cmd += ["--cache-dir", args.cache_dir]
+    if args.range_cache_dir:
+        cmd += ["--range-cache-dir", args.range_cache_dir]
+    if args.profile:
+        cmd.append("--profile")
+
+    stdout = None if args.verbose else subprocess.DEVNULL
+    with tempfile.TemporaryDirectory(prefix="ensight-batch-") as status_dir:
+        status_path = op.join(status_dir, "status.jsonl")
+        result = subprocess.run(cmd + ["--worker-status", status_path], stdout=stdout)
+        return jobs, result.returncode, read_worker_status(status_path)
+
+
+def read_worker_status(status_path: str) -> JobErrors:
+    """Read results of jobs written by `run_worker()`, one JSON object per line"""
+    job_errors: JobErrors = {}
+    try:
+        with open(status_path, encoding="utf-8") as fp:
+            for line in fp:
+                try:
+                    status = json.loads(line)
+                except ValueError:
+                    continue  # worker crashed while writing the line
+                job_errors[status["output_path"]] = status["error"]
+    except OSError:
+        pass  # worker didn't get to any job
+    return job_errors
+
+
+def run_coordinator(args: argparse.Namespace) -> int:
+    blender_path = args.blender or (bpy.app.binary_path if bpy is not None else None)
+    if not blender_path:
+        print("Please specify path to Blender executable using --blender", file=sys.stderr)
+        return 2
+
+    jobs = get_jobs(args)
+    for output_dir in {op.dirname(output_path) for _, _, output_path in jobs}:
+        os.makedirs(output_dir, exist_ok=True)
+
+    workers = args.workers or os.cpu_count() or 1
+    if not args.threads:
+        # don't oversubscribe CPU cores with decoding threads inside the worker processes
+        args.threads = max(1, (os.cpu_count() or 1) // workers)
+
+    chunks = [jobs[i:i+args.jobs_per_worker] for i in range(0, len(jobs), args.jobs_per_worker)]
+    print(f"Converting {len(jobs)} time steps using {workers} Blender processes")
+
+    # ranges over all time steps are the same for every job; without cache directory, the workers
+    # share them through a temporary directory instead of each of them reading all time steps again
+    range_cache_dir = None
+    if args.palette_range == "all_timesteps" and not args.cache_dir:
+        range_cache_dir = tempfile.TemporaryDirectory(prefix="ensight-ranges-")
+        args.range_cache_dir = range_cache_dir.name
+
+    t0 = time.perf_counter()
+    failed_jobs = []
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(run_worker_process, blender_path, chunk, args) for chunk in chunks]
+            for i, future in enumerate(futures, 1):
+                chunk, returncode, job_errors = future.result()
+                # jobs the worker didn't report on were not converted (it crashed before getting to them)
+                chunk_errors = {output_path: job_errors.get(output_path, f"not converted (exit code {returncode})")
+                                for _, _, output_path in chunk}
+                chunk_failed_jobs = [job for job in chunk if chunk_errors[job[2]] is not None]
+                if chunk_failed_jobs:
+                    status = f"{len(chunk) - len(chunk_failed_jobs)} of {len(chunk)} OK"
+                else:
+                    status = "OK"
+                print(f"[{i}/{len(chunks)}] {chunk[0][2]} ... {chunk[-1][2]}: {status}")
+                for _, _, output_path in chunk_failed_jobs:
+                    print(f"  {output_path}: FAILED ({chunk_errors[output_path]})")
+                failed_jobs.extend(chunk_failed_jobs)
+    finally:
+        if range_cache_dir is not None:
+            range_cache_dir.cleanup()
+
+    print(f"Finished in {time.perf_counter() - t0:.1f} s, {len(jobs) - len(failed_jobs)} of {len(jobs)} time steps OK")
+    return 1 if failed_jobs else 0
+
+
+def run_worker(args: argparse.Namespace) -> int:
+    import blender_ensightreader
+
+    try:
+        blender_ensightreader.register()
+    except ValueError:
+        pass  # add-on is already installed and enabled
+
+    tensor_output = {name.strip() for name in args.tensor_output.split(",")}
+    roi_options = {}
+    if args.roi:
+        roi = [float(x) for x in args.roi.split(",")]
+        roi_options = dict(roi_mode="BOX", roi_min=roi[:3], roi_max=roi[3:], roi_crop=not args.roi_no_crop)
+
+    # each job is reported as soon as it's done, so that the results are known even if Blender crashes later
+    status_fp = open(args.worker_status, "w", encoding="utf-8") if args.worker_status else None
+    failed = False
+    for case_path, timestep, output_path in json.loads(args.worker_jobs):
+        print(f"Importing {case_path} time step {timestep}")
+        try:
+            convert_timestep(args, case_path, timestep, output_path, tensor_output, roi_options)
+            error = None
+        except Exception as e:
+            error = get_error_message(e)
+            failed = True
+            print(f"Failed to convert {case_path} time step {timestep}: {error}", file=sys.stderr)
+        if status_fp is not None:
+            status_fp.write(json.dumps({"output_path": output_path, "error": error}) + "\n")
+            status_fp.flush()
+
+    if status_fp is not None:
+        status_fp.close()
+    return 1 if failed else 0
+
+
+def get_error_message(e: Exception) -> str:
+    """Return last line of exception message (errors raised by operators come out of bpy.ops with traceback)"""
+    lines = [line.strip() for line in str(e).splitlines() if line.strip() and not line.startswith("Location:")]
+    return lines[-1] if lines else type(e).__name__
+
+
+def convert_timestep(args: argparse.Namespace, case_path: str, timestep: int, output_path: str,
+                     tensor_output: Set[str], roi_options: Dict[str, Any]):
+    bpy.data.batch_remove(list(bpy.data.objects) + list(bpy.data.meshes) + list(bpy.data.materials))
+
+    result = bpy.ops.blender_ensightreader.import_ensight_gold(
+        filepath=case_path,
+        timestep=timestep,
+        variables=args.variables,
+        derived_variables=args.derived_variables,
+        tensor_components="components" in tensor_output,
+        tensor_von_mises="von_mises" in tensor_output,
+        tensor_principal="principal" in tensor_output,
+        parts_include_regex=args.parts_include,
+        parts_exclude_regex=args.parts_exclude,
+        extract_volume_skin=args.extract_volume_skin,
+        structured_surface=args.structured_surface.upper(),
+        structured_plane_index=args.structured_plane_index,
+        merge_parts=args.merge_parts,
+        point_clouds=args.point_clouds.upper(),
+        point_cloud_max_points=args.point_cloud_max_points,
+        point_cloud_subsample=args.point_cloud_subsample.upper(),
+        num_threads=args.threads,
+        palette_range=args.palette_range.upper(),
+        validate_mesh=args.validate_mesh.upper(),
+        cache_directory=args.cache_dir,
+        range_cache_directory=args.range_cache_dir or "",
+        profile_path=f"{output_path}.profile.json" if args.profile else "",
+        **roi_options,
+    )
+    if result != {"FINISHED"}:
+        raise RuntimeError("import was cancelled")
+
+    if args.format == "abc":
+        bpy.ops.wm.alembic_export(filepath=output_path, start=1, end=1)
+    else:
+        bpy.ops.wm.save_as_mainfile(filepath=output_path, check_existing=False)
+    print(f"Wrote {output_path}")
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="blender --background --python batch.py --",
+                                     description="Convert EnSight Gold cases into .blend or Alembic files")
+    parser.add_argument("cases", nargs="*", metavar="CASE", help="path to .case file")
+    parser.add_argument("--output-dir", help="where to write output files (default: next to case file)")
+    parser.add_argument("--timesteps", default="0",
+                        help="time step or range of time steps to convert, eg. 0, 10:20, 0:400:10 or all"
+                             " (default: %(default)s)")
+    parser.add_argument("--format", choices=["blend", "abc"], default="blend",
+                        help="output format (default: %(default)s)")
+    parser.add_argument("--variables", default="*", help="variables to load (default: %(default)s)")
+    parser.add_argument("--derived-variables", default="",
+                        help="new variables computed from the loaded ones, eg. 'Umag = mag(U); dp = p - 101325'")
+    parser.add_argument("--tensor-output", default="components",
+                        help="comma-separated list of scalars loaded for tensor variables:"
+                             " components, von_mises, principal (default: %(default)s)")
+    parser.add_argument("--parts-include", default=".*", help="parts to include (default: %(default)s)")
+    parser.add_argument("--parts-exclude", default="internalMesh", help="parts to exclude (default: %(default)s)")
+    parser.add_argument("--roi", metavar="XMIN,YMIN,ZMIN,XMAX,YMAX,ZMAX",
+                        help="load only parts in this box (region of interest)")
+    parser.add_argument("--roi-no-crop", action="store_true",
+                        help="load parts crossing the region of interest whole instead of cropping them")
+    parser.add_argument("--extract-volume-skin", action="store_true", help="load surface of volume parts")
+    parser.add_argument("--merge-parts", action="store_true", help="load all parts into single object")
+    parser.add_argument("--structured-surface", choices=["boundary", "i", "j", "k"], default="boundary",
+                        help="surface of 3D structured blocks to load: boundary (needs --extract-volume-skin)"
+                             " or plane of constant i, j or k index (default: %(default)s)")
+    parser.add_argument("--structured-plane-index", type=int, default=0,
+                        help="index of the plane of 3D structured blocks, negative values count from the last"
+                             " plane (default: %(default)s)")
+    parser.add_argument("--point-clouds", choices=["auto", "all", "none"], default="auto",
+                        help="which parts to load as point clouds: auto (parts with no elements or point elements),"
+                             " all (nodes of all parts) or none (default: %(default)s)")
+    parser.add_argument("--point-cloud-max-points", type=int, default=0,
+                        help="subsample point clouds to at most this many points (default: no subsampling)")
+    parser.add_argument("--point-cloud-subsample", choices=["stride", "random"], default="stride",
+                        help="how to subsample point clouds (default: %(default)s)")
+    parser.add_argument("--palette-range", choices=["default", "timestep", "all_timesteps"], default="all_timesteps",
+                        help="range of the material palette; with all_timesteps, colors are consistent"
+                             " across the output files (default: %(default)s)")
+    parser.add_argument("--validate-mesh", choices=["numpy", "blender", "none"], default="numpy",
+                        help="how to check meshes for invalid polygons (default: %(default)s)")
+    parser.add_argument("--cache-dir", default="", help="cache directory for decoded parts")
+    parser.add_argument("--profile", action="store_true",
+                        help="write import profile of each time step next to the output file (as .profile.json)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="number of Blender processes (default: one per CPU core)")
+    parser.add_argument("--threads", type=int, default=0,
+                        help="number of decoding threads in each Blender process (default: CPU cores / workers)")
+    parser.add_argument("--jobs-per-worker", type=int, default=10,
+                        help="time steps converted by one Blender process before it's restarted"
+                             " (default: %(default)s)")
+    parser.add_argument("--blender", help="path to Blender executable (default: the running Blender)")
+    parser.add_argument("--verbose", action="store_true", help="show output of Blender processes")
+    parser.add_argument("--worker-jobs", help=argparse.SUPPRESS)
+    parser.add_argument("--range-cache-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-status", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.roi and len(args.roi.split(",")) != 6:
+        parser.error("--roi needs 6 comma-separated numbers")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    if argv is None:
+        argv = sys.argv[sys.argv.index("--")+1:] if "--" in sys.argv else sys.argv[1:]
+    args = parse_args(argv)
+
+    if args.worker_jobs:
+        return run_worker(args)
+    else:
+        return run_coordinator(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
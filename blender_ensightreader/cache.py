@@ -0,0 +1,179 @@
+# Copyright (c) 2022 Tomas Karabela
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Persistent cache of decoded parts
+
+Each `PartMeshData` is stored in its own directory as ``.npy`` files, which are
+memory-mapped when loaded, so that repeated imports of the same case don't have
+to parse the EnSight data files or assemble the loop arrays again.
+
+The cache key is a hash of the identity (path, size, modification time) of the geometry
+and variable files, the part and the import options which affect the decoded arrays;
+when any of these change, the part is simply decoded again under a new key.
+
+`SessionMemory` keeps small results (bounding boxes, variable ranges) in memory for the rest
+of the Blender session, up to a limited number of entries.
+
+"""
+
+import hashlib
+import json
+import os
+import os.path as op
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from typing import List, Optional, Dict, Any
+import numpy as np
+from .ensightreader import GeometryPart, EnsightVariableFile
+from .meshdata import PartMeshData, VariableAttribute
+
+
+CACHE_FORMAT_VERSION = 5
+
+MESH_ARRAY_NAMES = ["vertices", "vertex_index", "loop_start", "loop_total"]
+OPTIONAL_ARRAY_NAMES = ["node_index", "polygon_element", "edges"]
+
+
+def file_identity(path: str) -> List[Any]:
+    st = os.stat(path)
+    return [op.abspath(path), st.st_size, st.st_mtime_ns]
+
+
+def get_part_cache_key(geometry_file_path: str, part: GeometryPart, variables: List[EnsightVariableFile],
+                       options: Dict[str, Any]) -> str:
+    """Return cache key for given part, variables and import options"""
+    key_data = {
+        "version": CACHE_FORMAT_VERSION,
+        "geometry_file": file_identity(geometry_file_path),
+        "part": [part.part_id, part.part_name, part.offset],
+        "variables": [[variable.variable_name] + file_identity(variable.file_path) for variable in variables],
+        "options": options,
+    }
+    return hashlib.sha1(json.dumps(key_data, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class SessionMemory:
+    """
+    Values computed in this Blender session, keyed by file identity
+
+    This can be used from multiple threads at once. At most ``max_entries`` values are kept,
+    the least recently used ones are dropped first, so that this doesn't grow without bound
+    as files are rewritten (and get new keys) when reloading cases.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: Any):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class MeshDataCache:
+    """
+    Directory with cached `PartMeshData`
+
+    This can be used from multiple threads (and processes) at once; entries are written
+    into temporary directory first and then renamed, so that readers never see partial entries.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def load(self, key: str) -> Optional[PartMeshData]:
+        entry_dir = op.join(self.directory, key)
+        meta_path = op.join(entry_dir, "meta.json")
+        if not op.exists(meta_path):
+            return None
+
+        with open(meta_path, encoding="utf-8") as fp:
+            meta = json.load(fp)
+
+        arrays = {name: np.load(op.join(entry_dir, f"{name}.npy"), mmap_mode="r") for name in MESH_ARRAY_NAMES}
+        for name in meta["optional_arrays"]:
+            arrays[name] = np.load(op.join(entry_dir, f"{name}.npy"), mmap_mode="r")
+        attributes = [VariableAttribute(name=attribute["name"],
+                                        blender_type=attribute["blender_type"],
+                                        blender_domain=attribute["blender_domain"],
+                                        data=np.load(op.join(entry_dir, f"attribute{i}.npy"), mmap_mode="r"))
+                      for i, attribute in enumerate(meta["attributes"])]
+
+        return PartMeshData(
+            part_id=meta["part_id"],
+            part_name=meta["part_name"],
+            attributes=attributes,
+            messages=[(level, message) for level, message in meta["messages"]] +
+                     [("INFO", f"Loaded part {meta['part_name']} from cache")],
+            **arrays,
+        )
+
+    def store(self, key: str, mesh_data: PartMeshData):
+        entry_dir = op.join(self.directory, key)
+        tmp_dir = op.join(self.directory, f"{key}.tmp-{os.getpid()}-{threading.get_ident()}-{uuid.uuid4().hex}")
+        os.makedirs(tmp_dir)
+
+        try:
+            for name in MESH_ARRAY_NAMES:
+                np.save(op.join(tmp_dir, f"{name}.npy"), getattr(mesh_data, name))
+            optional_arrays = [name for name in OPTIONAL_ARRAY_NAMES if getattr(mesh_data, name) is not None]
+            for name in optional_arrays:
+                np.save(op.join(tmp_dir, f"{name}.npy"), getattr(mesh_data, name))
+            for i, attribute in enumerate(mesh_data.attributes):
+                np.save(op.join(tmp_dir, f"attribute{i}.npy"), attribute.data)
+
+            meta = {
+                "part_id": mesh_data.part_id,
+                "part_name": mesh_data.part_name,
+                "optional_arrays": optional_arrays,
+                # warnings from decoding the part should be shown again when it's loaded from cache
+                "messages": [[level, message] for level, message in mesh_data.messages if level == "WARNING"],
+                "attributes": [{"name": attribute.name,
+                                "blender_type": attribute.blender_type,
+                                "blender_domain": attribute.blender_domain}
+                               for attribute in mesh_data.attributes],
+            }
+            with open(op.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as fp:
+                json.dump(meta, fp)
+
+            os.rename(tmp_dir, entry_dir)
+        except OSError:
+            # most likely another import stored the same entry in the meantime
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not op.exists(op.join(entry_dir, "meta.json")):
+                raise
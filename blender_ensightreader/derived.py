@@ -0,0 +1,315 @@
+# Copyright (c) 2022 Tomas Karabela
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Quantities derived from variable data when parts are read (at import and when animating time steps)
+
+Blender attributes hold at most 3 values per vertex, so tensor variables are turned into
+scalars: their components, von Mises equivalent and principal values. Users can also define
+new variables by expressions over the loaded ones (eg. ``Umag = mag(U)``), which are evaluated
+with NumPy for each part on the decoding threads; the result is stored as an ordinary attribute,
+so the material doesn't have to compute it for every shading sample.
+
+Expressions are parsed with `ast` and only arithmetic, numbers, variable names, ``.x/.y/.z``
+components and the functions in `FUNCTIONS` are allowed; nothing is passed to `eval()`.
+
+"""
+
+import ast
+import math
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Set, Tuple
+import numpy as np
+from .ensightreader import VariableType
+
+# number of values per node/element for each variable type
+NUMBER_OF_COMPONENTS = {
+    VariableType.SCALAR: 1,
+    VariableType.VECTOR: 3,
+    VariableType.TENSOR_SYMM: 6,
+    VariableType.TENSOR_ASYM: 9,
+}
+
+# tensor components in the order they are stored in EnSight Gold variable files
+TENSOR_COMPONENTS = {
+    VariableType.TENSOR_SYMM: ["11", "22", "33", "12", "13", "23"],
+    VariableType.TENSOR_ASYM: ["11", "12", "13", "21", "22", "23", "31", "32", "33"],
+}
+
+
+def get_number_of_components(variable_type: VariableType) -> int:
+    return NUMBER_OF_COMPONENTS[variable_type]
+
+
+# -------------------------------------------------------------------------
+# Tensors
+# -------------------------------------------------------------------------
+
+def _symmetric_components(data: np.ndarray, variable_type: VariableType) -> Tuple[np.ndarray, ...]:
+    """
+    Return float64 components ``(s11, s22, s33, s12, s13, s23)`` of the symmetric part
+    of ``(n, k)`` tensor data
+    """
+    index = {c: i for i, c in enumerate(TENSOR_COMPONENTS[variable_type])}
+    diagonal = tuple(data[:, index[c]].astype(np.float64) for c in ("11", "22", "33"))
+    if variable_type == VariableType.TENSOR_SYMM:
+        off_diagonal = tuple(data[:, index[c]].astype(np.float64) for c in ("12", "13", "23"))
+    else:
+        off_diagonal = tuple(0.5 * (data[:, index[c]].astype(np.float64) + data[:, index[c[::-1]]])
+                             for c in ("12", "13", "23"))
+    return diagonal + off_diagonal
+
+
+def von_mises(data: np.ndarray, variable_type: VariableType) -> np.ndarray:
+    """Return von Mises equivalent of ``(n, k)`` tensor data (of its symmetric part for asymmetric tensors)"""
+    s11, s22, s33, s12, s13, s23 = _symmetric_components(data, variable_type)
+    result = 0.5 * ((s11 - s22)**2 + (s22 - s33)**2 + (s33 - s11)**2) + 3 * (s12**2 + s13**2 + s23**2)
+    return np.sqrt(result).astype(np.float32)
+
+
+def principal_values(data: np.ndarray, variable_type: VariableType) -> np.ndarray:
+    """
+    Return ``(n, 3)`` eigenvalues of ``(n, k)`` tensor data in descending order
+    (of its symmetric part for asymmetric tensors)
+
+    This uses the closed-form solution for symmetric 3x3 matrices (trigonometric solution
+    of the characteristic polynomial), which is much faster than `np.linalg.eigvalsh()`
+    for millions of small matrices.
+    """
+    s11, s22, s33, s12, s13, s23 = _symmetric_components(data, variable_type)
+    q = (s11 + s22 + s33) / 3
+    d11, d22, d33 = s11 - q, s22 - q, s33 - q
+    p = np.sqrt((d11**2 + d22**2 + d33**2 + 2 * (s12**2 + s13**2 + s23**2)) / 6)
+    det = d11 * (d22*d33 - s23**2) - s12 * (s12*d33 - s23*s13) + s13 * (s12*s23 - d22*s13)
+    # isotropic tensors have p == 0 and all eigenvalues equal to q
+    r = np.divide(det, 2 * p**3, out=np.zeros_like(det), where=p > 0)
+    phi = np.arccos(np.clip(r, -1, 1)) / 3
+
+    out = np.empty((data.shape[0], 3), dtype=np.float32)
+    out[:, 0] = q + 2*p*np.cos(phi)
+    out[:, 2] = q + 2*p*np.cos(phi + 2*math.pi/3)
+    out[:, 1] = 3*q - out[:, 0] - out[:, 2]
+    return out
+
+
+def decompose_tensor(data: np.ndarray, variable_type: VariableType,
+                     components: bool = True, von_mises_stress: bool = False,
+                     principal: bool = False) -> List[Tuple[str, np.ndarray]]:
+    """
+    Turn ``(n, k)`` tensor data into scalars
+
+    Returns:
+        list of ``(suffix, data)`` with flat float32 arrays; suffixes are component indices
+        (``11``, ``22``, ...), ``von_mises`` and ``principal_1`` to ``principal_3``
+        (from the largest principal value)
+    """
+    out = []
+    if components:
+        for i, component in enumerate(TENSOR_COMPONENTS[variable_type]):
+            out.append((component, np.ascontiguousarray(data[:, i])))
+    if von_mises_stress:
+        out.append(("von_mises", von_mises(data, variable_type)))
+    if principal:
+        values = principal_values(data, variable_type)
+        for i in range(3):
+            out.append((f"principal_{i+1}", np.ascontiguousarray(values[:, i])))
+    return out
+
+
+def get_tensor_suffixes(variable_type: VariableType) -> List[str]:
+    """Return all suffixes which `decompose_tensor()` can give for tensors of given type"""
+    return TENSOR_COMPONENTS[variable_type] + ["von_mises"] + [f"principal_{i+1}" for i in range(3)]
+
+
+# -------------------------------------------------------------------------
+# Expressions
+# -------------------------------------------------------------------------
+
+def _align(*args):
+    """Make scalar ``(n,)`` arrays broadcast against vector ``(n, 3)`` arrays"""
+    if any(isinstance(arg, np.ndarray) and arg.ndim == 2 for arg in args):
+        return tuple(arg[:, np.newaxis] if isinstance(arg, np.ndarray) and arg.ndim == 1 else arg for arg in args)
+    return args
+
+
+def _mag(*args):
+    if len(args) == 1:
+        v, = args
+        if isinstance(v, np.ndarray) and v.ndim == 2:
+            return np.sqrt(np.einsum("ij,ij->i", v, v))
+        return np.abs(v)
+    # magnitude of complex number given by real and imaginary part
+    return np.hypot(*args)
+
+
+def _dot(a, b):
+    return np.einsum("ij,ij->i", a, b)
+
+
+def _elementwise(f: Callable) -> Callable:
+    return lambda *args: f(*_align(*args))
+
+
+FUNCTIONS: Dict[str, Callable] = {
+    "mag": _mag,
+    "phase": lambda re, im: np.arctan2(im, re),
+    "dot": _dot,
+    "cross": np.cross,
+    "abs": np.abs,
+    "sqrt": np.sqrt,
+    "exp": np.exp,
+    "log": np.log,
+    "log10": np.log10,
+    "sin": np.sin,
+    "cos": np.cos,
+    "tan": np.tan,
+    "asin": np.arcsin,
+    "acos": np.arccos,
+    "atan": np.arctan,
+    "atan2": _elementwise(np.arctan2),
+    "min": _elementwise(np.minimum),
+    "max": _elementwise(np.maximum),
+    "clip": _elementwise(np.clip),
+}
+
+CONSTANTS: Dict[str, float] = {
+    "pi": math.pi,
+    "e": math.e,
+}
+
+VECTOR_COMPONENTS = {"x": 0, "y": 1, "z": 2}
+
+_BINARY_OPERATORS = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.true_divide,
+    ast.Pow: np.power,
+    ast.Mod: np.mod,
+}
+
+_UNARY_OPERATORS = {
+    ast.USub: np.negative,
+    ast.UAdd: np.positive,
+}
+
+
+@dataclass
+class DerivedVariable:
+    """User-defined variable ``name = expression``, see `parse_derived_variables()`"""
+    name: str
+    expression: str
+    tree: ast.expr
+    variable_names: Set[str]
+
+
+def _check_expression(node: ast.AST, variable_names: Set[str]):
+    """Raise ValueError if expression contains anything else than allowed syntax; collect variable names"""
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPERATORS:
+        _check_expression(node.left, variable_names)
+        _check_expression(node.right, variable_names)
+    elif isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPERATORS:
+        _check_expression(node.operand, variable_names)
+    elif isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        pass
+    elif isinstance(node, ast.Name):
+        if node.id not in CONSTANTS:
+            variable_names.add(node.id)
+    elif isinstance(node, ast.Attribute) and node.attr in VECTOR_COMPONENTS:
+        _check_expression(node.value, variable_names)
+    elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+        if node.func.id not in FUNCTIONS:
+            raise ValueError(f"unknown function {node.func.id}()")
+        for arg in node.args:
+            _check_expression(arg, variable_names)
+    else:
+        raise ValueError(f"unsupported syntax: {ast.unparse(node)}")
+
+
+def parse_derived_variables(text: str) -> List[DerivedVariable]:
+    """
+    Parse semicolon-separated definitions like ``Umag = mag(U); dp = p - 101325``
+
+    Raises:
+        ValueError: if any of the definitions is not valid
+    """
+    out = []
+    for definition in text.replace("\n", ";").split(";"):
+        if not definition.strip():
+            continue
+        try:
+            module = ast.parse(definition.strip())
+            if (len(module.body) != 1 or not isinstance(module.body[0], ast.Assign)
+                    or len(module.body[0].targets) != 1 or not isinstance(module.body[0].targets[0], ast.Name)):
+                raise ValueError("expected 'name = expression'")
+            assignment = module.body[0]
+            variable_names: Set[str] = set()
+            _check_expression(assignment.value, variable_names)
+            if not variable_names:
+                raise ValueError("expression doesn't use any variables")
+        except (SyntaxError, ValueError) as e:
+            message = e.msg if isinstance(e, SyntaxError) else str(e)
+            raise ValueError(f"Invalid derived variable '{definition.strip()}': {message}") from None
+        out.append(DerivedVariable(name=assignment.targets[0].id, expression=ast.unparse(assignment.value),
+                                   tree=assignment.value, variable_names=variable_names))
+    return out
+
+
+def _evaluate(node: ast.AST, variables: Dict[str, np.ndarray]):
+    if isinstance(node, ast.BinOp):
+        left, right = _align(_evaluate(node.left, variables), _evaluate(node.right, variables))
+        return _BINARY_OPERATORS[type(node.op)](left, right)
+    elif isinstance(node, ast.UnaryOp):
+        return _UNARY_OPERATORS[type(node.op)](_evaluate(node.operand, variables))
+    elif isinstance(node, ast.Constant):
+        return node.value
+    elif isinstance(node, ast.Name):
+        if node.id in CONSTANTS:
+            return CONSTANTS[node.id]
+        return variables[node.id]
+    elif isinstance(node, ast.Attribute):
+        value = _evaluate(node.value, variables)
+        if not isinstance(value, np.ndarray) or value.ndim != 2:
+            raise ValueError(f"{ast.unparse(node.value)} is not a vector")
+        return value[:, VECTOR_COMPONENTS[node.attr]]
+    elif isinstance(node, ast.Call):
+        return FUNCTIONS[node.func.id](*(_evaluate(arg, variables) for arg in node.args))
+    raise ValueError(f"unsupported syntax: {ast.unparse(node)}")  # rejected by _check_expression()
+
+
+def evaluate_derived_variable(derived_variable: DerivedVariable, variables: Dict[str, np.ndarray]) -> np.ndarray:
+    """
+    Evaluate expression over ``(n,)`` scalar and ``(n, 3)`` vector arrays of variables
+
+    Returns:
+        float32 array, ``(n,)`` for scalar or ``(n, 3)`` for vector result
+
+    Raises:
+        ValueError: if the expression can't be evaluated for given variables
+    """
+    n = next(iter(variables.values())).shape[0]
+    with np.errstate(all="ignore"):
+        try:
+            result = _evaluate(derived_variable.tree, variables)
+        except (TypeError, IndexError) as e:
+            raise ValueError(str(e)) from None
+    if not isinstance(result, np.ndarray) or result.shape not in ((n,), (n, 3)):
+        raise ValueError(f"result is not a scalar or vector (shape {np.shape(result)})")
+    return result.astype(np.float32, copy=False)
@@ -19,15 +19,35 @@
 # THE SOFTWARE.
 
 
-import mmap
+import collections
+import itertools
+import os
 import re
-from typing import List, Set, Dict
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, wait
+from typing import Any, Dict, Generator, Iterator, List, Optional, Set, Tuple
 import numpy as np
-from .ensightreader import read_case, GeometryPart, EnsightVariableFile, VariableLocation, VariableType, ElementType
+from .ensightreader import GeometryPart, EnsightVariableFile, VariableType, \
+    EnsightCaseFile, EnsightGeometryFile, ChangingGeometry
 from .material import create_new_material, setup_ensight_material_node_tree
+from .meshdata import PartMeshData, PerThreadFiles, read_part_mesh_data, read_part_bounding_box, \
+    merge_part_mesh_data, get_part_topology, check_part_mesh_data, add_derived_variables, is_point_cloud_part, \
+    read_part_point_cloud, read_structured_part_mesh_data
+from .derived import DerivedVariable, parse_derived_variables
+from .cache import MeshDataCache, get_part_cache_key
+from .playback import tag_animated_object, get_object_part_ids, get_int_attribute, assemble_vertex_data
+from .proxy import create_proxy_object
+from .reload import get_file_identities, get_topology_key
+from .lod import simplify_part_mesh_data
+from .roi import BoundingBoxCache, boxes_intersect, box_contains, crop_part_mesh_data
+from .structured import read_case, is_structured_part
+from .timesets import get_geometry_file, get_variable_file, get_file_timestep, get_number_of_timesteps
+from .profiling import ImportProfile
+from .varrange import VariableRangeCache, ValueRange, reduce_range, is_range_supported, is_empty_range
 
 from bpy_extras.io_utils import ImportHelper
-from bpy.props import StringProperty, IntProperty, BoolProperty
+from bpy.props import StringProperty, IntProperty, BoolProperty, EnumProperty, FloatVectorProperty
 from bpy.types import Operator, Object
 import bpy
 
@@ -58,6 +78,30 @@ class ImportEnsightGold(Operator, ImportHelper):
                     " use '*' to load all and '' to load none",
         default="*")
 
+    derived_variables: StringProperty(
+        name="Derived variables",
+        description="Semicolon-separated list of new variables computed from the loaded ones"
+                    " (eg. 'Umag = mag(U); dp = p - 101325'); use '' to not compute any",
+        default="")
+
+    tensor_components: BoolProperty(
+        name="Tensor components",
+        description="If checked, tensor variables are loaded as scalar attributes for each component"
+                    " (eg. 'S_11', 'S_12', ...)",
+        default=True)
+
+    tensor_von_mises: BoolProperty(
+        name="Tensor von Mises",
+        description="If checked, von Mises equivalent of tensor variables is loaded as scalar attribute"
+                    " (eg. 'S_von_mises')",
+        default=False)
+
+    tensor_principal: BoolProperty(
+        name="Tensor principal values",
+        description="If checked, principal values of tensor variables are loaded as scalar attributes"
+                    " (eg. 'S_principal_1' for the largest one)",
+        default=False)
+
     parts_include_regex: StringProperty(
         name="Parts to include",
         description="Regular expression for part names that should be loaded; use '.*' to load all",
@@ -69,6 +113,133 @@ class ImportEnsightGold(Operator, ImportHelper):
                     " takes priority over parts_include_regex; use '' to not exclude any",
         default="internalMesh")
 
+    roi_mode: EnumProperty(
+        name="Region of interest",
+        description="Load only parts (or their polygons) in given region",
+        items=[("NONE", "None", "Load parts regardless of their position"),
+               ("BOX", "Box", "Region given by minimum and maximum coordinates"),
+               ("OBJECT", "Object", "Region given by bounding box of an object")],
+        default="NONE")
+
+    roi_min: FloatVectorProperty(
+        name="Region minimum",
+        description="Minimum coordinates of the region of interest",
+        size=3,
+        subtype="XYZ",
+        default=(0.0, 0.0, 0.0))
+
+    roi_max: FloatVectorProperty(
+        name="Region maximum",
+        description="Maximum coordinates of the region of interest",
+        size=3,
+        subtype="XYZ",
+        default=(1.0, 1.0, 1.0))
+
+    roi_object: StringProperty(
+        name="Region object",
+        description="Name of object whose bounding box (in world coordinates) is the region of interest",
+        default="")
+
+    roi_crop: BoolProperty(
+        name="Crop to region",
+        description="If checked, parts crossing the boundary of the region are cropped to polygons reaching"
+                    " into it; otherwise they are loaded whole",
+        default=True)
+
+    extract_volume_skin: BoolProperty(
+        name="Extract surface of volume parts",
+        description="If checked, parts with volume elements (and 3D structured blocks) will be loaded"
+                    " as their boundary surface; otherwise they are not loaded",
+        default=False
+    )
+
+    structured_surface: EnumProperty(
+        name="Structured blocks",
+        description="Which surface of 3D structured blocks is loaded (2D blocks are always loaded whole)",
+        items=[("BOUNDARY", "Boundary", "Load boundary faces of the block"
+                                        " (only with 'Extract surface of volume parts')"),
+               ("I", "I plane", "Load plane of constant I index"),
+               ("J", "J plane", "Load plane of constant J index"),
+               ("K", "K plane", "Load plane of constant K index")],
+        default="BOUNDARY")
+
+    structured_plane_index: IntProperty(
+        name="Structured plane index",
+        description="Index of plane loaded from 3D structured blocks, starting from 0"
+                    " (negative values count from the last plane)",
+        default=0)
+
+    merge_parts: BoolProperty(
+        name="Merge parts into one object",
+        description="If checked, all parts will be loaded into single object with 'part_id' attribute"
+                    " identifying the part; this is faster to work with when there are many small parts",
+        default=False
+    )
+
+    point_clouds: EnumProperty(
+        name="Point clouds",
+        description="Which parts are loaded as point clouds (vertices only, elements are not read)",
+        items=[("AUTO", "Node-only parts", "Load parts with no elements or only point elements as point clouds"),
+               ("ALL", "All parts", "Load nodes of all parts as point clouds, ignoring their elements"),
+               ("NONE", "None", "Load all parts as meshes")],
+        default="AUTO")
+
+    point_cloud_max_points: IntProperty(
+        name="Point cloud max points",
+        description="Point clouds with more nodes than this are subsampled to at most this many points"
+                    " (0 means no subsampling)",
+        default=0,
+        min=0)
+
+    point_cloud_subsample: EnumProperty(
+        name="Point cloud subsampling",
+        description="How nodes of point clouds are chosen when subsampling",
+        items=[("STRIDE", "Stride", "Keep every n-th node"),
+               ("RANDOM", "Random", "Keep random nodes (the same ones in each time step)")],
+        default="STRIDE")
+
+    lod_target_faces: IntProperty(
+        name="LOD target faces",
+        description="Parts with more faces than this are simplified by vertex clustering to approximately"
+                    " this many faces (0 means no simplification)",
+        default=0,
+        min=0)
+
+    lod_grid_resolution: IntProperty(
+        name="LOD grid resolution",
+        description="If non-zero, parts are simplified by clustering vertices in a grid with this many cells"
+                    " along the longest side of their bounding box (takes precedence over LOD target faces)",
+        default=0,
+        min=0)
+
+    lod_keep_full_resolution: BoolProperty(
+        name="Keep full resolution",
+        description="If checked, simplified parts are also imported in full resolution, as objects"
+                    " hidden in the viewport and shown in renders (the simplified objects are not rendered)",
+        default=False)
+
+    validate_mesh: EnumProperty(
+        name="Mesh validation",
+        description="How imported meshes are checked for invalid polygons (which could crash Blender)",
+        items=[("NUMPY", "Fast", "Check vertex indices and degenerate polygons with NumPy while decoding parts"),
+               ("BLENDER", "Blender", "Use mesh.validate(), which is thorough but slow for big meshes"),
+               ("NONE", "None", "Don't check meshes (only for cases known to be valid)")],
+        default="NUMPY")
+
+    lazy_load: BoolProperty(
+        name="Load bounding boxes only",
+        description="If checked, only node coordinates are read and each part is represented by its bounding box;"
+                    " use Object > Load EnSight Parts to load the full geometry of selected boxes later",
+        default=False
+    )
+
+    part_ids: StringProperty(
+        name="Part IDs",
+        description="Comma-separated list of part IDs to load instead of using the regular expressions"
+                    " (used when loading bounding box proxies)",
+        default="",
+        options={'HIDDEN', 'SKIP_SAVE'})
+
     create_material: BoolProperty(
         name="Create material",
         description="If checked, imported objects will be given a new material with node setup"
@@ -76,75 +247,310 @@ class ImportEnsightGold(Operator, ImportHelper):
         default=True
     )
 
+    palette_range: EnumProperty(
+        name="Palette range",
+        description="Range of variable values mapped to the palette of the created material",
+        items=[("DEFAULT", "0 to 1", "Keep the default range from 0 to 1"),
+               ("TIMESTEP", "Time step", "Minimum and maximum of the variable in the imported time step"),
+               ("ALL_TIMESTEPS", "All time steps", "Minimum and maximum of the variable in all time steps")],
+        default="TIMESTEP")
+
+    animate: BoolProperty(
+        name="Animate time steps",
+        description="If checked, variable data (and node coordinates for transient geometry) will be updated"
+                    " from the case when the current frame changes",
+        default=False
+    )
+
+    timestep_shape_keys: BoolProperty(
+        name="Time steps as shape keys",
+        description="If checked and the geometry is transient with connectivity that doesn't change, node"
+                    " coordinates of all time steps are stored as shape keys driven by the current frame;"
+                    " only node coordinates are read for each time step",
+        default=False
+    )
+
+    frame_start: IntProperty(
+        name="First frame",
+        description="Frame showing time step 0 when animating time steps",
+        default=1)
+
+    prefetch_steps: IntProperty(
+        name="Prefetch time steps",
+        description="Number of following time steps to read in background when animating time steps",
+        default=2,
+        min=0)
+
+    cache_size_mb: IntProperty(
+        name="Time step cache size (MB)",
+        description="Memory limit for time step data kept in memory when animating time steps",
+        default=1024,
+        min=0)
+
+    num_threads: IntProperty(
+        name="Threads",
+        description="Number of threads reading parts in parallel (0 means one per CPU core)",
+        default=0,
+        min=0)
+
+    cache_directory: StringProperty(
+        name="Cache directory",
+        description="Directory for storing decoded parts, so that importing the same case again"
+                    " does not have to read the EnSight files; use '' to disable caching",
+        default="",
+        subtype="DIR_PATH")
+
+    range_cache_directory: StringProperty(
+        name="Range cache directory",
+        description="Directory for storing variable ranges when it should differ from the cache directory"
+                    " (used by batch conversion to share ranges between Blender processes)",
+        default="",
+        options={'HIDDEN', 'SKIP_SAVE'})
+
+    profile_import: BoolProperty(
+        name="Profile import",
+        description="If checked, time spent in each phase of the import, bytes read and peak memory"
+                    " are measured and reported at the end of the import",
+        default=False)
+
+    profile_path: StringProperty(
+        name="Profile output",
+        description="JSON file to write the import profile to (enables profiling);"
+                    " use '' to not write any file",
+        default="",
+        subtype="FILE_PATH")
+
+    run_modal: BoolProperty(
+        name="Run modal",
+        description="Import in the background, keeping the user interface responsive; the import"
+                    " can be cancelled with Esc (this is used when invoked from the user interface)",
+        default=False,
+        options={'HIDDEN', 'SKIP_SAVE'})
+
+    # main thread work done in one timer tick of the modal import, in seconds
+    MODAL_TIME_BUDGET = 0.05
+
+    def invoke(self, context, event) -> Set[str]:
+        self.run_modal = not bpy.app.background
+        return ImportHelper.invoke(self, context, event)
+
     def execute(self, context) -> Set[str]:
+        options_error = self.get_options_error()
+        if options_error is not None:
+            self.report({"ERROR"}, options_error)
+            return {'CANCELLED'}
+
+        steps = self.import_steps()
+
+        if self.run_modal and not bpy.app.background:
+            self._steps = steps
+            wm = context.window_manager
+            self._timer = wm.event_timer_add(0.01, window=context.window)
+            wm.modal_handler_add(self)
+            return {'RUNNING_MODAL'}
+
+        for future in steps:
+            if future is not None:
+                wait([future])
+
+        return {'FINISHED'}
+
+    def get_options_error(self) -> Optional[str]:
+        """Return message describing what's wrong with the import options, or None if they are fine"""
+        if self.roi_mode == "OBJECT" and bpy.data.objects.get(self.roi_object) is None:
+            return f"Region of interest object {self.roi_object!r} not found"
+        try:
+            parse_derived_variables(self.derived_variables)
+        except ValueError as e:
+            return str(e)
+        return None
+
+    def modal(self, context, event) -> Set[str]:
+        if event.type == "ESC" and event.value == "PRESS":
+            self._steps.close()  # removes everything created so far
+            self.finish_modal(context)
+            self.report({"WARNING"}, "Import of EnSight Gold case was cancelled")
+            return {'CANCELLED'}
+
+        if event.type == "TIMER":
+            deadline = time.perf_counter() + self.MODAL_TIME_BUDGET
+            try:
+                while time.perf_counter() < deadline:
+                    if next(self._steps) is not None:
+                        break  # waiting for worker threads, try again on next tick
+            except StopIteration:
+                self.finish_modal(context)
+                return {'FINISHED'}
+            except Exception as e:
+                self.finish_modal(context)
+                self.report({"ERROR"}, f"Failed to import EnSight Gold case: {e}")
+                return {'CANCELLED'}
+
+        return {'PASS_THROUGH'}
+
+    def finish_modal(self, context):
+        context.window_manager.event_timer_remove(self._timer)
+        self.update_status(None)
+
+    def update_status(self, text: Optional[str]):
+        if self.run_modal and bpy.context.workspace is not None:
+            bpy.context.workspace.status_text_set(text)
+
+    def import_steps(self) -> Iterator[Optional[Future]]:
+        """
+        Import the case, yielding after each piece of work done on the main thread
+
+        This yields None when the caller may do something else (eg. handle UI events)
+        or a `Future` which needs to finish before the import can continue.
+        Closing the generator cancels the import and removes all datablocks created so far.
+        """
+        num_threads = self.num_threads or os.cpu_count() or 1
+        executor = ThreadPoolExecutor(max_workers=num_threads, thread_name_prefix="ensight-decode")
+        self._new_datablocks = []
+        self._profile = ImportProfile(enabled=self.profile_import or bool(self.profile_path))
+        self._profile.start()
+
+        try:
+            yield from self.import_case(executor, num_threads)
+        except BaseException:
+            # cancelled or failed, don't leave half-imported case in the file
+            bpy.data.batch_remove(self._new_datablocks)
+            raise
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            bpy.context.window_manager.progress_end()
+            self._profile.stop()
+            self._new_datablocks = []
+
+        if self._profile.enabled:
+            self.report_profile()
+
+    def report_profile(self):
+        from . import bl_info
+
+        profile = self._profile
+        options = self.as_keywords(ignore=("filter_glob", "run_modal", "profile_import", "profile_path"))
+        profile.metadata.update({
+            "case": self.filepath,
+            "addon_version": ".".join(map(str, bl_info["version"])),
+            "blender_version": bpy.app.version_string,
+            # vector properties (region of interest) are not JSON serializable as they are
+            "options": {key: value if isinstance(value, (str, int, float, bool)) else list(value)
+                        for key, value in options.items()},
+        })
+
+        for line in profile.summary():
+            self.report({"INFO"}, line)
+
+        if self.profile_path:
+            profile_path = bpy.path.abspath(self.profile_path)
+            profile.write_json(profile_path)
+            self.report({"INFO"}, f"Wrote import profile to {profile_path}")
+
+    def import_case(self, executor: ThreadPoolExecutor, num_threads: int) -> Iterator[Optional[Future]]:
         timestep = self.timestep
         path_to_case = self.filepath
         parts_include_regex = re.compile(self.parts_include_regex or ".*")
         parts_exclude_regex = re.compile(self.parts_exclude_regex or "$^")
         requested_variables = self.variables.split(",")
+        requested_part_ids = {int(x) for x in self.part_ids.split(",") if x.strip()}
+        derived_variables = parse_derived_variables(self.derived_variables)
 
         # ---------------------------------------------------------------------------------
 
         self.report({"INFO"}, f"Reading case {path_to_case}")
-        case = read_case(path_to_case)
-        geofile = case.get_geometry_model(timestep)
+        self.update_status(f"Reading EnSight case {path_to_case} (Esc to cancel)")
+
+        profile = self._profile
+
+        def read_case_and_geometry():
+            with profile.phase("read case"):
+                case = read_case(path_to_case)
+                return case, get_geometry_file(case, timestep)
+
+        case, geofile = yield from wait_for(executor.submit(read_case_and_geometry))
 
         parts_to_read: List[GeometryPart] = []
         for part_id, part in geofile.parts.items():
             part_name = part.part_name
-            if parts_exclude_regex.search(part_name):
+            if requested_part_ids:
+                if part_id in requested_part_ids:
+                    self.report({"INFO"}, f"Reading part {part_name}")
+                    parts_to_read.append(part)
+            elif parts_exclude_regex.search(part_name):
                 self.report({"INFO"}, f"Not reading part {part_name} (parts_exclude_regex matches)")
             elif not parts_include_regex.search(part_name):
                 self.report({"INFO"}, f"Not reading part {part_name} (parts_include_regex does not match)")
             else:
-                if part.is_volume():
+                if part.is_volume() and not self.extract_volume_skin and self.point_clouds != "ALL" \
+                        and not (is_structured_part(part) and self.structured_surface != "BOUNDARY"):
                     self.report({"WARNING"}, f"Not reading part {part_name} (has volume elements)")
                 else:
                     self.report({"INFO"}, f"Reading part {part_name}")
                     parts_to_read.append(part)
 
+        roi_box = self.get_roi_box()
+        part_boxes: Dict[int, np.ndarray] = {}
+        crop_part_ids: Set[int] = set()
+        if roi_box is not None or self.lazy_load:
+            part_boxes = yield from self.read_bounding_boxes(executor, geofile.file_path, parts_to_read)
+        if roi_box is not None:
+            for part in [part for part in parts_to_read if not boxes_intersect(part_boxes[part.part_id], roi_box)]:
+                self.report({"INFO"}, f"Not reading part {part.part_name} (outside region of interest)")
+                parts_to_read.remove(part)
+            if self.roi_crop:
+                # parts inside the region don't need cropping
+                crop_part_ids = {part.part_id for part in parts_to_read
+                                 if not box_contains(roi_box, part_boxes[part.part_id])}
+
         variables_to_read: List[EnsightVariableFile] = []
         for variable_name in case.get_variables():
-            variable = case.get_variable(variable_name, timestep)
-            if variable.variable_location != VariableLocation.PER_NODE:
-                self.report({"WARNING"}, f"Not reading variable {variable_name} (per-element variables are not supported)")
-            elif not (variable_name in requested_variables or "*" in requested_variables):
+            variable = get_variable_file(case, variable_name, timestep)
+            if not (variable_name in requested_variables or "*" in requested_variables):
                 self.report({"INFO"}, f"Not reading variable {variable_name} (not in requested variables)")
             else:
                 variables_to_read.append(variable)
 
-        variables_file_dict = {}
-        variables_mmap_dict = {}
-        created_objects: List[Object] = []
+        # remember which files the objects come from, so that they can be reloaded when the files change
+        file_identities = get_file_identities([path_to_case, geofile.file_path] +
+                                              [variable.file_path for variable in variables_to_read])
 
-        with geofile.mmap() as mm_geo:
-            try:
-                for variable in variables_to_read:
-                    variables_file_dict[variable.variable_name] = fp = open(variable.file_path, "rb")
-                    variables_mmap_dict[variable.variable_name] = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        bpy.context.window_manager.progress_begin(0, max(len(parts_to_read), 1))
+
+        if self.lazy_load:
+            created_objects = yield from self.create_proxy_objects(parts_to_read, part_boxes)
+        else:
+            created_objects = yield from self.create_part_objects(executor, num_threads, geofile.file_path,
+                                                                  parts_to_read, variables_to_read, path_to_case,
+                                                                  derived_variables, roi_box, crop_part_ids)
 
-                for part in parts_to_read:
-                    self.report({"INFO"}, f"Reading data for part {part.part_name}")
+        import_options = self.get_reimport_options()
+        for obj in created_objects:
+            obj["ensight_case_path"] = path_to_case
+            obj["ensight_timestep"] = timestep
+            if self.lazy_load:
+                continue
+            obj["ensight_import_options"] = import_options
+            obj["ensight_files"] = file_identities
+            obj["ensight_topology"] = get_topology_key(geofile, get_object_part_ids(obj))
+            if self.animate:
+                tag_animated_object(obj, self.frame_start, self.cache_size_mb, self.prefetch_steps)
 
-                    obj = self.convert_ensight_part_to_blender_object(part, variables_to_read, mm_geo,
-                                                                      variables_mmap_dict)
-                    created_objects.append(obj)
-            finally:
-                for mm in variables_mmap_dict.values():
-                    mm.close()
-                for fp in variables_file_dict.values():
-                    fp.close()
+        if self.timestep_shape_keys and not self.lazy_load and created_objects:
+            yield from self.create_timestep_shape_keys(executor, num_threads, case, geofile, created_objects)
 
         # ---------------------------------------------------------------------------------
 
         self.report({"INFO"}, f"Adding {len(created_objects)} objects to scene")
+        context = bpy.context
         scene = context.scene
 
-        bpy.ops.object.select_all(action='DESELECT')
-        for obj in created_objects:
-            self.report({"DEBUG"}, f"linking object {obj}")
-            scene.collection.objects.link(obj)
-            obj.select_set(True)
+        with self._profile.phase("link objects"):
+            bpy.ops.object.select_all(action='DESELECT')
+            for obj in created_objects:
+                self.report({"DEBUG"}, f"linking object {obj}")
+                scene.collection.objects.link(obj)
+                obj.select_set(True)
 
         if created_objects:
             context.view_layer.objects.active = created_objects[0]
@@ -152,138 +558,556 @@ class ImportEnsightGold(Operator, ImportHelper):
             self.report({"WARNING"}, f"No objects were created")
 
         if self.create_material:
+            variable_ranges: Dict[str, ValueRange] = {}
+            if self.palette_range != "DEFAULT":
+                variable_ranges = yield from self.compute_variable_ranges(
+                    executor, case, [v for v in variables_to_read if is_range_supported(v)],
+                    [part.part_id for part in parts_to_read])
+
             self.report({"INFO"}, f"Creating EnSight material")
-            mat = create_new_material("EnSightMaterial")
-            default_variable = variables_to_read[0] if variables_to_read else None
-            if default_variable:
-                setup_ensight_material_node_tree(
-                    mat,
-                    default_attribute_name=default_variable.variable_name,
-                    default_attribute_is_vector=default_variable.variable_type == VariableType.VECTOR)
-            else:
-                setup_ensight_material_node_tree(mat)
+            with self._profile.phase("create material"):
+                mat = create_new_material("EnSightMaterial")
+                self._new_datablocks.append(mat)
+                # tensors are split into several attributes, the material shows a scalar or vector
+                default_variable = next((v for v in variables_to_read
+                                         if v.variable_type in (VariableType.SCALAR, VariableType.VECTOR)), None)
+                if default_variable:
+                    setup_ensight_material_node_tree(
+                        mat,
+                        default_attribute_name=default_variable.variable_name,
+                        default_attribute_is_vector=default_variable.variable_type == VariableType.VECTOR,
+                        palette_range=variable_ranges.get(default_variable.variable_name))
+                else:
+                    setup_ensight_material_node_tree(mat)
+                # ranges of the other variables, for switching the variable shown by the material
+                mat["ensight_variable_ranges"] = {name: list(value_range)
+                                                  for name, value_range in variable_ranges.items()}
 
-            for obj in created_objects:
-                obj.data.materials.append(mat)
+                for obj in created_objects:
+                    obj.data.materials.append(mat)
 
         self.report({"INFO"}, f"Finished importing EnSight Gold case")
 
-        return {'FINISHED'}
+    def create_part_objects(self, executor: ThreadPoolExecutor, num_threads: int, geometry_file_path: str,
+                            parts_to_read: List[GeometryPart], variables_to_read: List[EnsightVariableFile],
+                            path_to_case: str, derived_variables: List[DerivedVariable],
+                            roi_box: Optional[np.ndarray], crop_part_ids: Set[int]
+                            ) -> Generator[Optional[Future], None, List[Object]]:
+        created_objects: List[Object] = []
+        parts_to_merge: List[PartMeshData] = []
+
+        files = PerThreadFiles(geometry_file_path, {v.variable_name: v.file_path for v in variables_to_read})
+
+        cache = MeshDataCache(bpy.path.abspath(self.cache_directory)) if self.cache_directory else None
+        tensor_outputs = [name for name, enabled in [("COMPONENTS", self.tensor_components),
+                                                     ("VON_MISES", self.tensor_von_mises),
+                                                     ("PRINCIPAL", self.tensor_principal)] if enabled]
+        cache_options = {"extract_volume_skin": self.extract_volume_skin,
+                         "tensor_outputs": tensor_outputs,
+                         "derived_variables": [[v.name, v.expression] for v in derived_variables]}
+        point_cloud_cache_options = {"point_cloud_max_points": self.point_cloud_max_points,
+                                     "point_cloud_subsample": self.point_cloud_subsample,
+                                     "tensor_outputs": tensor_outputs,
+                                     "derived_variables": cache_options["derived_variables"]}
+        structured_cache_options = dict(cache_options, structured_surface=self.structured_surface,
+                                        structured_plane_index=self.structured_plane_index)
+
+        # the functions below run on worker threads, which must not touch operator properties
+        # (RNA is not thread safe and the main thread keeps running Blender during modal import)
+        profile = self._profile
+        point_clouds = self.point_clouds
+        point_cloud_max_points = self.point_cloud_max_points
+        point_cloud_subsample = self.point_cloud_subsample
+        structured_surface = self.structured_surface
+        structured_plane_index = self.structured_plane_index
+        extract_volume_skin = self.extract_volume_skin
+        merge_parts = self.merge_parts
+        lod_grid_resolution = self.lod_grid_resolution
+        lod_target_faces = self.lod_target_faces
+        lod_keep_full_resolution = self.lod_keep_full_resolution
+        validate_mesh = self.validate_mesh
+
+        def is_point_cloud(part: GeometryPart) -> bool:
+            return point_clouds == "ALL" or (point_clouds == "AUTO" and is_point_cloud_part(part))
+
+        def read_part(part: GeometryPart) -> PartMeshData:
+            if cache is not None:
+                with profile.phase("load from cache", part.part_name):
+                    if is_point_cloud(part):
+                        options = point_cloud_cache_options
+                    elif is_structured_part(part):
+                        options = structured_cache_options
+                    else:
+                        options = cache_options
+                    cache_key = get_part_cache_key(geometry_file_path, part, variables_to_read, options)
+                    mesh_data = cache.load(cache_key)
+                if mesh_data is not None:
+                    profile.add_part_counters(part.part_name, array_bytes=mesh_data.nbytes)
+                    return mesh_data
+
+            fp_geo, variables_fp_dict = files.get()
+            bytes_read = files.bytes_read()
+            if is_point_cloud(part):
+                mesh_data = read_part_point_cloud(part, variables_to_read, fp_geo, variables_fp_dict,
+                                                  max_points=point_cloud_max_points,
+                                                  subsample=point_cloud_subsample,
+                                                  tensor_outputs=tensor_outputs, profile=profile)
+            elif is_structured_part(part):
+                mesh_data = read_structured_part_mesh_data(part, variables_to_read, fp_geo, variables_fp_dict,
+                                                           surface=structured_surface,
+                                                           plane_index=structured_plane_index,
+                                                           tensor_outputs=tensor_outputs, profile=profile)
+            else:
+                mesh_data = read_part_mesh_data(part, variables_to_read, fp_geo, variables_fp_dict,
+                                                extract_volume_skin=extract_volume_skin,
+                                                tensor_outputs=tensor_outputs, profile=profile)
+            if derived_variables:
+                with profile.phase("derived variables", part.part_name):
+                    add_derived_variables(mesh_data, derived_variables)
+            profile.add_part_counters(part.part_name, bytes_read=files.bytes_read() - bytes_read,
+                                      array_bytes=mesh_data.nbytes)
+
+            if cache is not None:
+                with profile.phase("store to cache", part.part_name):
+                    cache.store(cache_key, mesh_data)
+            return mesh_data
+
+        simplify = bool(lod_target_faces or lod_grid_resolution)
 
-    def convert_ensight_part_to_blender_object(self, part: GeometryPart, variables_to_read: List[EnsightVariableFile],
-                                               mm_geo: mmap.mmap, variables_mmap_dict: Dict[str, mmap.mmap]) -> Object:
+        def simplify_part(mesh_data: PartMeshData) -> Tuple[PartMeshData, Optional[PartMeshData]]:
+            """Return ``(mesh_data, full_resolution_mesh_data)``, the latter only if it should be kept"""
+            if not simplify:
+                return mesh_data, None
+            with profile.phase("simplify", mesh_data.part_name):
+                lod_mesh_data = simplify_part_mesh_data(mesh_data, grid_resolution=lod_grid_resolution,
+                                                        target_faces=lod_target_faces)
+            if lod_mesh_data is None:
+                return mesh_data, None
+            return lod_mesh_data, mesh_data if lod_keep_full_resolution else None
+
+        def check_part(mesh_data: PartMeshData) -> PartMeshData:
+            if validate_mesh != "NUMPY":
+                return mesh_data
+            with profile.phase("check mesh", mesh_data.part_name):
+                return check_part_mesh_data(mesh_data)
+
+        def crop_part(mesh_data: PartMeshData) -> PartMeshData:
+            if mesh_data.part_id not in crop_part_ids:
+                return mesh_data
+            with profile.phase("crop to region", mesh_data.part_name):
+                return crop_part_mesh_data(mesh_data, roi_box)
+
+        def decode_part(part: GeometryPart) -> Tuple[PartMeshData, Optional[PartMeshData]]:
+            if is_point_cloud(part):
+                return crop_part(read_part(part)), None  # nothing to check, subsampling replaces simplification
+            if merge_parts:
+                return crop_part(check_part(read_part(part))), None  # merged mesh is simplified as a whole
+            return simplify_part(crop_part(check_part(read_part(part))))
+
+        # Parts are decoded on worker threads while meshes are built here on the main thread;
+        # keep only a few decoded parts in flight to bound memory usage.
+        pending_parts = collections.deque()
+        parts_iter = iter(parts_to_read)
+        try:
+            for part in itertools.islice(parts_iter, 2*num_threads):
+                pending_parts.append(executor.submit(decode_part, part))
+
+            for i in range(len(parts_to_read)):
+                mesh_data, full_mesh_data = yield from wait_for(pending_parts.popleft())
+                part = next(parts_iter, None)
+                if part is not None:
+                    pending_parts.append(executor.submit(decode_part, part))
+
+                for level, message in mesh_data.messages:
+                    self.report({level}, message)
+
+                bpy.context.window_manager.progress_update(i)
+                self.update_status(f"Importing EnSight part {i+1}/{len(parts_to_read)}: {mesh_data.part_name}"
+                                   f" (Esc to cancel)")
+
+                if merge_parts:
+                    parts_to_merge.append(mesh_data)
+                    continue
+
+                self.report({"INFO"}, f"Creating object for part {mesh_data.part_name}")
+                for obj in (yield from self.create_lod_objects(mesh_data, full_mesh_data)):
+                    obj["ensight_part_id"] = mesh_data.part_id
+                    created_objects.append(obj)
+        finally:
+            for future in pending_parts:
+                future.cancel()
+            files.close_after(pending_parts)
+
+        if merge_parts and parts_to_merge:
+            self.report({"INFO"}, f"Creating object from {len(parts_to_merge)} merged parts")
+            self.update_status(f"Merging {len(parts_to_merge)} EnSight parts (Esc to cancel)")
+            merged_name = os.path.splitext(os.path.basename(path_to_case))[0]
+
+            def merge_all_parts():
+                with profile.phase("merge parts"):
+                    merged_mesh_data = merge_part_mesh_data(parts_to_merge, merged_name)
+                parts_to_merge.clear()  # free per-part arrays before creating the mesh
+                return simplify_part(merged_mesh_data)
+
+            mesh_data, full_mesh_data = yield from wait_for(executor.submit(merge_all_parts))
+            for level, message in mesh_data.messages:
+                self.report({level}, message)
+            for obj in (yield from self.create_lod_objects(mesh_data, full_mesh_data)):
+                obj["ensight_part_ids"] = [part.part_id for part in parts_to_read]
+                created_objects.append(obj)
+
+        return created_objects
+
+    def create_lod_objects(self, mesh_data: PartMeshData,
+                           full_mesh_data: Optional[PartMeshData]) -> Generator[None, None, List[Object]]:
+        """Create object for the (possibly simplified) part and its hidden full resolution copy, if given"""
+        obj = yield from self.convert_ensight_part_to_blender_object(mesh_data)
+        if full_mesh_data is None:
+            return [obj]
+
+        obj["ensight_lod"] = True
+        obj.hide_render = True
+        self.report({"INFO"}, f"Creating full resolution object for part {full_mesh_data.part_name}")
+        full_obj = yield from self.convert_ensight_part_to_blender_object(full_mesh_data)
+        full_obj.name = f"{full_mesh_data.part_name} (full resolution)"
+        full_obj["ensight_full_resolution"] = True
+        full_obj.hide_viewport = True
+        return [obj, full_obj]
+
+    def get_reimport_options(self) -> Dict[str, Any]:
+        """Return import options needed to import some parts of the case again, in the same way"""
+        return self.as_keywords(ignore=("filepath", "filter_glob", "timestep", "parts_include_regex",
+                                        "parts_exclude_regex", "part_ids", "lazy_load", "create_material",
+                                        "palette_range", "range_cache_directory", "run_modal", "profile_import",
+                                        "profile_path"))
+
+    def get_roi_box(self) -> Optional[np.ndarray]:
+        """Return ``(2, 3)`` box of minimum and maximum coordinates of the region of interest, if any"""
+        if self.roi_mode == "BOX":
+            return np.array([self.roi_min, self.roi_max], dtype=np.float32)
+        elif self.roi_mode == "OBJECT":
+            obj = bpy.data.objects.get(self.roi_object)
+            if obj is None:
+                raise ValueError(f"Region of interest object {self.roi_object!r} not found")
+            matrix_world = np.array(obj.matrix_world, dtype=np.float32)
+            corners = np.array(obj.bound_box, dtype=np.float32) @ matrix_world[:3, :3].T + matrix_world[:3, 3]
+            return np.stack([corners.min(axis=0), corners.max(axis=0)])
+        return None
+
+    def read_bounding_boxes(self, executor: ThreadPoolExecutor, geometry_file_path: str,
+                            parts: List[GeometryPart]) -> Generator[Optional[Future], None, Dict[int, np.ndarray]]:
         # -------------------------------------------------------------------------
-        # Read geometry
-        # - create Blender mesh object and import geometry data using NumPy arrays
-        # - adapted from code example by Paul Melis on devtalk.blender.org:
-        #   https://devtalk.blender.org/t/alternative-in-2-80-to-create-meshes-from-python-using-the-tessfaces-api/7445
+        # Read bounding boxes of parts (for region of interest and bounding box proxies)
+        # - only node coordinates are read, in chunks on worker threads; boxes are cached
+        #   (in the cache directory, if any) so that this is done only once per geometry file
         # -------------------------------------------------------------------------
 
-        vertices = part.read_nodes(mm_geo).flatten()
+        box_cache = BoundingBoxCache(self.filepath,
+                                     bpy.path.abspath(self.cache_directory) if self.cache_directory else None)
+        file_key = box_cache.get_file_key(geometry_file_path)
+        files = PerThreadFiles(geometry_file_path, {})
+        profile = self._profile
 
-        vertex_index_ = []
-        loop_start_ = []
-        loop_total_ = []
+        def read_bounding_box(part: GeometryPart) -> np.ndarray:
+            bounding_box = box_cache.get(file_key, part.part_id)
+            if bounding_box is not None:
+                return bounding_box
+            fp_geo, _ = files.get()
+            bytes_read = files.bytes_read()
+            with profile.phase("read bounding box", part.part_name):
+                bounding_box = read_part_bounding_box(part, fp_geo)
+            profile.add_part_counters(part.part_name, bytes_read=files.bytes_read() - bytes_read)
+            box_cache.put(file_key, part.part_id, bounding_box)
+            return bounding_box
 
-        block_loop_start = 0
+        self.update_status(f"Reading bounding boxes of {len(parts)} EnSight parts (Esc to cancel)")
+        bounding_boxes: Dict[int, np.ndarray] = {}
+        futures = [executor.submit(read_bounding_box, part) for part in parts]
+        try:
+            for part, future in zip(parts, futures):
+                bounding_boxes[part.part_id] = yield from wait_for(future)
+        finally:
+            for future in futures:
+                future.cancel()
+            files.close_after(futures)
 
-        for block in part.element_blocks:
-            self.report({"DEBUG"}, f"Element block with {block.number_of_elements} {block.element_type} elements")
-            if block.element_type == ElementType.BAR3:
-                # TODO support BAR3 elements - we need to split them into two line segments to avoid getting TRIA3
-                self.report({"WARNING"}, f"Skipping {block.element_type.value} element block - please use BAR2 instead")
-                continue
-            if block.element_type.dimension not in (1, 2):
-                self.report({"DEBUG"}, f"Skipping {block.element_type.value} element block - unsupported dimension")
-                continue
+        box_cache.save()
+        return bounding_boxes
 
-            if block.element_type == block.element_type.NSIDED:
-                polygon_node_counts, polygon_connectivity = block.read_connectivity_nsided(mm_geo)
-            else:
-                connectivity = block.read_connectivity(mm_geo)
-                polygon_node_counts = np.full((connectivity.shape[0],), connectivity.shape[1])
-                polygon_connectivity = connectivity.flatten()
-
-            vertex_index_.append(polygon_connectivity)
-            tmp = np.cumsum(polygon_node_counts, dtype=np.int32)
-            tmp -= polygon_node_counts
-            tmp += block_loop_start
-            loop_start_.append(tmp)
-            loop_total_.append(polygon_node_counts)
-            block_loop_start += len(polygon_connectivity)
-
-        have_cells = len(vertex_index_) > 0
-
-        if have_cells:
-            vertex_index = np.concatenate(vertex_index_).astype(np.int32)
-            vertex_index -= 1  # Blender numbers vertices from 0
-            loop_start = np.concatenate(loop_start_).astype(np.int32)
-            loop_total = np.concatenate(loop_total_).astype(np.int32)
-        else:
-            vertex_index = np.ndarray((0,), dtype=np.int32)
-            loop_start = np.ndarray((0,), dtype=np.int32)
-            loop_total = np.ndarray((0,), dtype=np.int32)
+    def create_proxy_objects(self, parts_to_read: List[GeometryPart],
+                             part_boxes: Dict[int, np.ndarray]) -> Generator[None, None, List[Object]]:
+        if self.merge_parts:
+            self.report({"WARNING"}, "Parts are not merged when loading bounding boxes only")
+
+        # remember how the parts should be imported once the user decides to load them
+        import_options = self.get_reimport_options()
+        del import_options["merge_parts"]
+
+        created_objects: List[Object] = []
+        for i, part in enumerate(parts_to_read):
+            self.report({"INFO"}, f"Creating bounding box for part {part.part_name}")
+            bpy.context.window_manager.progress_update(i)
+            obj = create_proxy_object(part.part_name, part_boxes[part.part_id])
+            self._new_datablocks += [obj.data, obj]
+            obj["ensight_part_id"] = part.part_id
+            obj["ensight_import_options"] = import_options
+            created_objects.append(obj)
+            yield
+
+        return created_objects
+
+    def create_timestep_shape_keys(self, executor: ThreadPoolExecutor, num_threads: int, case: EnsightCaseFile,
+                                   geofile: EnsightGeometryFile, objects: List[Object]) -> Iterator[Optional[Future]]:
+        # -------------------------------------------------------------------------
+        # Store node coordinates of all time steps as absolute shape keys
+        # - this only works if all time steps have the same element blocks (and number of nodes),
+        #   then we just read the nodes and keep the topology built for the imported time step
+        # -------------------------------------------------------------------------
 
-        num_vertices = vertices.shape[0] // 3
-        num_vertex_indices = vertex_index.shape[0]
-        num_loops = loop_start.shape[0]
+        timeset = case.geometry_model.timeset
+        if timeset is None:
+            self.report({"WARNING"}, "Geometry is not transient, not creating shape keys")
+            return
 
-        mesh = bpy.data.meshes.new(name=part.part_name)
+        part_ids = sorted({part_id for obj in objects for part_id in get_object_part_ids(obj)})
+        number_of_timesteps = timeset.number_of_steps
+        reference_topology = {part_id: get_part_topology(geofile.parts[part_id]) for part_id in part_ids}
+        profile = self._profile
 
-        mesh.vertices.add(num_vertices)
-        mesh.vertices.foreach_set("co", vertices)
+        # geometry of each time step is parsed on its own, without going through (and filling up)
+        # the file cache of the case, which is not thread safe
+        def is_static(timestep: int) -> bool:
+            with profile.phase("check topology"):
+                parts = case.geometry_model.read_file(timestep).parts
+                return all(part_id in parts and get_part_topology(parts[part_id]) == reference_topology[part_id]
+                           for part_id in part_ids)
 
-        if have_cells:
-            mesh.loops.add(num_vertex_indices)
-            mesh.loops.foreach_set("vertex_index", vertex_index)
+        def read_timestep_nodes(timestep: int) -> Dict[int, np.ndarray]:
+            with profile.phase("read nodes for shape keys"):
+                timestep_geofile = case.geometry_model.read_file(timestep)
+                with open(timestep_geofile.file_path, "rb") as fp:
+                    return {part_id: timestep_geofile.parts[part_id].read_nodes(fp).ravel() for part_id in part_ids}
 
-            mesh.polygons.add(num_loops)
-            mesh.polygons.foreach_set("loop_start", loop_start)
-            mesh.polygons.foreach_set("loop_total", loop_total)
+        self.report({"INFO"}, f"Checking topology of {number_of_timesteps} time steps")
+        self.update_status(f"Checking topology of {number_of_timesteps} EnSight time steps (Esc to cancel)")
+        # geometry file may declare that only coordinates change, otherwise check all time steps
+        declared_static = all(geofile.parts[part_id].changing_geometry in (ChangingGeometry.NO_CHANGE,
+                                                                           ChangingGeometry.COORD_CHANGE)
+                              for part_id in part_ids)
+        if not declared_static:
+            futures = [executor.submit(is_static, timestep) for timestep in range(number_of_timesteps)]
+            for timestep, future in enumerate(futures):
+                if not (yield from wait_for(future)):
+                    self.report({"WARNING"}, f"Connectivity changes in time step {timestep}, not creating shape keys")
+                    return
 
-        mesh.update()
-        mesh.validate()
+        targets = []
+        for obj in objects:
+            mesh = obj.data
+            obj.shape_key_add(name="Basis", from_mix=False)
+            mesh.shape_keys.use_relative = False
+            targets.append((obj, get_object_part_ids(obj), get_int_attribute(mesh, "ensight_node_index"),
+                            get_int_attribute(mesh, "part_id") if "ensight_part_ids" in obj else None))
 
-        obj = bpy.data.objects.new(part.part_name, mesh)
+        # read node coordinates on worker threads, keeping only a few time steps in flight
+        pending_timesteps = collections.deque()
+        timesteps_iter = iter(range(number_of_timesteps))
+        for timestep in itertools.islice(timesteps_iter, 2*num_threads):
+            pending_timesteps.append(executor.submit(read_timestep_nodes, timestep))
 
+        try:
+            for timestep in range(number_of_timesteps):
+                nodes = yield from wait_for(pending_timesteps.popleft())
+                next_timestep = next(timesteps_iter, None)
+                if next_timestep is not None:
+                    pending_timesteps.append(executor.submit(read_timestep_nodes, next_timestep))
+
+                self.update_status(f"Creating shape key for EnSight time step {timestep+1}/{number_of_timesteps}"
+                                   f" (Esc to cancel)")
+                with self._profile.phase("create shape keys"):
+                    for obj, obj_part_ids, node_index, vertex_part_id in targets:
+                        coordinates = assemble_vertex_data({part_id: nodes[part_id] for part_id in obj_part_ids}, 3,
+                                                           len(obj.data.vertices), node_index, vertex_part_id)
+                        key_block = obj.shape_key_add(name=f"Time step {timestep}", from_mix=False)
+                        key_block.data.foreach_set("co", coordinates)
+                yield
+        finally:
+            for future in pending_timesteps:
+                future.cancel()
+
+        # absolute shape keys are placed 10 units of eval_time apart, Basis being at 0
+        for obj, *_ in targets:
+            fcurve = obj.data.shape_keys.driver_add("eval_time")
+            fcurve.driver.type = "SCRIPTED"
+            fcurve.driver.expression = f"clamp(10 * (frame - {self.frame_start} + 1), 10, {10*number_of_timesteps})"
+            obj["ensight_shape_key_timesteps"] = number_of_timesteps
+
+        self.report({"INFO"}, f"Created shape keys for {number_of_timesteps} time steps")
+
+    def compute_variable_ranges(self, executor: ThreadPoolExecutor, case: EnsightCaseFile,
+                                variables: List[EnsightVariableFile],
+                                part_ids: List[int]) -> Generator[Optional[Future], None, Dict[str, ValueRange]]:
         # -------------------------------------------------------------------------
-        # Read variable data
-        # - attach per-node variables from EnSight case as scalar/vector attributes
+        # Compute minimum and maximum of variables (magnitude for vectors) over imported parts
+        # - values are read in chunks from the variable files of each time step on worker threads,
+        #   ranges are cached (in the cache directory, if any) so that this is done only once per file
         # -------------------------------------------------------------------------
 
-        for variable in variables_to_read:
-            variable_name = variable.variable_name
-            if not variable.is_defined_for_part_id(part.part_id):
-                self.report({"INFO"}, f"Skipping variable {variable_name} (not defined for this part)")
-                continue
+        range_cache_directory = self.range_cache_directory or self.cache_directory
+        range_cache = VariableRangeCache(self.filepath,
+                                         bpy.path.abspath(range_cache_directory) if range_cache_directory else None)
+        profile = self._profile
+        case_lock = threading.Lock()  # ensightreader caches parsed files in plain dicts
 
-            if variable.variable_type == VariableType.SCALAR:
-                blender_type = "FLOAT"
-                blender_attribute_set = "value"
-            elif variable.variable_type == VariableType.VECTOR:
-                blender_type = "FLOAT_VECTOR"
-                blender_attribute_set = "vector"
+        def get_variable_range(variable_name: str, timestep: int) -> ValueRange:
+            with profile.phase("compute variable range"):
+                with case_lock:
+                    variable = get_variable_file(case, variable_name, timestep)
+                return range_cache.get_variable_range(variable, part_ids)
+
+        futures: Dict[str, List[Future]] = {}
+        for variable in variables:
+            timeset = case.variables[variable.variable_name].timeset
+            if self.palette_range == "ALL_TIMESTEPS" and timeset is not None:
+                # first time step of the case showing each file of the variable
+                file_timesteps: Dict[int, int] = {}
+                for timestep in range(get_number_of_timesteps(case)):
+                    file_timesteps.setdefault(get_file_timestep(case, timeset, timestep), timestep)
+                timesteps = list(file_timesteps.values())
             else:
-                # TODO We could support tensor or complex variables, perhaps by creating multiple scalar
-                #      attributes from them?
-                self.report({"WARNING"}, f"Skipping variable {variable_name} (unsupported variable type)")
-                continue
+                timesteps = [self.timestep]
+            futures[variable.variable_name] = [executor.submit(get_variable_range, variable.variable_name, timestep)
+                                               for timestep in timesteps]
 
-            if variable.variable_location != VariableLocation.PER_NODE:
-                # TODO It would be nice to support per-element variables as well, but I've encountered problems
-                #      when implementing this - Blender seems to do some processing of faces when calling
-                #      mesh.update() and mesh.validate(), such that number of faces does not match input.
-                self.report({"WARNING"}, f"Skipping variable {variable_name} (per-element variables are not supported)")
-                continue
+        number_of_futures = sum(len(variable_futures) for variable_futures in futures.values())
+        self.report({"INFO"}, f"Computing range of {len(variables)} variables in {number_of_futures} files")
+        self.update_status(f"Computing range of {len(variables)} EnSight variables (Esc to cancel)")
+
+        variable_ranges: Dict[str, ValueRange] = {}
+        try:
+            for variable_name, variable_futures in futures.items():
+                ranges = []
+                for future in variable_futures:
+                    ranges.append((yield from wait_for(future)))
+                value_range = reduce_range(ranges)
+                if is_empty_range(value_range):
+                    self.report({"WARNING"}, f"Variable {variable_name} has no defined values, not setting its range")
+                else:
+                    self.report({"INFO"}, f"Variable {variable_name} ranges from {value_range[0]:g}"
+                                          f" to {value_range[1]:g}")
+                    variable_ranges[variable_name] = value_range
+        finally:
+            for variable_futures in futures.values():
+                for future in variable_futures:
+                    future.cancel()
 
-            self.report({"DEBUG"}, f"Reading variable {variable_name}")
-            mm = variables_mmap_dict[variable_name]
-            variable_data = variable.read_node_data(mm, part.part_id).flatten()
-            blender_domain = "POINT"
+        range_cache.save()
+        return variable_ranges
 
-            attr = obj.data.attributes.new(variable_name, blender_type, blender_domain)
-            attr.data.foreach_set(blender_attribute_set, variable_data)
+    def convert_ensight_part_to_blender_object(self, mesh_data: PartMeshData) -> Generator[None, None, Object]:
+        # -------------------------------------------------------------------------
+        # Create Blender mesh object from decoded part data
+        # - this must run on the main thread, decoding is done by read_part_mesh_data()
+        # - this yields between the steps, so that the modal import can handle UI events;
+        #   the created object is returned from the generator
+        # -------------------------------------------------------------------------
+
+        profile = self._profile
+        part_name = mesh_data.part_name
+
+        mesh = bpy.data.meshes.new(name=mesh_data.part_name)
+        self._new_datablocks.append(mesh)
+
+        # in Blender 3.5+ (4.0+ for loops), vertex positions and loop vertices are generic attributes,
+        # which take arrays much faster than vertices/loops.foreach_set()
+        with profile.phase("create vertices", part_name):
+            mesh.vertices.add(mesh_data.number_of_vertices)
+            position = mesh.attributes.get("position")
+            if position is not None:
+                position.data.foreach_set("vector", mesh_data.vertices)
+            else:
+                mesh.vertices.foreach_set("co", mesh_data.vertices)
+        yield
+
+        has_edges = mesh_data.edges is not None and mesh_data.edges.shape[0] > 0
+        if has_edges:
+            with profile.phase("create edges", part_name):
+                mesh.edges.add(mesh_data.edges.shape[0] // 2)
+                mesh.edges.foreach_set("vertices", mesh_data.edges)
+            yield
+
+        if mesh_data.has_cells:
+            with profile.phase("create loops", part_name):
+                mesh.loops.add(mesh_data.vertex_index.shape[0])
+                corner_vert = mesh.attributes.get(".corner_vert")
+                if corner_vert is not None:
+                    corner_vert.data.foreach_set("value", mesh_data.vertex_index)
+                else:
+                    mesh.loops.foreach_set("vertex_index", mesh_data.vertex_index)
+            yield
+
+            with profile.phase("create polygons", part_name):
+                mesh.polygons.add(mesh_data.loop_start.shape[0])
+                mesh.polygons.foreach_set("loop_start", mesh_data.loop_start)
+                mesh.polygons.foreach_set("loop_total", mesh_data.loop_total)
+            yield
 
-        obj.data.update()  # finishes reading attribute data
+            # mesh.validate() may remove invalid polygons; face attributes are removed together with them,
+            # so per-element data must be attached before validating (it wouldn't match polygons afterwards)
+            # - with the default NumPy check, invalid polygons were already removed while decoding
+            face_attributes = [attribute for attribute in mesh_data.attributes if attribute.blender_domain == "FACE"]
+            if face_attributes:
+                with profile.phase("create attributes", part_name):
+                    for attribute in face_attributes:
+                        attr = mesh.attributes.new(attribute.name, attribute.blender_type, attribute.blender_domain)
+                        attr.data.foreach_set(attribute.blender_attribute_set, attribute.data)
+                    # remember which element each polygon came from, so that data for other time steps
+                    # can be mapped to the polygons which survived validation
+                    attr = mesh.attributes.new("ensight_element_index", "INT", "FACE")
+                    attr.data.foreach_set("value", mesh_data.polygon_element)
+                yield
+
+        # point clouds have nothing to update or validate
+        if mesh_data.has_cells or has_edges:
+            with profile.phase("mesh update", part_name):
+                # edges of polygons are only computed automatically if the mesh has no edges yet
+                mesh.update(calc_edges=has_edges)
+            if self.validate_mesh == "BLENDER":
+                with profile.phase("mesh validate", part_name):
+                    mesh.validate()
+            yield
+
+        obj = bpy.data.objects.new(mesh_data.part_name, mesh)
+        self._new_datablocks.append(obj)
+
+        # -------------------------------------------------------------------------
+        # Attach variable data as scalar/vector attributes
+        # -------------------------------------------------------------------------
+
+        for attribute in mesh_data.attributes:
+            if attribute.blender_domain == "FACE":
+                continue  # created above
+            with profile.phase("create attributes", part_name):
+                attr = obj.data.attributes.new(attribute.name, attribute.blender_type, attribute.blender_domain)
+                attr.data.foreach_set(attribute.blender_attribute_set, attribute.data)
+            yield
+
+        with profile.phase("create attributes", part_name):
+            if mesh_data.node_index is not None:
+                # vertices are not simply the nodes of the part, remember where they came from
+                # so that data for other time steps can be mapped to them
+                attr = obj.data.attributes.new("ensight_node_index", "INT", "POINT")
+                attr.data.foreach_set("value", mesh_data.node_index)
+
+            obj.data.update()  # finishes reading attribute data
+        obj["ensight_variables"] = ",".join(attribute.name for attribute in mesh_data.attributes
+                                            if attribute.blender_type in ("FLOAT", "FLOAT_VECTOR"))
 
         return obj
+
+
+def wait_for(future: Future) -> Generator[Future, None, Any]:
+    """Yield the future until it's done and return its result (for use with ``yield from``)"""
+    while not future.done():
+        yield future
+    return future.result()
@@ -0,0 +1,230 @@
+# Copyright (c) 2022 Tomas Karabela
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Simplification of decoded parts by vertex clustering
+
+Vertices are snapped to a regular grid spanning the bounding box of the part; all vertices
+in one grid cell are replaced by a single vertex at their average position (per-node variables
+are averaged as well). Polygons are renumbered to the cell vertices and the ones which collapse
+into a point or a line are dropped (as are edges collapsing into a point); per-element variables
+are kept for the remaining polygons. Everything is done with array operations on `PartMeshData`,
+so this runs on the decoding threads, before the mesh is passed to Blender.
+
+Each simplified vertex keeps a representative node in ``node_index``, so that other time steps
+(animation, shape keys) can be mapped to it; those show values of the representative node
+instead of cluster averages.
+
+"""
+
+import math
+from typing import Optional, Tuple
+import numpy as np
+from .meshdata import PartMeshData, VariableAttribute, compact_nodes
+
+# grid resolutions used to estimate how the number of clusters grows with resolution
+ESTIMATE_RESOLUTIONS = (32, 64)
+# vertices used for the estimate (larger parts are subsampled)
+ESTIMATE_SAMPLE_SIZE = 1 << 20
+# grids with more cells than this (and than number of vertices) are numbered by sorting instead of lookup table
+MAX_LOOKUP_CELLS = 1 << 24
+
+
+def cluster_vertices(vertices: np.ndarray, resolution: int) -> Tuple[np.ndarray, int]:
+    """
+    Assign ``(n, 3)`` vertices to cells of grid with ``resolution`` cubic cells along the longest side
+
+    Returns:
+        tuple ``(cluster, number_of_clusters)``, where ``cluster`` is int32 array giving
+        for each vertex index of its (non-empty) cell
+    """
+    n = vertices.shape[0]
+    if n == 0:
+        return np.zeros((0,), dtype=np.int32), 0
+
+    # reducing single columns is much faster than min(axis=0) over the (n, 3) array
+    lo = np.array([vertices[:, c].min() for c in range(3)])
+    extent = np.array([vertices[:, c].max() for c in range(3)]) - lo
+    cell_size = float(extent.max()) / resolution
+    if cell_size <= 0.0:
+        return np.zeros((n,), dtype=np.int32), 1
+
+    dims = np.minimum(np.floor(extent / cell_size).astype(np.int64) + 1, resolution)
+    ijk = vertices - lo
+    ijk *= np.float32(1.0 / cell_size)
+    ijk = ijk.astype(np.int64)
+    np.minimum(ijk, dims - 1, out=ijk)
+    keys = ijk[:, 0] + dims[0] * (ijk[:, 1] + dims[1] * ijk[:, 2])
+    del ijk
+
+    number_of_cells = int(np.prod(dims))
+    if number_of_cells <= max(MAX_LOOKUP_CELLS, n):
+        occupied = np.zeros((number_of_cells,), dtype=bool)
+        occupied[keys] = True
+        cell_cluster = np.cumsum(occupied, dtype=np.int32)
+        cell_cluster -= 1
+        return cell_cluster[keys], int(cell_cluster[-1]) + 1
+    else:
+        unique_keys, cluster = np.unique(keys, return_inverse=True)
+        return cluster.astype(np.int32).ravel(), unique_keys.shape[0]
+
+
+def estimate_grid_resolution(vertices: np.ndarray, target_clusters: int) -> int:
+    """Return grid resolution which should give approximately ``target_clusters`` clusters"""
+    stride = max(1, vertices.shape[0] // ESTIMATE_SAMPLE_SIZE)
+    sample = vertices[::stride]
+    scale = vertices.shape[0] / sample.shape[0]
+
+    (r0, r1) = ESTIMATE_RESOLUTIONS
+    c0 = cluster_vertices(sample, r0)[1]
+    c1 = cluster_vertices(sample, r1)[1]
+    # number of clusters grows as resolution**d, with d = 2 for surfaces (1 for curves, 3 for point clouds);
+    # the subsample is only good for counting cells which are large compared to vertex spacing
+    d = min(max(math.log2(c1 / c0), 1.0), 3.0) if c1 > c0 else 2.0
+    target_clusters = min(target_clusters, sample.shape[0] * scale)
+    return max(1, int(round(r1 * (target_clusters / c1) ** (1.0 / d))))
+
+
+def simplify_part_mesh_data(mesh_data: PartMeshData, grid_resolution: int = 0,
+                            target_faces: int = 0) -> Optional[PartMeshData]:
+    """
+    Return simplified copy of the part, or None if it doesn't need simplification
+
+    Either ``grid_resolution`` (number of grid cells along the longest side of bounding box)
+    or ``target_faces`` (approximate number of polygons of the result; parts with fewer polygons
+    are not simplified) must be given.
+    """
+    number_of_polygons = mesh_data.loop_start.shape[0]
+    if not mesh_data.has_cells:
+        return None
+    if not grid_resolution:
+        if number_of_polygons <= target_faces:
+            return None
+        target_clusters = int(target_faces * mesh_data.number_of_vertices / number_of_polygons)
+        grid_resolution = estimate_grid_resolution(mesh_data.vertices.reshape((-1, 3)), max(target_clusters, 1))
+
+    # -------------------------------------------------------------------------
+    # Cluster vertices, averaging their coordinates and variables
+    # -------------------------------------------------------------------------
+
+    vertices = mesh_data.vertices.reshape((-1, 3))
+    cluster, number_of_clusters = cluster_vertices(vertices, grid_resolution)
+    cluster_size = np.bincount(cluster, minlength=number_of_clusters).astype(np.float64)
+
+    def average(data: np.ndarray, k: int) -> np.ndarray:
+        data = data.reshape((-1, k))
+        result = np.empty((number_of_clusters, k), dtype=np.float32)
+        for c in range(k):
+            result[:, c] = np.bincount(cluster, weights=data[:, c], minlength=number_of_clusters) / cluster_size
+        return result.ravel()
+
+    # any vertex of the cluster will do as its representative
+    representative = np.empty((number_of_clusters,), dtype=np.int32)
+    representative[cluster] = np.arange(cluster.shape[0], dtype=np.int32)
+
+    new_vertices = average(vertices, 3)
+    attributes = []
+    for attribute in mesh_data.attributes:
+        if attribute.blender_domain == "FACE":
+            attributes.append(attribute)  # polygons are selected below
+            continue
+        if attribute.blender_type == "INT":
+            data = attribute.data[representative]
+        else:
+            data = average(attribute.data, 3 if attribute.blender_type == "FLOAT_VECTOR" else 1)
+        attributes.append(VariableAttribute(attribute.name, attribute.blender_type, attribute.blender_domain, data))
+    node_index = mesh_data.node_index[representative] if mesh_data.node_index is not None else representative
+
+    # -------------------------------------------------------------------------
+    # Renumber polygons, dropping loops between vertices of the same cluster
+    # and polygons which collapse into a point or a line
+    # -------------------------------------------------------------------------
+
+    loop_start, loop_total = mesh_data.loop_start, mesh_data.loop_total
+    loop_cluster = cluster[mesh_data.vertex_index]
+    new_edges = None
+    if mesh_data.edges is not None:
+        edge_cluster = cluster[mesh_data.edges].reshape((-1, 2))
+        new_edges = edge_cluster[edge_cluster[:, 0] != edge_cluster[:, 1]].ravel()
+        del edge_cluster
+    del cluster
+
+    next_loop = np.arange(1, loop_cluster.shape[0] + 1, dtype=np.int32)
+    next_loop[loop_start + loop_total - 1] = loop_start
+    keep_loop = loop_cluster != loop_cluster[next_loop]
+    del next_loop
+
+    new_loop_total = np.add.reduceat(keep_loop, loop_start, dtype=np.int32)
+    # polygons need 3 distinct vertices
+    keep_polygon = new_loop_total >= 3
+
+    polygon_index = np.flatnonzero(keep_polygon)
+    keep_loop &= np.repeat(keep_polygon, loop_total)
+    new_vertex_index = loop_cluster[keep_loop]
+    new_loop_total = new_loop_total[keep_polygon]
+    new_loop_start = np.cumsum(new_loop_total, dtype=np.int32)
+    new_loop_start -= new_loop_total
+
+    # quads like (a, b, a, b) have no coincident neighbouring vertices, but are degenerate too
+    quads = new_loop_start[new_loop_total == 4]
+    degenerate = quads[(new_vertex_index[quads] == new_vertex_index[quads + 2]) |
+                       (new_vertex_index[quads + 1] == new_vertex_index[quads + 3])]
+    if degenerate.shape[0] > 0:
+        keep_polygon = np.ones((new_loop_start.shape[0],), dtype=bool)
+        keep_polygon[np.searchsorted(new_loop_start, degenerate)] = False
+        keep_loop = np.repeat(keep_polygon, new_loop_total)
+        new_vertex_index = new_vertex_index[keep_loop]
+        new_loop_total = new_loop_total[keep_polygon]
+        new_loop_start = np.cumsum(new_loop_total, dtype=np.int32)
+        new_loop_start -= new_loop_total
+        polygon_index = polygon_index[keep_polygon]
+
+    # clusters whose polygons were all dropped would end up as loose vertices
+    if new_edges is not None:
+        number_of_loops = new_vertex_index.shape[0]
+        used, renumbered = compact_nodes(np.concatenate([new_vertex_index, new_edges]), number_of_clusters)
+        new_vertex_index, new_edges = renumbered[:number_of_loops], renumbered[number_of_loops:]
+    else:
+        used, new_vertex_index = compact_nodes(new_vertex_index, number_of_clusters)
+    new_vertices = new_vertices.reshape((-1, 3))[used].ravel()
+    for i, attribute in enumerate(attributes):
+        k = 3 if attribute.blender_type == "FLOAT_VECTOR" else 1
+        selection = used if attribute.blender_domain == "POINT" else polygon_index
+        attributes[i] = VariableAttribute(attribute.name, attribute.blender_type, attribute.blender_domain,
+                                          attribute.data.reshape((-1, k))[selection].ravel())
+    node_index = node_index[used]
+
+    messages = list(mesh_data.messages)
+    messages.append(("INFO", f"Simplified part {mesh_data.part_name} from {number_of_polygons} to"
+                             f" {new_loop_start.shape[0]} polygons (grid resolution {grid_resolution})"))
+
+    return PartMeshData(
+        part_id=mesh_data.part_id,
+        part_name=mesh_data.part_name,
+        vertices=new_vertices,
+        vertex_index=new_vertex_index,
+        loop_start=new_loop_start,
+        loop_total=new_loop_total,
+        attributes=attributes,
+        messages=messages,
+        node_index=node_index,
+        polygon_element=mesh_data.polygon_element[polygon_index] if mesh_data.polygon_element is not None else None,
+        edges=new_edges,
+    )
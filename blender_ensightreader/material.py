@@ -1,3 +1,4 @@
+from typing import Optional, Tuple
 import bpy
 
 
@@ -22,7 +23,8 @@ def create_new_material(prefix: str):
 
 def setup_ensight_material_node_tree(mat,
                                      default_attribute_name: str = "",
-                                     default_attribute_is_vector: bool = False):
+                                     default_attribute_is_vector: bool = False,
+                                     palette_range: Optional[Tuple[float, float]] = None):
     nodes = mat.node_tree.nodes
     links = mat.node_tree.links
 
@@ -54,6 +56,9 @@ def setup_ensight_material_node_tree(mat,
     attr_map_range_node = nodes.new("ShaderNodeMapRange")
     attr_map_range_node.label = "Palette range"
     attr_map_range_node.location = 400, 0
+    if palette_range is not None:
+        attr_map_range_node.inputs["From Min"].default_value = palette_range[0]
+        attr_map_range_node.inputs["From Max"].default_value = palette_range[1]
     if default_attribute_name and default_attribute_is_vector:
         links.new(attr_vector_mag_node.outputs[0], attr_map_range_node.inputs[0])
     elif default_attribute_name:
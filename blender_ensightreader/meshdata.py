@@ -0,0 +1,1113 @@
+# Copyright (c) 2022 Tomas Karabela
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Decoding of EnSight parts into Blender-ready NumPy arrays
+
+Nothing in this module touches `bpy`, so that it can run on worker threads
+(and outside Blender); the importer only has to pass the resulting `PartMeshData`
+to Blender on the main thread.
+
+"""
+
+import io
+import threading
+from concurrent.futures import Future, wait
+from dataclasses import dataclass, field
+from typing import List, Dict, Tuple, BinaryIO, Optional, Iterable
+import numpy as np
+from .ensightreader import GeometryPart, EnsightVariableFile, VariableLocation, VariableType, ElementType, \
+    UnstructuredElementBlock, EnsightReaderError
+from .skin import extract_boundary_faces
+from .structured import StructuredPart, is_structured_part, get_structured_faces, \
+    read_structured_element_data_header
+from .derived import DerivedVariable, get_number_of_components, decompose_tensor, evaluate_derived_variable
+from .profiling import ImportProfile
+
+# sizes of header items in EnSight Gold binary files
+LINE_SIZE = 80
+INT_SIZE = 4
+
+# values read at once when reordering components (stored one after another in the file) into vertex order
+READ_CHUNK_SIZE = 1 << 20
+
+# quadratic elements are split into linear ones using their mid-side nodes;
+# element type -> nodes of each resulting polygon (or line segment), in EnSight node order
+ELEMENT_SPLITS: Dict[ElementType, List[Tuple[int, ...]]] = {
+    ElementType.BAR3: [(0, 2), (2, 1)],
+    ElementType.TRIA6: [(0, 3, 5), (3, 1, 4), (5, 4, 2), (3, 4, 5)],
+    ElementType.QUAD8: [(0, 4, 7), (4, 1, 5), (5, 2, 6), (6, 3, 7), (4, 5, 6, 7)],
+}
+
+
+@dataclass
+class VariableAttribute:
+    """Variable data to be stored as Blender attribute"""
+    name: str
+    blender_type: str  # "FLOAT", "FLOAT_VECTOR" or "INT"
+    blender_domain: str  # "POINT" (per-node variables) or "FACE" (per-element variables)
+    data: np.ndarray  # flat float32 (or int32) array, ready for foreach_set()
+
+    @property
+    def blender_attribute_set(self) -> str:
+        return "vector" if self.blender_type == "FLOAT_VECTOR" else "value"
+
+
+@dataclass
+class PartMeshData:
+    """
+    Mesh arrays for one EnSight part, as produced by `read_part_mesh_data()`
+
+    Attributes:
+        part_id: EnSight part number
+        part_name: EnSight part name
+        vertices: flat float32 array of node coordinates (x0, y0, z0, x1, ...)
+        vertex_index: int32 array of loop vertex indices (numbered from 0)
+        loop_start: int32 array of first loop for each polygon
+        loop_total: int32 array of number of loops for each polygon
+        attributes: variable data for the part
+        messages: ``(level, message)`` pairs to be reported by the operator
+            (reports can only be made from the main thread)
+        node_index: int32 array giving EnSight node (numbered from 0) for each vertex, or None
+            if vertices are exactly the nodes of the part
+        polygon_element: int32 array giving EnSight element for each polygon, or None if not known;
+            elements are numbered from 0 across all element blocks of the part, in order
+            (including blocks which don't produce any polygons); quadratic elements split
+            into several polygons give the same element for each of them
+        edges: int32 array of vertex pairs (numbered from 0) of loose edges, ie. ``bar2`` and ``bar3``
+            elements, or None if there are none
+    """
+    part_id: int
+    part_name: str
+    vertices: np.ndarray
+    vertex_index: np.ndarray
+    loop_start: np.ndarray
+    loop_total: np.ndarray
+    attributes: List[VariableAttribute] = field(default_factory=list)
+    messages: List[Tuple[str, str]] = field(default_factory=list)
+    node_index: Optional[np.ndarray] = None
+    polygon_element: Optional[np.ndarray] = None
+    edges: Optional[np.ndarray] = None
+
+    @property
+    def has_cells(self) -> bool:
+        return self.loop_start.shape[0] > 0
+
+    @property
+    def number_of_vertices(self) -> int:
+        return self.vertices.shape[0] // 3
+
+    @property
+    def nbytes(self) -> int:
+        """Total size of the arrays in bytes"""
+        arrays = [self.vertices, self.vertex_index, self.loop_start, self.loop_total]
+        arrays += [attribute.data for attribute in self.attributes]
+        if self.node_index is not None:
+            arrays.append(self.node_index)
+        if self.polygon_element is not None:
+            arrays.append(self.polygon_element)
+        if self.edges is not None:
+            arrays.append(self.edges)
+        return sum(arr.nbytes for arr in arrays)
+
+
+class _CountingFileIO(io.FileIO):
+    """File which counts bytes read through it"""
+
+    bytes_read = 0
+
+    def readinto(self, buffer) -> int:
+        n = super().readinto(buffer)
+        self.bytes_read += n or 0
+        return n
+
+
+class PerThreadFiles:
+    """
+    Opened geometry and variable files, one set for each thread
+
+    ensightreader seeks in the file object it's given, so the same object
+    cannot be used from multiple threads at once. Regular files are used instead
+    of mmaps since ``readinto()`` releases the GIL while reading the data.
+    """
+
+    def __init__(self, geometry_file_path: str, variable_file_paths: Dict[str, str]):
+        self.geometry_file_path = geometry_file_path
+        self.variable_file_paths = variable_file_paths
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._opened_files: List[BinaryIO] = []
+
+    def get(self) -> Tuple[BinaryIO, Dict[str, BinaryIO]]:
+        """Return ``(fp_geo, variables_fp_dict)`` for the current thread"""
+        files = getattr(self._local, "files", None)
+        if files is None:
+            self._local.opened_files = []
+            fp_geo = self._open(self.geometry_file_path)
+            variables_fp_dict = {name: self._open(path) for name, path in self.variable_file_paths.items()}
+            files = self._local.files = fp_geo, variables_fp_dict
+        return files
+
+    def close(self):
+        with self._lock:
+            for fp in self._opened_files:
+                fp.close()
+            self._opened_files.clear()
+
+    def bytes_read(self) -> int:
+        """Return number of bytes read so far by the current thread"""
+        return sum(fp.raw.bytes_read for fp in getattr(self._local, "opened_files", []))
+
+    def close_after(self, futures: Iterable[Future]):
+        """Close the files once given futures (which may still be reading them) are finished"""
+        futures = [future for future in futures if not future.done()]
+        if not futures:
+            self.close()
+            return
+
+        def close_when_done():
+            wait(futures)
+            self.close()
+
+        threading.Thread(target=close_when_done, name="ensight-close-files", daemon=True).start()
+
+    def _open(self, path: str) -> BinaryIO:
+        fp = io.BufferedReader(_CountingFileIO(path, "rb"))
+        self._local.opened_files.append(fp)
+        with self._lock:
+            self._opened_files.append(fp)
+        return fp
+
+
+def read_part_bounding_box(part: GeometryPart, fp_geo: BinaryIO) -> np.ndarray:
+    """
+    Return ``(2, 3)`` array with minimum and maximum node coordinates of the part
+
+    Only node coordinates are read (in chunks, without decoding them into a full array),
+    element blocks are skipped. Parts without nodes give zero-sized box at the origin.
+    """
+    n = part.number_of_nodes
+    bounding_box = np.zeros((2, 3), dtype=np.float32)
+    if n == 0:
+        return bounding_box
+    if is_structured_part(part) and part.block_type != "curvilinear":
+        for c, axis_coordinates in enumerate(part.read_axis_coordinates(fp_geo)):
+            bounding_box[:, c] = axis_coordinates.min(), axis_coordinates.max()
+        return bounding_box
+    fp_geo.seek(_get_part_nodes_offset(part))
+    chunk = np.empty((min(n, READ_CHUNK_SIZE),), dtype=np.float32)
+    for c in range(3):
+        low, high = np.inf, -np.inf
+        for start in range(0, n, READ_CHUNK_SIZE):
+            buffer = chunk[:min(READ_CHUNK_SIZE, n - start)]
+            _read_into(fp_geo, buffer)
+            low, high = min(low, buffer.min()), max(high, buffer.max())
+        bounding_box[:, c] = low, high
+    return bounding_box
+
+
+def get_part_topology(part: GeometryPart) -> Tuple:
+    """
+    Return hashable description of part connectivity layout
+
+    Parts with equal topology in different time steps have the same nodes and element blocks
+    (or dimensions, for structured parts); only their node coordinates can differ (connectivity
+    itself, or iblanking, is not compared).
+    """
+    if is_structured_part(part):
+        return part.number_of_nodes, ((f"block {part.block_type}", part.dims),)
+    return (part.number_of_nodes,
+            tuple((block.element_type, block.number_of_elements) for block in part.element_blocks))
+
+
+def read_part_element_data(variable: EnsightVariableFile, part: GeometryPart, fp_var: BinaryIO) -> np.ndarray:
+    """
+    Read per-element variable for all elements of the part
+
+    Returns:
+        flat float32 array with values for elements of all blocks of the part (in order,
+        as numbered by `PartMeshData.polygon_element`; cells of structured parts), with 3 values
+        for each element for vectors (6 or 9 for tensors); elements of blocks where the variable
+        is not defined get zeros
+    """
+    k = get_number_of_components(variable.variable_type)
+    if is_structured_part(part):
+        return read_structured_element_data(variable, part, fp_var)
+    data = np.zeros((part.number_of_elements, k), dtype=np.float32)
+    element_offset = 0
+    for block in part.element_blocks:
+        block_data = variable.read_element_data(fp_var, part.part_id, block.element_type)
+        if block_data is not None:
+            data[element_offset:element_offset+block.number_of_elements] = block_data.reshape((-1, k))
+        element_offset += block.number_of_elements
+    return data.ravel()
+
+
+def read_structured_element_data(variable: EnsightVariableFile, part: StructuredPart, fp_var: BinaryIO) -> np.ndarray:
+    """Read per-element variable for all cells of structured part (zeros if it's not defined for the part)"""
+    k = get_number_of_components(variable.variable_type)
+    n = part.number_of_cells
+    header = read_structured_element_data_header(variable, part, fp_var)
+    if header is None:
+        return np.zeros((n * k,), dtype=np.float32)
+    # this is also used with mmaps, which can't readinto()
+    fp_var.seek(header[0])
+    data = fp_var.read(4 * n * k)
+    if len(data) != 4 * n * k:
+        raise EnsightReaderError(f"Only read {len(data)} bytes, expected {4 * n * k} bytes", fp_var)
+    return np.frombuffer(data, dtype=np.float32).reshape((k, n)).T.ravel()
+
+
+def compact_nodes(vertex_index: np.ndarray, number_of_nodes: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find nodes referenced by given loops and renumber them
+
+    Returns:
+        tuple ``(used_nodes, new_vertex_index)`` where ``used_nodes`` is boolean mask
+        of nodes that should be kept and ``new_vertex_index`` refers to the kept nodes only
+    """
+    used_nodes = np.zeros((number_of_nodes,), dtype=bool)
+    used_nodes[vertex_index] = True
+    new_node_index = np.cumsum(used_nodes, dtype=np.int32)
+    new_node_index -= 1
+    return used_nodes, new_node_index[vertex_index]
+
+
+# -----------------------------------------------------------------------------
+# Reading arrays straight into their final place
+# - ensightreader returns a new array for each read and coordinates/vectors in component
+#   order, which costs extra full copies of the data when assembling Blender arrays;
+#   these functions only seek to the data (offsets were validated by ensightreader
+#   when the files were parsed) and read into preallocated arrays
+# -----------------------------------------------------------------------------
+
+def _read_into(fp: BinaryIO, out: np.ndarray):
+    """Fill contiguous array ``out`` with data from the current position of the file"""
+    n = fp.readinto(out.data)
+    if n != out.nbytes:
+        raise EnsightReaderError(f"Only read {n} bytes, expected {out.nbytes} bytes", fp)
+
+
+def _read_components_into(fp: BinaryIO, out: np.ndarray):
+    """Fill ``(n, k)`` array ``out`` with ``k`` blocks of ``n`` values (as stored in EnSight files)"""
+    n, k = out.shape
+    chunk = np.empty((min(n, READ_CHUNK_SIZE),), dtype=out.dtype)
+    for c in range(k):
+        for start in range(0, n, READ_CHUNK_SIZE):
+            buffer = chunk[:min(READ_CHUNK_SIZE, n - start)]
+            _read_into(fp, buffer)
+            out[start:start+buffer.shape[0], c] = buffer
+
+
+def _read_components_subset_into(fp: BinaryIO, out: np.ndarray, index: np.ndarray, n: int):
+    """
+    Like `_read_components_into()`, but keep only values of ``n`` given by sorted ``index``
+
+    Values of each component are still read (in chunks, up to the last indexed one),
+    but only ``(len(index), k)`` array ``out`` is allocated, which is what matters
+    when keeping a small subset of a huge part.
+    """
+    m, k = out.shape
+    n_read = int(index[-1]) + 1 if m > 0 else 0
+    chunk = np.empty((min(n_read, READ_CHUNK_SIZE),), dtype=out.dtype)
+    # range of index for each chunk
+    chunk_bounds = np.searchsorted(index, np.arange(0, n_read + READ_CHUNK_SIZE, READ_CHUNK_SIZE))
+    for c in range(k):
+        component_offset = fp.tell()
+        for i, start in enumerate(range(0, n_read, READ_CHUNK_SIZE)):
+            buffer = chunk[:min(READ_CHUNK_SIZE, n_read - start)]
+            _read_into(fp, buffer)
+            selection = slice(chunk_bounds[i], chunk_bounds[i+1])
+            out[selection, c] = buffer[index[selection] - start]
+        fp.seek(component_offset + n * out.itemsize)
+
+
+def _get_part_nodes_offset(part: GeometryPart) -> int:
+    if is_structured_part(part):
+        return part.coordinates_offset
+    # 'part' line, part number, description line, 'coordinates' line, number of nodes, node IDs
+    offset = part.offset + 3*LINE_SIZE + 2*INT_SIZE
+    if part.node_id_handling.ids_present:
+        offset += INT_SIZE * part.number_of_nodes
+    return offset
+
+
+def read_part_nodes(part: GeometryPart, fp_geo: BinaryIO, node_index: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Return flat float32 array of node coordinates of the part (x0, y0, z0, x1, ...)
+
+    If ``node_index`` (sorted int array) is given, only these nodes are returned.
+    """
+    if is_structured_part(part) and part.block_type != "curvilinear":
+        return part.read_nodes(fp_geo, node_index).astype(np.float32).ravel()
+    fp_geo.seek(_get_part_nodes_offset(part))
+    if node_index is None:
+        vertices = np.empty((part.number_of_nodes, 3), dtype=np.float32)
+        _read_components_into(fp_geo, vertices)
+    else:
+        vertices = np.empty((node_index.shape[0], 3), dtype=np.float32)
+        _read_components_subset_into(fp_geo, vertices, node_index, part.number_of_nodes)
+    return vertices.ravel()
+
+
+def read_part_node_data(variable: EnsightVariableFile, part: GeometryPart, fp_var: BinaryIO,
+                        node_index: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+    """
+    Read per-node variable for all nodes of the part (or nodes given by sorted ``node_index``)
+
+    Returns:
+        flat float32 array (x0, y0, z0, x1, ... for vectors, all components of each node for tensors),
+        or None if the variable is not defined for the part
+    """
+    offset = variable.part_offsets.get(part.part_id)
+    if offset is None:
+        return None
+    # 'part' line, part number, 'coordinates' line, undefined value
+    offset += 2*LINE_SIZE + INT_SIZE
+    if variable.part_per_node_undefined_values.get(part.part_id) is not None:
+        offset += INT_SIZE
+    k = get_number_of_components(variable.variable_type)
+    fp_var.seek(offset)
+    if node_index is None:
+        data = np.empty((part.number_of_nodes, k), dtype=np.float32)
+        _read_components_into(fp_var, data)
+    else:
+        data = np.empty((node_index.shape[0], k), dtype=np.float32)
+        _read_components_subset_into(fp_var, data, node_index, part.number_of_nodes)
+    return data.ravel()
+
+
+def _seek_element_data(block: UnstructuredElementBlock, fp_geo: BinaryIO):
+    # element type line, number of elements, element IDs
+    offset = block.offset + LINE_SIZE + INT_SIZE
+    if block.element_id_handling.ids_present:
+        offset += INT_SIZE * block.number_of_elements
+    fp_geo.seek(offset)
+
+
+def _read_nsided_node_counts(block: UnstructuredElementBlock, fp_geo: BinaryIO) -> np.ndarray:
+    """Return int32 array with number of nodes of each NSIDED element"""
+    polygon_node_counts = np.empty((block.number_of_elements,), dtype=np.int32)
+    _seek_element_data(block, fp_geo)
+    _read_into(fp_geo, polygon_node_counts)
+    return polygon_node_counts
+
+
+def _read_connectivity_into(block: UnstructuredElementBlock, fp_geo: BinaryIO, out: np.ndarray):
+    """
+    Fill flat int32 array ``out`` with connectivity of the elements (node numbers from 1)
+
+    Elements listed in `ELEMENT_SPLITS` are split, ``out`` gets connectivity of the resulting
+    polygons (or line segments), element by element.
+    """
+    _seek_element_data(block, fp_geo)
+    if block.element_type == ElementType.NSIDED:
+        fp_geo.seek(INT_SIZE * block.number_of_elements, io.SEEK_CUR)  # node counts
+    split = ELEMENT_SPLITS.get(block.element_type)
+    if split is None:
+        _read_into(fp_geo, out)
+        return
+
+    # elements are read in chunks and their nodes picked into place with a single np.take()
+    n, k = block.number_of_elements, block.element_type.nodes_per_element
+    split_nodes = [node for nodes in split for node in nodes]
+    out = out.reshape((n, len(split_nodes)))
+    chunk_elements = max(1, READ_CHUNK_SIZE // k)
+    chunk = np.empty((min(n, chunk_elements), k), dtype=np.int32)
+    for start in range(0, n, chunk_elements):
+        buffer = chunk[:min(chunk_elements, n - start)]
+        _read_into(fp_geo, buffer)
+        np.take(buffer, split_nodes, axis=1, out=out[start:start+buffer.shape[0]])
+
+
+def _get_element_split_sizes(element_type: ElementType) -> List[int]:
+    """Return number of nodes of each polygon (or line segment) that one element becomes"""
+    split = ELEMENT_SPLITS.get(element_type)
+    if split is None:
+        return [element_type.nodes_per_element]
+    return [len(nodes) for nodes in split]
+
+
+@dataclass
+class _PolygonSource:
+    """Polygons going into the loop arrays: element block whose connectivity is read from file, or given arrays"""
+    first_element: int
+    number_of_polygons: int
+    number_of_loops: int
+    block: Optional[UnstructuredElementBlock] = None
+    polygon_node_counts: Optional[np.ndarray] = None  # not given for fixed-size elements
+    polygon_connectivity: Optional[np.ndarray] = None
+    polygon_element: Optional[np.ndarray] = None  # consecutive elements from first_element if not given
+
+
+def _get_variable_attributes(variable: EnsightVariableFile, variable_data: np.ndarray, blender_domain: str,
+                             tensor_outputs: Iterable[str], profile: ImportProfile,
+                             part_name: str) -> List[VariableAttribute]:
+    """Return attributes for data of the variable (tensors are split as described in `read_part_mesh_data()`)"""
+    variable_name = variable.variable_name
+    if variable.variable_type == VariableType.SCALAR:
+        return [VariableAttribute(variable_name, "FLOAT", blender_domain, variable_data)]
+    elif variable.variable_type == VariableType.VECTOR:
+        return [VariableAttribute(variable_name, "FLOAT_VECTOR", blender_domain, variable_data)]
+
+    k = get_number_of_components(variable.variable_type)
+    with profile.phase("derived variables", part_name):
+        tensor_attributes = decompose_tensor(variable_data.reshape((-1, k)), variable.variable_type,
+                                             components="COMPONENTS" in tensor_outputs,
+                                             von_mises_stress="VON_MISES" in tensor_outputs,
+                                             principal="PRINCIPAL" in tensor_outputs)
+    return [VariableAttribute(f"{variable_name}_{suffix}", "FLOAT", blender_domain, data)
+            for suffix, data in tensor_attributes]
+
+
+def read_part_mesh_data(part: GeometryPart, variables_to_read: List[EnsightVariableFile],
+                        fp_geo: BinaryIO, variables_fp_dict: Dict[str, BinaryIO],
+                        extract_volume_skin: bool = False,
+                        tensor_outputs: Iterable[str] = ("COMPONENTS",),
+                        profile: Optional[ImportProfile] = None) -> PartMeshData:
+    """
+    Read geometry and per-node variables of given part and convert them to Blender mesh arrays
+
+    This is safe to call from worker threads, as long as each thread has its own file objects
+    (see `PerThreadFiles`).
+
+    If ``extract_volume_skin`` is True, boundary faces of volume element blocks are included
+    as polygons and nodes not used by any element are left out (per-node variables are
+    remapped accordingly).
+
+    Tensor variables are turned into scalar attributes named ``<variable>_<suffix>``,
+    ``tensor_outputs`` selects which of them: ``"COMPONENTS"``, ``"VON_MISES"`` and/or
+    ``"PRINCIPAL"`` (see `decompose_tensor()`).
+
+    Time spent in each phase is recorded in ``profile``, if given.
+    """
+    messages = []
+    if profile is None:
+        profile = ImportProfile(enabled=False)
+    part_name = part.part_name
+
+    # -------------------------------------------------------------------------
+    # Read geometry
+    # - adapted from code example by Paul Melis on devtalk.blender.org:
+    #   https://devtalk.blender.org/t/alternative-in-2-80-to-create-meshes-from-python-using-the-tessfaces-api/7445
+    # - sizes of element blocks are known from the geometry file, so the int32 loop arrays are
+    #   allocated once and connectivity is read straight into them; only node counts of NSIDED
+    #   elements (and faces of volume elements) have to be read before that
+    # - BAR2 elements become loose edges; quadratic elements are split into linear ones (see ELEMENT_SPLITS)
+    # -------------------------------------------------------------------------
+
+    with profile.phase("read nodes", part_name):
+        vertices = read_part_nodes(part, fp_geo)
+
+    polygon_sources: List[_PolygonSource] = []
+    edge_blocks: List[UnstructuredElementBlock] = []
+
+    # elements are numbered across all blocks, so that per-element variables can be mapped to polygons
+    element_offset = 0
+    for block in part.element_blocks:
+        first_element = element_offset
+        element_offset += block.number_of_elements
+        messages.append(("DEBUG", f"Element block with {block.number_of_elements} {block.element_type} elements"))
+        if block.element_type.dimension == 3 and extract_volume_skin:
+            continue  # handled below
+        if block.element_type.dimension not in (1, 2):
+            messages.append(("DEBUG", f"Skipping {block.element_type.value} element block - unsupported dimension"))
+            continue
+
+        if block.element_type.dimension == 1:
+            edge_blocks.append(block)
+        elif block.element_type == ElementType.NSIDED:
+            with profile.phase("read connectivity", part_name):
+                polygon_node_counts = _read_nsided_node_counts(block, fp_geo)
+            polygon_sources.append(_PolygonSource(first_element, block.number_of_elements,
+                                                  int(polygon_node_counts.sum()), block=block,
+                                                  polygon_node_counts=polygon_node_counts))
+        else:
+            split_sizes = _get_element_split_sizes(block.element_type)
+            polygon_sources.append(_PolygonSource(first_element, block.number_of_elements * len(split_sizes),
+                                                  block.number_of_elements * sum(split_sizes), block=block))
+
+    if extract_volume_skin and part.is_volume():
+        with profile.phase("extract skin", part_name):
+            polygon_node_counts, polygon_connectivity, polygon_element, skin_messages = \
+                extract_boundary_faces(part, fp_geo)
+        messages.extend(("WARNING", message) for message in skin_messages)
+        messages.append(("INFO", f"Extracted {polygon_node_counts.shape[0]} boundary faces of volume elements"))
+        polygon_sources.append(_PolygonSource(0, polygon_node_counts.shape[0], polygon_connectivity.shape[0],
+                                              polygon_node_counts=polygon_node_counts,
+                                              polygon_connectivity=polygon_connectivity,
+                                              polygon_element=polygon_element))
+
+    number_of_loops = sum(source.number_of_loops for source in polygon_sources)
+    number_of_polygons = sum(source.number_of_polygons for source in polygon_sources)
+    vertex_index = np.empty((number_of_loops,), dtype=np.int32)
+    loop_total = np.empty((number_of_polygons,), dtype=np.int32)
+    polygon_element = np.empty((number_of_polygons,), dtype=np.int32)
+
+    loop_offset = polygon_offset = 0
+    for source in polygon_sources:
+        loops = slice(loop_offset, loop_offset + source.number_of_loops)
+        polygons = slice(polygon_offset, polygon_offset + source.number_of_polygons)
+        if source.block is not None:
+            with profile.phase("read connectivity", part_name):
+                _read_connectivity_into(source.block, fp_geo, vertex_index[loops])
+        else:
+            with profile.phase("assemble loops", part_name):
+                vertex_index[loops] = source.polygon_connectivity
+        with profile.phase("assemble loops", part_name):
+            if source.polygon_element is not None:
+                polygon_element[polygons] = source.polygon_element
+                loop_total[polygons] = source.polygon_node_counts
+            elif source.polygon_node_counts is not None:
+                polygon_element[polygons] = np.arange(source.first_element,
+                                                      source.first_element + source.number_of_polygons)
+                loop_total[polygons] = source.polygon_node_counts
+            else:
+                # each element becomes one or more polygons (see ELEMENT_SPLITS)
+                split_sizes = _get_element_split_sizes(source.block.element_type)
+                n = source.block.number_of_elements
+                loop_total[polygons].reshape((n, len(split_sizes)))[:] = split_sizes
+                polygon_element[polygons].reshape((n, len(split_sizes)))[:] = \
+                    np.arange(source.first_element, source.first_element + n, dtype=np.int32)[:, np.newaxis]
+        loop_offset += source.number_of_loops
+        polygon_offset += source.number_of_polygons
+    del polygon_sources
+
+    with profile.phase("assemble loops", part_name):
+        vertex_index -= 1  # Blender numbers vertices from 0
+        loop_start = np.cumsum(loop_total, dtype=np.int32)
+        loop_start -= loop_total
+
+    edges = None
+    if edge_blocks:
+        edge_sizes = [block.number_of_elements * sum(_get_element_split_sizes(block.element_type))
+                      for block in edge_blocks]
+        edges = np.empty((sum(edge_sizes),), dtype=np.int32)
+        edge_offset = 0
+        with profile.phase("read connectivity", part_name):
+            for block, size in zip(edge_blocks, edge_sizes):
+                _read_connectivity_into(block, fp_geo, edges[edge_offset:edge_offset+size])
+                edge_offset += size
+        edges -= 1
+
+    # interior nodes of volume parts would end up as loose vertices, leave them out
+    used_nodes = None
+    if extract_volume_skin and part.is_volume():
+        with profile.phase("compact nodes", part_name):
+            if edges is not None:
+                used_nodes, renumbered = compact_nodes(np.concatenate([vertex_index, edges]), part.number_of_nodes)
+                vertex_index, edges = renumbered[:number_of_loops], renumbered[number_of_loops:]
+            else:
+                used_nodes, vertex_index = compact_nodes(vertex_index, part.number_of_nodes)
+            vertices = vertices.reshape((-1, 3))[used_nodes].ravel()
+
+    # -------------------------------------------------------------------------
+    # Read variable data
+    # - per-node variables from EnSight case become scalar/vector point attributes
+    # - tensors are split into scalar attributes (components, von Mises, principal values)
+    # - per-element variables become face attributes; they're mapped to polygons through
+    #   polygon_element, so that they stay in sync when invalid polygons are removed
+    #   (by `check_part_mesh_data()` or mesh.validate())
+    # -------------------------------------------------------------------------
+
+    attributes = []
+
+    for variable in variables_to_read:
+        variable_name = variable.variable_name
+        if not variable.is_defined_for_part_id(part.part_id):
+            messages.append(("INFO", f"Skipping variable {variable_name} (not defined for this part)"))
+            continue
+
+        messages.append(("DEBUG", f"Reading variable {variable_name}"))
+        fp_var = variables_fp_dict[variable_name]
+        k = get_number_of_components(variable.variable_type)
+
+        with profile.phase("read variables", part_name):
+            if variable.variable_location == VariableLocation.PER_ELEMENT:
+                blender_domain = "FACE"
+                element_data = read_part_element_data(variable, part, fp_var)
+                variable_data = element_data.reshape((-1, k))[polygon_element].ravel()
+            else:
+                blender_domain = "POINT"
+                variable_data = read_part_node_data(variable, part, fp_var)
+                if used_nodes is not None:
+                    variable_data = variable_data.reshape((-1, k))[used_nodes].ravel()
+
+        attributes += _get_variable_attributes(variable, variable_data, blender_domain, tensor_outputs,
+                                               profile, part_name)
+
+    return PartMeshData(
+        part_id=part.part_id,
+        part_name=part.part_name,
+        vertices=vertices,
+        vertex_index=vertex_index,
+        loop_start=loop_start,
+        loop_total=loop_total,
+        attributes=attributes,
+        messages=messages,
+        node_index=np.flatnonzero(used_nodes).astype(np.int32) if used_nodes is not None else None,
+        polygon_element=polygon_element,
+        edges=edges,
+    )
+
+
+def is_point_cloud_part(part: GeometryPart) -> bool:
+    """Return True if the part has no elements or only 0D ``point`` elements"""
+    if is_structured_part(part):
+        return part.dimension == 0
+    return all(block.element_type.dimension == 0 for block in part.element_blocks)
+
+
+def select_point_cloud_nodes(number_of_nodes: int, max_points: int, subsample: str = "STRIDE",
+                             seed: int = 0) -> Optional[np.ndarray]:
+    """
+    Choose at most ``max_points`` nodes to keep
+
+    With ``"STRIDE"``, every n-th node is kept; with ``"RANDOM"``, nodes are sampled without
+    replacement, using given seed (the same nodes are chosen each time, so that time steps match).
+
+    Returns:
+        sorted int32 array of nodes to keep, or None if all of them should be kept
+    """
+    if max_points <= 0 or number_of_nodes <= max_points:
+        return None
+    if subsample == "RANDOM":
+        rng = np.random.default_rng(seed)
+        node_index = rng.choice(number_of_nodes, size=max_points, replace=False, shuffle=False)
+        node_index.sort()
+        return node_index.astype(np.int32)
+    else:
+        stride = -(-number_of_nodes // max_points)
+        return np.arange(0, number_of_nodes, stride, dtype=np.int32)
+
+
+def read_part_point_cloud(part: GeometryPart, variables_to_read: List[EnsightVariableFile],
+                          fp_geo: BinaryIO, variables_fp_dict: Dict[str, BinaryIO],
+                          max_points: int = 0, subsample: str = "STRIDE",
+                          tensor_outputs: Iterable[str] = ("COMPONENTS",),
+                          profile: Optional[ImportProfile] = None) -> PartMeshData:
+    """
+    Read nodes and per-node variables of given part as point cloud (vertices with no polygons)
+
+    Elements of the part are not read at all, so this is much cheaper than `read_part_mesh_data()`
+    for node-only parts (or when only nodes of a volume part are wanted). If the part has
+    more than ``max_points`` nodes (and it's non-zero), they are subsampled as described
+    in `select_point_cloud_nodes()` and only the chosen nodes are kept in memory.
+    Per-element variables are skipped.
+    """
+    messages = []
+    if profile is None:
+        profile = ImportProfile(enabled=False)
+    part_name = part.part_name
+
+    node_index = select_point_cloud_nodes(part.number_of_nodes, max_points, subsample, seed=part.part_id)
+    if node_index is not None:
+        messages.append(("INFO", f"Subsampled part {part_name} to {node_index.shape[0]}"
+                                 f" of {part.number_of_nodes} nodes"))
+
+    with profile.phase("read nodes", part_name):
+        vertices = read_part_nodes(part, fp_geo, node_index)
+
+    attributes = []
+    for variable in variables_to_read:
+        variable_name = variable.variable_name
+        if variable.variable_location == VariableLocation.PER_ELEMENT:
+            messages.append(("INFO", f"Skipping variable {variable_name} (per-element variables are not"
+                                     f" loaded for point clouds)"))
+            continue
+        if not variable.is_defined_for_part_id(part.part_id):
+            messages.append(("INFO", f"Skipping variable {variable_name} (not defined for this part)"))
+            continue
+
+        messages.append(("DEBUG", f"Reading variable {variable_name}"))
+        with profile.phase("read variables", part_name):
+            variable_data = read_part_node_data(variable, part, variables_fp_dict[variable_name], node_index)
+
+        attributes += _get_variable_attributes(variable, variable_data, "POINT", tensor_outputs, profile, part_name)
+
+    return PartMeshData(
+        part_id=part.part_id,
+        part_name=part.part_name,
+        vertices=vertices,
+        vertex_index=np.empty((0,), dtype=np.int32),
+        loop_start=np.empty((0,), dtype=np.int32),
+        loop_total=np.empty((0,), dtype=np.int32),
+        attributes=attributes,
+        messages=messages,
+        node_index=node_index,
+        polygon_element=np.empty((0,), dtype=np.int32),
+    )
+
+
+def read_structured_part_mesh_data(part: StructuredPart, variables_to_read: List[EnsightVariableFile],
+                                   fp_geo: BinaryIO, variables_fp_dict: Dict[str, BinaryIO],
+                                   surface: str = "BOUNDARY", plane_index: int = 0,
+                                   tensor_outputs: Iterable[str] = ("COMPONENTS",),
+                                   profile: Optional[ImportProfile] = None) -> PartMeshData:
+    """
+    Read surface of structured part and its variables and convert them to Blender mesh arrays
+
+    Connectivity comes from `get_structured_faces()` (``surface`` and ``plane_index`` select
+    the surface of 3D blocks), only nodes used by it are read. Quads (and line segments)
+    with a blanked node (iblank 0) or of a ghost cell are left out. Each polygon gets the cell
+    it belongs to as its element, so that per-element variables can be mapped to it.
+    """
+    messages = []
+    if profile is None:
+        profile = ImportProfile(enabled=False)
+    part_name = part.part_name
+    messages.append(("DEBUG", f"Structured {part.block_type} block with {part.dims} nodes"))
+
+    with profile.phase("assemble loops", part_name):
+        try:
+            quads, edges, cell_index = get_structured_faces(part.dims, surface, plane_index)
+        except ValueError as e:
+            messages.append(("WARNING", f"Not loading any faces of part {part_name} ({e})"))
+            quads, edges, cell_index = get_structured_faces((1, 1, 1))
+        if quads.shape[0] == 0 and edges.shape[0] > 0:
+            cell_index = np.empty((0,), dtype=np.int32)  # per-element variables are only kept for polygons
+        connectivity = quads if quads.shape[0] > 0 else edges
+        used_nodes, renumbered = compact_nodes(connectivity.ravel(), part.number_of_nodes)
+        node_index = np.flatnonzero(used_nodes).astype(np.int32)
+        renumbered = renumbered.reshape(connectivity.shape)
+        del used_nodes
+
+    keep = None
+    if part.iblanks_offset is not None and node_index.shape[0] > 0:
+        with profile.phase("read iblanking", part_name):
+            iblanks = np.empty((node_index.shape[0], 1), dtype=np.int32)
+            fp_geo.seek(part.iblanks_offset)
+            _read_components_subset_into(fp_geo, iblanks, node_index, part.number_of_nodes)
+            keep = np.all(iblanks[renumbered, 0] != 0, axis=1)
+            del iblanks
+    if part.ghost_flags_offset is not None and cell_index.shape[0] > 0:
+        with profile.phase("read ghost flags", part_name):
+            cells, cell_inverse = np.unique(cell_index, return_inverse=True)
+            ghost_flags = np.empty((cells.shape[0], 1), dtype=np.int32)
+            fp_geo.seek(part.ghost_flags_offset)
+            _read_components_subset_into(fp_geo, ghost_flags, cells, part.number_of_cells)
+            not_ghost = ghost_flags[cell_inverse.ravel(), 0] == 0
+            keep = not_ghost if keep is None else keep & not_ghost
+            del ghost_flags, cell_inverse
+
+    if keep is not None and not keep.all():
+        with profile.phase("compact nodes", part_name):
+            messages.append(("INFO", f"Left out {int(np.count_nonzero(~keep))} blanked or ghost faces"
+                                     f" of part {part_name}"))
+            renumbered = renumbered[keep]
+            if cell_index.shape[0] > 0:
+                cell_index = cell_index[keep]
+            used_vertices, new_renumbered = compact_nodes(renumbered.ravel(), node_index.shape[0])
+            node_index = node_index[used_vertices]
+            renumbered = new_renumbered.reshape(renumbered.shape)
+            del used_vertices, new_renumbered
+
+    # vertices are simply the nodes of the part if all of them are used (eg. for 2D blocks)
+    if node_index.shape[0] == part.number_of_nodes:
+        node_index = None
+
+    with profile.phase("read nodes", part_name):
+        vertices = read_part_nodes(part, fp_geo, node_index)
+
+    with profile.phase("assemble loops", part_name):
+        if quads.shape[0] > 0:
+            vertex_index = renumbered.ravel()
+            loop_total = np.full((renumbered.shape[0],), 4, dtype=np.int32)
+            edges = None
+        else:
+            vertex_index = np.empty((0,), dtype=np.int32)
+            loop_total = np.empty((0,), dtype=np.int32)
+            edges = renumbered.ravel() if renumbered.shape[0] > 0 else None
+        loop_start = np.cumsum(loop_total, dtype=np.int32)
+        loop_start -= loop_total
+        polygon_element = cell_index
+
+    attributes = []
+    for variable in variables_to_read:
+        variable_name = variable.variable_name
+        if not variable.is_defined_for_part_id(part.part_id):
+            messages.append(("INFO", f"Skipping variable {variable_name} (not defined for this part)"))
+            continue
+
+        messages.append(("DEBUG", f"Reading variable {variable_name}"))
+        fp_var = variables_fp_dict[variable_name]
+        k = get_number_of_components(variable.variable_type)
+        with profile.phase("read variables", part_name):
+            if variable.variable_location == VariableLocation.PER_ELEMENT:
+                blender_domain = "FACE"
+                element_data = read_structured_element_data(variable, part, fp_var)
+                variable_data = element_data.reshape((-1, k))[polygon_element].ravel()
+            else:
+                blender_domain = "POINT"
+                variable_data = read_part_node_data(variable, part, fp_var, node_index)
+        attributes += _get_variable_attributes(variable, variable_data, blender_domain, tensor_outputs,
+                                               profile, part_name)
+
+    return PartMeshData(
+        part_id=part.part_id,
+        part_name=part.part_name,
+        vertices=vertices,
+        vertex_index=vertex_index,
+        loop_start=loop_start,
+        loop_total=loop_total,
+        attributes=attributes,
+        messages=messages,
+        node_index=node_index,
+        polygon_element=polygon_element,
+        edges=edges,
+    )
+
+
+def add_derived_variables(mesh_data: PartMeshData, derived_variables: List[DerivedVariable]):
+    """
+    Evaluate user-defined variables over the attributes of the part and add them as new attributes
+
+    Definitions are evaluated in order, so they can use the preceding ones. Definitions which
+    can't be evaluated for the part (eg. because some variable is not defined for it) or whose
+    name is already taken are skipped with a warning.
+    """
+    for derived_variable in derived_variables:
+        attributes = {attribute.name: attribute for attribute in mesh_data.attributes
+                      if attribute.blender_type in ("FLOAT", "FLOAT_VECTOR")}
+        if any(attribute.name == derived_variable.name for attribute in mesh_data.attributes):
+            mesh_data.messages.append(("WARNING", f"Skipping derived variable {derived_variable.name}"
+                                                  f" (attribute with this name already exists)"))
+            continue
+        missing_names = derived_variable.variable_names - attributes.keys()
+        if missing_names:
+            mesh_data.messages.append(("WARNING", f"Skipping derived variable {derived_variable.name}"
+                                                  f" (missing {', '.join(sorted(missing_names))})"))
+            continue
+        used_attributes = [attributes[name] for name in sorted(derived_variable.variable_names)]
+        blender_domains = {attribute.blender_domain for attribute in used_attributes}
+        if len(blender_domains) > 1:
+            mesh_data.messages.append(("WARNING", f"Skipping derived variable {derived_variable.name}"
+                                                  f" (mixes per-node and per-element variables)"))
+            continue
+
+        variables = {attribute.name: attribute.data.reshape((-1, 3)) if attribute.blender_type == "FLOAT_VECTOR"
+                     else attribute.data for attribute in used_attributes}
+        try:
+            result = evaluate_derived_variable(derived_variable, variables)
+        except ValueError as e:
+            mesh_data.messages.append(("WARNING", f"Skipping derived variable {derived_variable.name} ({e})"))
+            continue
+
+        attribute = VariableAttribute(derived_variable.name, "FLOAT_VECTOR" if result.ndim == 2 else "FLOAT",
+                                      blender_domains.pop(), result.ravel())
+        mesh_data.attributes.append(attribute)
+        mesh_data.messages.append(("DEBUG", f"Computed derived variable {attribute.name}"
+                                            f" = {derived_variable.expression}"))
+
+
+def merge_part_mesh_data(parts: List[PartMeshData], name: str) -> PartMeshData:
+    """
+    Concatenate multiple parts into single mesh
+
+    Vertex and loop indices of each part are shifted by the number of vertices and loops
+    of the preceding parts. Variables missing in some of the parts are filled with zeros
+    there. The result has ``part_id`` integer attribute giving EnSight part number
+    for each vertex, and ``node_index`` giving EnSight node number within that part.
+    If there are per-element variables, ``ensight_element_part_id`` integer face attribute
+    gives part number for each polygon (``polygon_element`` is numbered within that part).
+    """
+    vertex_counts = [p.number_of_vertices for p in parts]
+    loop_counts = [p.vertex_index.shape[0] for p in parts]
+    polygon_counts = [p.loop_start.shape[0] for p in parts]
+    number_of_vertices = sum(vertex_counts)
+
+    vertices = np.concatenate([p.vertices for p in parts]) if parts else np.ndarray((0,), dtype=np.float32)
+    vertex_index = np.empty((sum(loop_counts),), dtype=np.int32)
+    loop_start = np.empty((sum(polygon_counts),), dtype=np.int32)
+    loop_total = np.empty((sum(polygon_counts),), dtype=np.int32)
+    part_id = np.empty((number_of_vertices,), dtype=np.int32)
+    node_index = np.empty((number_of_vertices,), dtype=np.int32)
+    polygon_element = np.empty((sum(polygon_counts),), dtype=np.int32)
+    polygon_part_id = np.empty((sum(polygon_counts),), dtype=np.int32)
+    edge_counts = [p.edges.shape[0] if p.edges is not None else 0 for p in parts]
+    edges = np.empty((sum(edge_counts),), dtype=np.int32) if sum(edge_counts) else None
+
+    attribute_types: Dict[str, Tuple[str, str]] = {}
+    for p in parts:
+        for attribute in p.attributes:
+            attribute_types.setdefault(attribute.name, (attribute.blender_type, attribute.blender_domain))
+    domain_sizes = {"POINT": number_of_vertices, "FACE": sum(polygon_counts)}
+    attribute_data = {attribute_name: np.zeros((domain_sizes[blender_domain] *
+                                                (3 if blender_type == "FLOAT_VECTOR" else 1),), dtype=np.float32)
+                      for attribute_name, (blender_type, blender_domain) in attribute_types.items()}
+
+    vertex_offset = loop_offset = polygon_offset = edge_offset = 0
+    for p, nv, nl, npoly, ne in zip(parts, vertex_counts, loop_counts, polygon_counts, edge_counts):
+        np.add(p.vertex_index, vertex_offset, out=vertex_index[loop_offset:loop_offset+nl])
+        np.add(p.loop_start, loop_offset, out=loop_start[polygon_offset:polygon_offset+npoly])
+        loop_total[polygon_offset:polygon_offset+npoly] = p.loop_total
+        part_id[vertex_offset:vertex_offset+nv] = p.part_id
+        node_index[vertex_offset:vertex_offset+nv] = p.node_index if p.node_index is not None else np.arange(nv)
+        polygon_element[polygon_offset:polygon_offset+npoly] = \
+            p.polygon_element if p.polygon_element is not None else np.arange(npoly)
+        polygon_part_id[polygon_offset:polygon_offset+npoly] = p.part_id
+        if ne:
+            np.add(p.edges, vertex_offset, out=edges[edge_offset:edge_offset+ne])
+
+        for attribute in p.attributes:
+            k = 3 if attribute.blender_type == "FLOAT_VECTOR" else 1
+            offset, n = (vertex_offset, nv) if attribute.blender_domain == "POINT" else (polygon_offset, npoly)
+            attribute_data[attribute.name][k*offset:k*(offset+n)] = attribute.data
+
+        vertex_offset += nv
+        loop_offset += nl
+        polygon_offset += npoly
+        edge_offset += ne
+
+    attributes = [VariableAttribute(attribute_name, blender_type, blender_domain, attribute_data[attribute_name])
+                  for attribute_name, (blender_type, blender_domain) in attribute_types.items()]
+    attributes.append(VariableAttribute("part_id", "INT", "POINT", part_id))
+    if any(blender_domain == "FACE" for _, blender_domain in attribute_types.values()):
+        attributes.append(VariableAttribute("ensight_element_part_id", "INT", "FACE", polygon_part_id))
+
+    return PartMeshData(
+        part_id=-1,
+        part_name=name,
+        vertices=vertices,
+        vertex_index=vertex_index,
+        loop_start=loop_start,
+        loop_total=loop_total,
+        attributes=attributes,
+        messages=[],
+        node_index=node_index,
+        polygon_element=polygon_element,
+        edges=edges,
+    )
+
+
+def check_part_mesh_data(mesh_data: PartMeshData) -> PartMeshData:
+    """
+    Remove polygons and edges which Blender can't handle
+
+    This is a fast replacement of ``mesh.validate()`` for meshes built by the add-on; it removes
+    polygons with vertex indices out of range, with fewer than 3 vertices or with the same vertex
+    in neighbouring corners (or opposite corners of quads), and edges with vertex indices out of range
+    or the same vertex at both ends. Duplicate polygons and repeated vertices in other positions of
+    larger polygons are not detected.
+
+    Returns:
+        ``mesh_data`` itself if everything is valid, otherwise its copy without the invalid elements
+        (face attributes and ``polygon_element`` are kept in sync), with a warning message
+    """
+    number_of_vertices = mesh_data.number_of_vertices
+    vertex_index, loop_start, loop_total = mesh_data.vertex_index, mesh_data.loop_start, mesh_data.loop_total
+    number_of_polygons = loop_start.shape[0]
+
+    # loops are assumed to be consecutive, polygon by polygon; whole-array reductions and comparisons
+    # are used to find the (usually none) bad loops, their polygons are then found by bisection
+    bad_polygon_indices = []
+
+    def polygon_of_loop(loop_index: np.ndarray) -> np.ndarray:
+        return np.searchsorted(loop_start, loop_index, side="right") - 1
+
+    if number_of_polygons > 0:
+        min_total, max_total = int(loop_total.min()), int(loop_total.max())
+        if min_total < 3:
+            bad_polygon_indices.append(np.flatnonzero(loop_total < 3))
+
+        if vertex_index.min() < 0 or vertex_index.max() >= number_of_vertices:
+            bad_polygon_indices.append(polygon_of_loop(
+                np.flatnonzero((vertex_index < 0) | (vertex_index >= number_of_vertices))))
+
+        if min_total == max_total and min_total > 0:
+            # all polygons have the same size (ie. single element type), compare corners directly
+            corners = vertex_index.reshape((-1, min_total))
+            bad_polygon = corners[:, 0] == corners[:, -1]
+            for c in range(1, min_total):
+                bad_polygon |= corners[:, c] == corners[:, c - 1]
+            if min_total == 4:
+                bad_polygon |= corners[:, 0] == corners[:, 2]
+                bad_polygon |= corners[:, 1] == corners[:, 3]
+            bad_polygon_indices.append(np.flatnonzero(bad_polygon))
+            del corners, bad_polygon
+        else:
+            # compare each loop with the previous one of its polygon (the first loop with the last one)
+            if min_total > 0:
+                first, total = loop_start, loop_total
+            else:
+                nonempty = np.flatnonzero(loop_total > 0)
+                first, total = loop_start[nonempty], loop_total[nonempty]
+            previous_vertex = np.empty_like(vertex_index)
+            previous_vertex[1:] = vertex_index[:-1]
+            previous_vertex[first] = vertex_index[first + total - 1]
+            bad_polygon_indices.append(polygon_of_loop(np.flatnonzero(vertex_index == previous_vertex)))
+            del previous_vertex, first, total
+
+            quads = np.flatnonzero(loop_total == 4)
+            quad_start = loop_start[quads]
+            bad_polygon_indices.append(quads[(vertex_index[quad_start] == vertex_index[quad_start + 2]) |
+                                             (vertex_index[quad_start + 1] == vertex_index[quad_start + 3])])
+
+    bad_polygon_index = np.unique(np.concatenate(bad_polygon_indices)) if bad_polygon_indices else []
+    number_of_bad_polygons = len(bad_polygon_index)
+
+    edges = mesh_data.edges
+    number_of_bad_edges = 0
+    if edges is not None:
+        edge_vertices = edges.reshape((-1, 2))
+        bad_edge = edge_vertices[:, 0] == edge_vertices[:, 1]
+        if edges.shape[0] > 0 and (edges.min() < 0 or edges.max() >= number_of_vertices):
+            bad_edge |= ((edge_vertices < 0) | (edge_vertices >= number_of_vertices)).any(axis=1)
+        number_of_bad_edges = int(np.count_nonzero(bad_edge))
+        if number_of_bad_edges:
+            edges = edge_vertices[~bad_edge].ravel()
+
+    if not number_of_bad_polygons and not number_of_bad_edges:
+        return mesh_data
+
+    messages = list(mesh_data.messages)
+    messages.append(("WARNING", f"Removed {number_of_bad_polygons} invalid polygons and {number_of_bad_edges}"
+                                f" invalid edges from part {mesh_data.part_name}"))
+
+    attributes = mesh_data.attributes
+    polygon_element = mesh_data.polygon_element
+    if number_of_bad_polygons:
+        keep_polygon = np.ones((number_of_polygons,), dtype=bool)
+        keep_polygon[bad_polygon_index] = False
+        # loops of bad polygons may be out of range, loop_total is not
+        vertex_index = vertex_index[np.repeat(keep_polygon, loop_total)]
+        loop_total = loop_total[keep_polygon]
+        loop_start = np.cumsum(loop_total, dtype=np.int32)
+        loop_start -= loop_total
+        if polygon_element is not None:
+            polygon_element = polygon_element[keep_polygon]
+        attributes = [attribute if attribute.blender_domain != "FACE" else
+                      VariableAttribute(attribute.name, attribute.blender_type, attribute.blender_domain,
+                                        attribute.data.reshape((number_of_polygons, -1))[keep_polygon].ravel())
+                      for attribute in attributes]
+
+    return PartMeshData(
+        part_id=mesh_data.part_id,
+        part_name=mesh_data.part_name,
+        vertices=mesh_data.vertices,
+        vertex_index=vertex_index,
+        loop_start=loop_start,
+        loop_total=loop_total,
+        attributes=attributes,
+        messages=messages,
+        node_index=mesh_data.node_index,
+        polygon_element=polygon_element,
+        edges=edges,
+    )
@@ -0,0 +1,595 @@
+# Copyright (c) 2022 Tomas Karabela
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+import logging
+import mmap
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, List, Optional, Set, Tuple
+import numpy as np
+from .ensightreader import VariableLocation, VariableType, EnsightCaseFile, EnsightGeometryFile, EnsightVariableFile
+from .meshdata import read_part_element_data, read_part_node_data
+from .derived import DerivedVariable, TENSOR_COMPONENTS, parse_derived_variables, decompose_tensor, \
+    evaluate_derived_variable, get_number_of_components, get_tensor_suffixes
+from .structured import read_case
+from .timesets import get_number_of_timesteps, get_geometry_file, get_variable_file
+
+from bpy.app.handlers import persistent
+
+
+logger = logging.getLogger(__name__)
+
+COORDINATES_KEY = "__coordinates__"
+
+ArrayKey = Tuple[int, int, str]  # (timestep, part ID, array name or COORDINATES_KEY, see get_object_array_names())
+
+
+class TimestepArrayCache:
+    """
+    Memory-bounded LRU cache of decoded per-timestep arrays
+
+    This is shared between the main thread (frame change handler) and the prefetch
+    worker thread, so all access goes through a lock.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._arrays: "OrderedDict[ArrayKey, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: ArrayKey) -> Optional[np.ndarray]:
+        with self._lock:
+            arr = self._arrays.get(key)
+            if arr is not None:
+                self._arrays.move_to_end(key)
+            return arr
+
+    def put(self, key: ArrayKey, arr: np.ndarray):
+        if arr.nbytes > self.max_bytes:
+            return  # would evict everything else and still not fit
+
+        with self._lock:
+            old_arr = self._arrays.pop(key, None)
+            if old_arr is not None:
+                self.nbytes -= old_arr.nbytes
+            self._arrays[key] = arr
+            self.nbytes += arr.nbytes
+
+            while self.nbytes > self.max_bytes:
+                _, evicted_arr = self._arrays.popitem(last=False)
+                self.nbytes -= evicted_arr.nbytes
+
+    def has_timestep(self, timestep: int, keys: List[Tuple[int, str]]) -> bool:
+        with self._lock:
+            return all((timestep, part_id, name) in self._arrays for part_id, name in keys)
+
+    def clear(self):
+        with self._lock:
+            self._arrays.clear()
+            self.nbytes = 0
+
+
+class TransientCasePlayer:
+    """
+    Reads per-timestep data for objects imported from one EnSight case
+
+    Data for the requested timestep is read on the main thread (unless the prefetch
+    worker is already reading it), while the following ``prefetch_steps`` timesteps
+    are read ahead on a worker thread so that playback and rendering don't wait for disk.
+    """
+
+    def __init__(self, case_path: str, cache_size_mb: int, prefetch_steps: int):
+        self.case_path = case_path
+        self.case = read_case(case_path)
+        self.cache = TimestepArrayCache(cache_size_mb * 2**20)
+        self.prefetch_steps = prefetch_steps
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ensight-prefetch")
+        self._pending: Dict[int, Future] = {}
+        self._case_lock = threading.Lock()  # ensightreader caches parsed files in plain dicts
+        # derived variable definitions are parsed once, not on every frame change
+        self._source_variable_names: Dict[str, List[str]] = {}
+        self._object_array_names: Dict[Tuple[str, str, str], Dict[str, str]] = {}
+
+    def configure(self, cache_size_mb: int, prefetch_steps: int):
+        self.cache.max_bytes = cache_size_mb * 2**20
+        self.prefetch_steps = prefetch_steps
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._pending.clear()
+        self.cache.clear()
+
+    def geometry_is_transient(self) -> bool:
+        return self.case.geometry_model.timeset is not None
+
+    def is_variable_transient(self, variable_name: str) -> bool:
+        variable = self.case.variables.get(variable_name)
+        return variable is not None and variable.timeset is not None
+
+    def is_array_transient(self, name: str) -> bool:
+        return any(self.is_variable_transient(variable_name) for variable_name in self.get_source_variable_names(name))
+
+    def get_source_variable_names(self, name: str) -> List[str]:
+        """Return names of case variables needed for array of given name (tensor outputs and derived variables)"""
+        variable_names = self._source_variable_names.get(name)
+        if variable_names is None:
+            variable_names = self._source_variable_names[name] = self._find_source_variable_names(name)
+        return variable_names
+
+    def _find_source_variable_names(self, name: str) -> List[str]:
+        if name == COORDINATES_KEY:
+            return []
+        elif name in self.case.variables:
+            return [name]
+        tensor_output = get_tensor_output(name, self.case)
+        if tensor_output is not None:
+            return [tensor_output[0]]
+        elif is_derived_array_name(name):
+            variable_names: Set[str] = set()
+            defined: Set[str] = set()
+            for derived_variable in parse_derived_variables(name):
+                for operand in derived_variable.variable_names - defined:
+                    variable_names.update(self.get_source_variable_names(operand))
+                defined.add(derived_variable.name)
+            return sorted(variable_names)
+        return []
+
+    def get_object_array_names(self, obj) -> Dict[str, str]:
+        """Return `get_object_array_names()` of the object, computed once for its variables and import options"""
+        import_options = obj.get("ensight_import_options")
+        derived_text = import_options.get("derived_variables", "") if import_options is not None else ""
+        key = (obj.name_full, obj["ensight_variables"], derived_text)
+        array_names = self._object_array_names.get(key)
+        if array_names is None:
+            array_names = self._object_array_names[key] = get_object_array_names(obj, self.case)
+        return array_names
+
+    def number_of_timesteps(self) -> int:
+        return get_number_of_timesteps(self.case)
+
+    def frame_to_timestep(self, frame: int, frame_start: int) -> int:
+        return min(max(frame - frame_start, 0), self.number_of_timesteps() - 1)
+
+    def get_timestep(self, timestep: int, requests: Dict[int, List[str]]) -> Dict[ArrayKey, np.ndarray]:
+        """
+        Return arrays for given timestep, reading them if necessary
+
+        Args:
+            timestep: timestep to read
+            requests: dictionary mapping part IDs to names of variables that should be read
+                for them (``COORDINATES_KEY`` stands for node coordinates)
+
+        Returns:
+            dictionary mapping ``(timestep, part_id, name)`` to flat float32 arrays
+            ready for ``foreach_set()``; arrays that are not defined for the part are left out
+            (only transient data is returned, since static data never needs updating)
+        """
+        keys = self._get_keys(requests)
+
+        if not self.cache.has_timestep(timestep, keys):
+            future = self._pending.get(timestep)
+            if future is not None:
+                future.result()
+            else:
+                self._read_timestep(timestep, requests)
+
+        self._schedule_prefetch(timestep, requests)
+
+        arrays = {}
+        for part_id, name in keys:
+            key = (timestep, part_id, name)
+            arr = self.cache.get(key)
+            if arr is None:
+                # evicted already (cache is too small for single timestep)
+                arr = self._read_timestep(timestep, {part_id: [name]}).get(key)
+            if arr is not None and arr.shape[0] > 0:
+                arrays[key] = arr
+        return arrays
+
+    def _get_keys(self, requests: Dict[int, List[str]]) -> List[Tuple[int, str]]:
+        keys = []
+        for part_id, names in requests.items():
+            for name in names:
+                if name == COORDINATES_KEY and not self.geometry_is_transient():
+                    continue
+                if name != COORDINATES_KEY and not self.is_array_transient(name):
+                    continue
+                keys.append((part_id, name))
+        return keys
+
+    def _schedule_prefetch(self, timestep: int, requests: Dict[int, List[str]]):
+        for finished_timestep in [ts for ts, future in self._pending.items() if future.done()]:
+            self._pending.pop(finished_timestep).result()  # re-raise errors from the worker thread
+
+        keys = self._get_keys(requests)
+        last_timestep = min(timestep + self.prefetch_steps, self.number_of_timesteps() - 1)
+        for ts in range(timestep + 1, last_timestep + 1):
+            if ts not in self._pending and not self.cache.has_timestep(ts, keys):
+                self._pending[ts] = self._executor.submit(self._read_timestep, ts, requests)
+
+    def _read_timestep(self, timestep: int, requests: Dict[int, List[str]]) -> Dict[ArrayKey, np.ndarray]:
+        # tensor outputs and derived variables need all their source variables, even static ones
+        source_requests: Dict[int, List[str]] = {}
+        for part_id, names in requests.items():
+            source_names = [COORDINATES_KEY] if COORDINATES_KEY in names else []
+            for name in names:
+                if name in self.case.variables:
+                    if self.is_variable_transient(name):
+                        source_names.append(name)
+                else:
+                    source_names += self.get_source_variable_names(name)
+            source_requests[part_id] = list(dict.fromkeys(source_names))
+
+        with self._case_lock:
+            geofile = get_geometry_file(self.case, timestep) if self.geometry_is_transient() else None
+            variable_names = {name for names in source_requests.values() for name in names if name != COORDINATES_KEY}
+            variables = [get_variable_file(self.case, name, timestep) for name in sorted(variable_names)]
+
+        arrays = read_timestep_arrays(timestep, geofile, variables, source_requests)
+        arrays.update(compute_timestep_arrays(timestep, arrays, requests, self.case))
+
+        for key, arr in arrays.items():
+            self.cache.put(key, arr)
+
+        return arrays
+
+
+def read_timestep_arrays(timestep: int, geofile: Optional[EnsightGeometryFile], variables: List[EnsightVariableFile],
+                         requests: Dict[int, List[str]]) -> Dict[ArrayKey, np.ndarray]:
+    """
+    Read node coordinates (from ``geofile``, if given) and ``variables`` for parts in ``requests``
+
+    Returns:
+        dictionary mapping ``(timestep, part_id, name)`` to flat float32 arrays; arrays which
+        are not defined for the part are empty, so that they can be cached as well
+    """
+    arrays: Dict[ArrayKey, np.ndarray] = {}
+    undefined = np.empty((0,), dtype=np.float32)
+
+    if geofile is not None:
+        with geofile.mmap() as mm_geo:
+            for part_id, names in requests.items():
+                if COORDINATES_KEY not in names:
+                    continue
+                part = geofile.parts.get(part_id)
+                key = (timestep, part_id, COORDINATES_KEY)
+                arrays[key] = part.read_nodes(mm_geo).flatten() if part is not None else undefined
+
+    for variable in variables:
+        variable_name = variable.variable_name
+        part_ids = [part_id for part_id, names in requests.items() if variable_name in names]
+        with open(variable.file_path, "rb") as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for part_id in part_ids:
+                key = (timestep, part_id, variable_name)
+                if not variable.is_defined_for_part_id(part_id):
+                    arrays[key] = undefined
+                elif variable.variable_location == VariableLocation.PER_NODE:
+                    arrays[key] = read_part_node_data(variable, variable.geometry_file.parts[part_id], fp)
+                else:
+                    # per-element data of all element blocks, mapped to polygons by ensight_element_index
+                    arrays[key] = read_part_element_data(variable, variable.geometry_file.parts[part_id], mm)
+
+    return arrays
+
+
+# -----------------------------------------------------------------------------
+# Tensor outputs and derived variables
+# - they are not in the case, so they are computed from their source variables
+#   on the thread reading the time step, the same way as when the part was imported;
+#   array name of derived variable is its definition (with the definitions it uses),
+#   so that arrays cached for one expression are never used for another
+# -----------------------------------------------------------------------------
+
+def get_tensor_output(name: str, case: EnsightCaseFile) -> Optional[Tuple[str, str]]:
+    """Return ``(variable name, suffix)`` if name is attribute of tensor variable (like ``S_von_mises``)"""
+    for variable_name, variable in case.variables.items():
+        if variable.variable_type in TENSOR_COMPONENTS and name.startswith(f"{variable_name}_"):
+            suffix = name[len(variable_name)+1:]
+            if suffix in get_tensor_suffixes(variable.variable_type):
+                return variable_name, suffix
+    return None
+
+
+def is_derived_array_name(name: str) -> bool:
+    return " = " in name  # variable names in case file can't contain spaces
+
+
+def get_derived_array_name(derived_variables: List[DerivedVariable], index: int) -> str:
+    """Return array name of ``derived_variables[index]``: its definition, preceded by definitions it uses"""
+    chain = [derived_variables[index]]
+    needed = set(chain[0].variable_names)
+    for derived_variable in reversed(derived_variables[:index]):
+        if derived_variable.name in needed:
+            chain.append(derived_variable)
+            needed |= derived_variable.variable_names
+    return "; ".join(f"{d.name} = {d.expression}" for d in reversed(chain))
+
+
+def get_object_array_names(obj, case: EnsightCaseFile) -> Dict[str, str]:
+    """Return array name for each variable attribute of object created by the importer"""
+    array_names = {name: name for name in obj["ensight_variables"].split(",") if name}
+    import_options = obj.get("ensight_import_options")
+    derived_text = import_options.get("derived_variables", "") if import_options is not None else ""
+
+    # the importer skips definitions whose name is already taken, see add_derived_variables()
+    derived_variables: List[DerivedVariable] = []
+    for derived_variable in parse_derived_variables(derived_text):
+        name = derived_variable.name
+        if name not in case.variables and get_tensor_output(name, case) is None \
+                and all(d.name != name for d in derived_variables):
+            derived_variables.append(derived_variable)
+
+    for i, derived_variable in enumerate(derived_variables):
+        if derived_variable.name in array_names:
+            array_names[derived_variable.name] = get_derived_array_name(derived_variables, i)
+    return array_names
+
+
+def compute_timestep_arrays(timestep: int, arrays: Dict[ArrayKey, np.ndarray], requests: Dict[int, List[str]],
+                            case: EnsightCaseFile) -> Dict[ArrayKey, np.ndarray]:
+    """
+    Compute tensor outputs and derived variables in ``requests`` from ``arrays`` of their source variables
+
+    Returns:
+        dictionary like `read_timestep_arrays()`, arrays which can't be computed for the part are empty
+    """
+    computed: Dict[ArrayKey, np.ndarray] = {}
+    undefined = np.empty((0,), dtype=np.float32)
+
+    for part_id, names in requests.items():
+        part_values: Dict[str, np.ndarray] = {}
+
+        def get_value(name: str) -> Optional[np.ndarray]:
+            """Return ``(n,)`` or ``(n, 3)`` array of case variable or tensor output, or None if not defined"""
+            if name in part_values:
+                return part_values[name]
+            if name in case.variables:
+                data = arrays.get((timestep, part_id, name))
+                if data is None or data.shape[0] == 0:
+                    return None
+                variable_type = case.variables[name].variable_type
+                if variable_type == VariableType.VECTOR:
+                    return data.reshape((-1, 3))
+                return data if variable_type == VariableType.SCALAR else None
+            tensor_output = get_tensor_output(name, case)
+            if tensor_output is None:
+                return None
+            variable_name, suffix = tensor_output
+            data = arrays.get((timestep, part_id, variable_name))
+            if data is None or data.shape[0] == 0:
+                return None
+            variable_type = case.variables[variable_name].variable_type
+            tensor_values = decompose_tensor(data.reshape((-1, get_number_of_components(variable_type))),
+                                             variable_type,
+                                             components=suffix in TENSOR_COMPONENTS[variable_type],
+                                             von_mises_stress=suffix == "von_mises",
+                                             principal=suffix.startswith("principal_"))
+            for tensor_suffix, value in tensor_values:
+                part_values[f"{variable_name}_{tensor_suffix}"] = value
+            return part_values[name]
+
+        for name in names:
+            if name == COORDINATES_KEY or name in case.variables:
+                continue
+            if is_derived_array_name(name):
+                derived_values: Dict[str, np.ndarray] = {}
+                value = None
+                for derived_variable in parse_derived_variables(name):
+                    operands = {operand: derived_values[operand] if operand in derived_values else get_value(operand)
+                                for operand in derived_variable.variable_names}
+                    if any(operand is None for operand in operands.values()):
+                        value = None
+                        break
+                    try:
+                        value = derived_values[derived_variable.name] = \
+                            evaluate_derived_variable(derived_variable, operands)
+                    except ValueError:
+                        value = None
+                        break
+            else:
+                value = get_value(name)
+            computed[timestep, part_id, name] = value.ravel() if value is not None else undefined
+
+    return computed
+
+
+_players: Dict[str, TransientCasePlayer] = {}
+
+
+def get_player(case_path: str, cache_size_mb: int = 1024, prefetch_steps: int = 2) -> TransientCasePlayer:
+    player = _players.get(case_path)
+    if player is None:
+        player = _players[case_path] = TransientCasePlayer(case_path, cache_size_mb, prefetch_steps)
+    else:
+        player.configure(cache_size_mb, prefetch_steps)
+    return player
+
+
+def shutdown_players():
+    for player in _players.values():
+        player.shutdown()
+    _players.clear()
+
+
+def forget_player(case_path: str):
+    """Drop player for given case (eg. when the case was rewritten), next `get_player()` reads it again"""
+    player = _players.pop(case_path, None)
+    if player is not None:
+        player.shutdown()
+
+
+def tag_animated_object(obj, frame_start: int, cache_size_mb: int, prefetch_steps: int):
+    """Mark object created by the importer to be updated by `ensight_frame_change_pre()`"""
+    obj["ensight_animate"] = True
+    obj["ensight_frame_start"] = frame_start
+    obj["ensight_cache_size_mb"] = cache_size_mb
+    obj["ensight_prefetch_steps"] = prefetch_steps
+
+
+@persistent
+def ensight_frame_change_pre(scene, depsgraph=None):
+    """Frame change handler updating animated EnSight objects to timestep matching the current frame"""
+    objects_by_case: Dict[str, list] = {}
+    for obj in scene.objects:
+        if obj.type == "MESH" and obj.get("ensight_animate"):
+            objects_by_case.setdefault(obj["ensight_case_path"], []).append(obj)
+
+    for case_path, objects in objects_by_case.items():
+        player = get_player(case_path,
+                            cache_size_mb=max(obj["ensight_cache_size_mb"] for obj in objects),
+                            prefetch_steps=max(obj["ensight_prefetch_steps"] for obj in objects))
+
+        objects_by_timestep: Dict[int, list] = {}
+        for obj in objects:
+            timestep = player.frame_to_timestep(scene.frame_current, obj["ensight_frame_start"])
+            if obj.get("ensight_timestep") != timestep:
+                objects_by_timestep.setdefault(timestep, []).append(obj)
+
+        for timestep, objects_to_update in objects_by_timestep.items():
+            requests: Dict[int, List[str]] = {}
+            array_names = {obj.name_full: player.get_object_array_names(obj) for obj in objects_to_update}
+            for obj in objects_to_update:
+                for part_id in get_object_part_ids(obj):
+                    names = requests.setdefault(part_id, [])
+                    if obj.data.shape_keys is None and COORDINATES_KEY not in names:
+                        names.append(COORDINATES_KEY)  # otherwise coordinates are animated by shape keys
+                    names.extend(name for name in array_names[obj.name_full].values() if name not in names)
+
+            arrays = player.get_timestep(timestep, requests)
+
+            for obj in objects_to_update:
+                update_object_from_arrays(obj, timestep, arrays, array_names[obj.name_full])
+
+
+def get_object_part_ids(obj) -> List[int]:
+    """Return EnSight part IDs of object created by the importer (there are more of them for merged parts)"""
+    if "ensight_part_ids" in obj:
+        return list(obj["ensight_part_ids"])
+    else:
+        return [obj["ensight_part_id"]]
+
+
+def get_int_attribute(mesh, name: str) -> Optional[np.ndarray]:
+    attr = mesh.attributes.get(name)
+    if attr is None:
+        return None
+    arr = np.empty((len(attr.data),), dtype=np.int32)
+    attr.data.foreach_get("value", arr)
+    return arr
+
+
+def assemble_vertex_data(part_arrays: Dict[int, np.ndarray], k: int, number_of_vertices: int,
+                         node_index: Optional[np.ndarray], vertex_part_id: Optional[np.ndarray]) -> Optional[np.ndarray]:
+    """
+    Map per-node arrays of one or more parts to vertices of the object
+
+    Vertices of the object may be a subset of the nodes (given by ``node_index``)
+    and may come from multiple parts (given by ``vertex_part_id``). This works the same
+    for per-element arrays and polygons (with element index and part ID of each polygon).
+
+    Returns:
+        flat array with ``k`` values for each vertex, or None if the arrays don't fit the mesh
+        (eg. when number of nodes changed)
+    """
+    if node_index is None:
+        if len(part_arrays) != 1:
+            return None
+        arr, = part_arrays.values()
+        return arr if arr.shape[0] == k*number_of_vertices else None
+
+    out = np.empty((number_of_vertices, k), dtype=np.float32)
+    for part_id, arr in part_arrays.items():
+        arr = arr.reshape((-1, k))
+        if vertex_part_id is not None:
+            mask = vertex_part_id == part_id
+            part_node_index = node_index[mask]
+        else:
+            mask = slice(None)
+            part_node_index = node_index
+        if part_node_index.shape[0] > 0 and part_node_index.max() >= arr.shape[0]:
+            return None
+        out[mask] = arr[part_node_index]
+    return out.ravel()
+
+
+_objects_warned_about_coordinates: Set[str] = set()
+
+
+def update_object_from_arrays(obj, timestep: int, arrays: Dict[ArrayKey, np.ndarray],
+                              array_names: Optional[Dict[str, str]] = None):
+    """Write arrays of given timestep into the object (``array_names`` maps attribute names to array names)"""
+    mesh = obj.data
+    part_ids = get_object_part_ids(obj)
+    node_index = get_int_attribute(mesh, "ensight_node_index")
+    vertex_part_id = get_int_attribute(mesh, "part_id") if len(part_ids) > 1 else None
+    element_index = get_int_attribute(mesh, "ensight_element_index")
+    polygon_part_id = get_int_attribute(mesh, "ensight_element_part_id") if len(part_ids) > 1 else None
+
+    def get_vertex_data(name: str, k: int, domain: str = "POINT") -> Optional[np.ndarray]:
+        if domain == "FACE":
+            index, index_part_id, number_of_items = element_index, polygon_part_id, len(mesh.polygons)
+        else:
+            index, index_part_id, number_of_items = node_index, vertex_part_id, len(mesh.vertices)
+        part_arrays = {part_id: arrays[timestep, part_id, name] for part_id in part_ids
+                       if (timestep, part_id, name) in arrays}
+        if not part_arrays or (domain == "FACE" and index is None):
+            return None
+        if len(part_arrays) < len(part_ids):
+            if name == COORDINATES_KEY or index_part_id is None:
+                return None
+            # variable is not defined for some of the merged parts, they get zeros like in merge_part_mesh_data()
+            for part_id in part_ids:
+                if part_id not in part_arrays:
+                    part_index = index[index_part_id == part_id]
+                    number_of_values = int(part_index.max()) + 1 if part_index.shape[0] > 0 else 0
+                    part_arrays[part_id] = np.zeros((k*number_of_values,), dtype=np.float32)
+        return assemble_vertex_data(part_arrays, k, number_of_items, index, index_part_id)
+
+    if mesh.shape_keys is None and any((timestep, part_id, COORDINATES_KEY) in arrays for part_id in part_ids):
+        coordinates = get_vertex_data(COORDINATES_KEY, 3)
+        if coordinates is not None:
+            mesh.vertices.foreach_set("co", coordinates)
+        elif obj.name_full not in _objects_warned_about_coordinates:
+            # this runs on every frame change, warn only once for each object
+            _objects_warned_about_coordinates.add(obj.name_full)
+            logger.warning(f"EnSight: not updating coordinates of {obj.name} for timestep {timestep}"
+                           f" (number of nodes changed, please import the timestep instead)")
+
+    for name in obj["ensight_variables"].split(","):
+        attr = mesh.attributes.get(name) if name else None
+        if attr is None:
+            continue
+
+        if attr.data_type == "FLOAT_VECTOR":
+            blender_attribute_set = "vector"
+            k = 3
+        else:
+            blender_attribute_set = "value"
+            k = 1
+
+        variable_data = get_vertex_data(array_names.get(name, name) if array_names else name, k, attr.domain)
+        if variable_data is not None:
+            attr.data.foreach_set(blender_attribute_set, variable_data)
+
+    obj["ensight_timestep"] = timestep
+    mesh.update()
@@ -0,0 +1,166 @@
+# Copyright (c) 2022 Tomas Karabela
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Timing and memory instrumentation of the importer
+
+`ImportProfile` collects wall time of import phases (reading nodes, assembling loops,
+``mesh.validate()``, ...) for each part, together with bytes read from the EnSight files
+and size of the decoded arrays. It's filled both from the decoding threads and from
+the main thread; when it's not enabled, phases are not timed at all.
+
+Peak memory is measured with `tracemalloc` (NumPy reports its allocations to it) for the
+import as a whole - parts are decoded concurrently, so peaks of single phases would overlap.
+
+"""
+
+import json
+import platform
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from typing import List, Dict, Any, Iterator
+import numpy as np
+
+
+PROFILE_FORMAT_VERSION = 1
+
+
+@dataclass
+class PhaseRecord:
+    phase: str
+    part_name: str  # empty for phases not related to one part
+    seconds: float
+    thread: str
+
+
+class ImportProfile:
+    """
+    Timings and memory statistics of one import
+
+    Use `phase()` as context manager around a piece of work and `add_part_counters()`
+    to record byte counts; both can be called from any thread.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.metadata: Dict[str, Any] = {}
+        self.phases: List[PhaseRecord] = []
+        self.part_counters: Dict[str, Dict[str, int]] = {}
+        self.wall_time = 0.0
+        self.peak_memory = 0
+        self._lock = threading.Lock()
+        self._t0 = 0.0
+        self._started_tracemalloc = False
+
+    def start(self):
+        self._t0 = time.perf_counter()
+        if self.enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    def stop(self):
+        self.wall_time = time.perf_counter() - self._t0
+        if tracemalloc.is_tracing():
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    @contextmanager
+    def phase(self, name: str, part_name: str = "") -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            record = PhaseRecord(name, part_name, time.perf_counter() - t0, threading.current_thread().name)
+            with self._lock:
+                self.phases.append(record)
+
+    def add_part_counters(self, part_name: str, **counters: int):
+        if not self.enabled:
+            return
+        with self._lock:
+            part_counters = self.part_counters.setdefault(part_name, {})
+            for name, value in counters.items():
+                part_counters[name] = part_counters.get(name, 0) + int(value)
+
+    def get_phase_totals(self) -> Dict[str, float]:
+        totals: Dict[str, float] = {}
+        for record in self.phases:
+            totals[record.phase] = totals.get(record.phase, 0.0) + record.seconds
+        return dict(sorted(totals.items(), key=lambda item: -item[1]))
+
+    def get_part_totals(self) -> Dict[str, Dict[str, Any]]:
+        parts: Dict[str, Dict[str, Any]] = {}
+        for record in self.phases:
+            if record.part_name:
+                part = parts.setdefault(record.part_name, {"seconds": 0.0, "phases": {}})
+                part["seconds"] += record.seconds
+                part["phases"][record.phase] = part["phases"].get(record.phase, 0.0) + record.seconds
+        for part_name, counters in self.part_counters.items():
+            parts.setdefault(part_name, {"seconds": 0.0, "phases": {}}).update(counters)
+        return parts
+
+    def summary(self, max_parts: int = 5) -> List[str]:
+        """Return human-readable summary, one line per item"""
+        parts = self.get_part_totals()
+        bytes_read = sum(part.get("bytes_read", 0) for part in parts.values())
+        lines = [f"Import took {self.wall_time:.3f} s, read {bytes_read / 2**20:.1f} MB,"
+                 f" peak traced memory {self.peak_memory / 2**20:.1f} MB"]
+
+        lines.append("Time per phase (summed over threads):")
+        for phase, seconds in self.get_phase_totals().items():
+            lines.append(f"  {phase}: {seconds:.3f} s")
+
+        if parts:
+            lines.append("Slowest parts:")
+            slowest = sorted(parts.items(), key=lambda item: -item[1]["seconds"])[:max_parts]
+            for part_name, part in slowest:
+                lines.append(f"  {part_name}: {part['seconds']:.3f} s,"
+                             f" read {part.get('bytes_read', 0) / 2**20:.1f} MB,"
+                             f" arrays {part.get('array_bytes', 0) / 2**20:.1f} MB")
+
+        return lines
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": PROFILE_FORMAT_VERSION,
+            "metadata": {
+                "python_version": platform.python_version(),
+                "numpy_version": np.__version__,
+                **self.metadata,
+            },
+            "wall_time": self.wall_time,
+            "peak_memory": self.peak_memory,
+            "phase_totals": self.get_phase_totals(),
+            "parts": self.get_part_totals(),
+            "phases": [asdict(record) for record in self.phases],
+        }
+
+    def write_json(self, path: str):
+        with open(path, "w", encoding="utf-8") as fp:
+            json.dump(self.to_dict(), fp, indent=2)
@@ -0,0 +1,167 @@
+# Copyright (c) 2022 Tomas Karabela
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Bounding box proxies for parts that are not loaded yet
+
+With "Load bounding boxes only", the importer creates a wireframe box for each part,
+tagged with the case path, part ID, time step and import options. `LoadEnsightParts`
+later imports the full geometry for some of the proxies and swaps it into the proxy objects,
+so that their names, transforms, collections, materials and modifiers are kept.
+
+"""
+
+import json
+from typing import Dict, List, Set, Tuple
+import numpy as np
+
+from bpy.props import EnumProperty
+from bpy.types import Operator, Object
+import bpy
+
+
+_BOX_EDGES = [(0, 1), (1, 3), (3, 2), (2, 0),
+              (4, 5), (5, 7), (7, 6), (6, 4),
+              (0, 4), (1, 5), (2, 6), (3, 7)]
+
+
+def create_proxy_object(name: str, bounding_box: np.ndarray) -> Object:
+    """Create wireframe box object spanning given ``(2, 3)`` array of min/max coordinates"""
+    vertices = [(bounding_box[i, 0], bounding_box[j, 1], bounding_box[k, 2])
+                for k in (0, 1) for j in (0, 1) for i in (0, 1)]
+
+    mesh = bpy.data.meshes.new(name=name)
+    mesh.from_pydata(vertices, _BOX_EDGES, [])
+    mesh.update()
+
+    obj = bpy.data.objects.new(name, mesh)
+    obj.display_type = "WIRE"
+    obj.hide_render = True
+    obj["ensight_proxy"] = True
+    return obj
+
+
+def is_proxy_object(obj: Object) -> bool:
+    return obj.type == "MESH" and bool(obj.get("ensight_proxy"))
+
+
+def replace_object_geometry(obj: Object, new_obj: Object):
+    """
+    Move mesh and EnSight properties of freshly imported object into existing object and remove the new object
+
+    The existing object keeps its name, transform, collections, modifiers and materials.
+    """
+    old_mesh = obj.data
+    new_mesh = new_obj.data
+    for mat in old_mesh.materials:
+        new_mesh.materials.append(mat)
+
+    obj.data = new_mesh
+    for key in new_obj.keys():
+        obj[key] = new_obj[key]
+
+    bpy.data.objects.remove(new_obj)
+    if old_mesh.users == 0:
+        mesh_name = old_mesh.name
+        bpy.data.meshes.remove(old_mesh)
+        new_mesh.name = mesh_name
+
+
+class LoadEnsightParts(Operator):
+    """Load full geometry of EnSight parts represented by bounding box proxies"""
+    bl_idname = "blender_ensightreader.load_ensight_parts"
+    bl_label = "Load EnSight Parts"
+    bl_options = {"REGISTER", "UNDO"}
+
+    which: EnumProperty(
+        name="Parts to load",
+        description="Which bounding box proxies should be replaced by full geometry",
+        items=[("SELECTED", "Selected", "Load selected proxies"),
+               ("VISIBLE", "Visible", "Load proxies visible in the viewport")],
+        default="SELECTED")
+
+    @classmethod
+    def poll(cls, context) -> bool:
+        return context.mode == "OBJECT"
+
+    def execute(self, context) -> Set[str]:
+        if self.which == "SELECTED":
+            proxies = [obj for obj in context.selected_objects if is_proxy_object(obj)]
+        else:
+            proxies = [obj for obj in context.visible_objects if is_proxy_object(obj)]
+
+        if not proxies:
+            self.report({"WARNING"}, "No EnSight bounding boxes to load")
+            return {"CANCELLED"}
+
+        # proxies from the same case, time step and import options are loaded by a single import
+        proxies_by_import: Dict[Tuple[str, int, str], Dict[int, Object]] = {}
+        for obj in proxies:
+            import_options = obj["ensight_import_options"].to_dict()
+            key = obj["ensight_case_path"], obj["ensight_timestep"], json.dumps(import_options, sort_keys=True)
+            proxies_by_import.setdefault(key, {})[obj["ensight_part_id"]] = obj
+
+        loaded_objects: List[Object] = []
+        for (case_path, timestep, import_options), proxies_by_part_id in proxies_by_import.items():
+            self.report({"INFO"}, f"Loading {len(proxies_by_part_id)} parts from {case_path}")
+            # each proxy gets geometry of its own part, so the parts must not be merged
+            # (the importer could otherwise reuse merge_parts from its last call)
+            result = bpy.ops.blender_ensightreader.import_ensight_gold(
+                filepath=case_path,
+                timestep=timestep,
+                part_ids=",".join(str(part_id) for part_id in proxies_by_part_id),
+                create_material=False,
+                **dict(json.loads(import_options), merge_parts=False))
+            if result != {"FINISHED"}:
+                self.report({"ERROR"}, f"Failed to load parts from {case_path}")
+                continue
+
+            # the importer leaves just the newly created objects selected; hidden full resolution
+            # copies of simplified parts share the part ID with them, they are kept as separate objects
+            for new_obj in list(context.selected_objects):
+                if new_obj.get("ensight_full_resolution"):
+                    continue
+                proxy = proxies_by_part_id.pop(new_obj.get("ensight_part_id"), None)
+                if proxy is None:
+                    continue
+                self.replace_proxy_geometry(proxy, new_obj)
+                loaded_objects.append(proxy)
+
+        bpy.ops.object.select_all(action="DESELECT")
+        for obj in loaded_objects:
+            obj.select_set(True)
+        if loaded_objects:
+            context.view_layer.objects.active = loaded_objects[0]
+
+        self.report({"INFO"}, f"Loaded {len(loaded_objects)} EnSight parts")
+        return {"FINISHED"}
+
+    @staticmethod
+    def replace_proxy_geometry(proxy: Object, new_obj: Object):
+        """Turn the proxy into regular object with geometry of freshly imported object"""
+        replace_object_geometry(proxy, new_obj)
+        del proxy["ensight_proxy"]
+        proxy.display_type = "TEXTURED"
+        proxy.hide_render = False
+
+
+def menu_func_load_parts(self, context):
+    self.layout.operator(LoadEnsightParts.bl_idname, text="Load Selected EnSight Parts").which = "SELECTED"
+    self.layout.operator(LoadEnsightParts.bl_idname, text="Load Visible EnSight Parts").which = "VISIBLE"
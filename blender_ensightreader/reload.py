@@ -0,0 +1,230 @@
+# Copyright (c) 2022 Tomas Karabela
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Reloading of imported objects when the EnSight case changes on disk
+
+The importer tags each object with size and modification time of the files it was read from
+(``ensight_files``) and with a hash of number of nodes and elements of its parts
+(``ensight_topology``). `ReloadEnsightCase` skips objects whose files didn't change; if the
+topology is the same, node coordinates and variables are written into the existing mesh
+(the same way as when animating time steps), otherwise the parts are imported again and the new
+mesh is swapped into the existing object, so that its modifiers and materials are kept.
+
+"""
+
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .ensightreader import EnsightCaseFile, EnsightGeometryFile
+from .meshdata import get_part_topology
+from .playback import COORDINATES_KEY, get_object_part_ids, read_timestep_arrays, update_object_from_arrays, \
+    forget_player
+from .proxy import is_proxy_object, replace_object_geometry
+from .structured import read_case
+from .timesets import get_geometry_file, get_variable_file
+
+from bpy.props import EnumProperty
+from bpy.types import Operator, Object
+import bpy
+
+
+def get_file_identities(paths: Iterable[str]) -> str:
+    """Return JSON with size and modification time of given files (to be stored in object property)"""
+    identities = {}
+    for path in paths:
+        st = os.stat(path)
+        identities[os.path.abspath(path)] = [st.st_size, st.st_mtime_ns]
+    return json.dumps(identities, sort_keys=True)
+
+
+def files_changed(file_identities: str) -> bool:
+    """Return True if any of the files from `get_file_identities()` changed (or is missing)"""
+    for path, identity in json.loads(file_identities).items():
+        try:
+            st = os.stat(path)
+        except OSError:
+            return True
+        if [st.st_size, st.st_mtime_ns] != identity:
+            return True
+    return False
+
+
+def get_topology_key(geofile: EnsightGeometryFile, part_ids: Iterable[int]) -> str:
+    """Return hash of number of nodes and elements of given parts (missing parts are included as such)"""
+    topology = []
+    for part_id in sorted(part_ids):
+        part = geofile.parts.get(part_id)
+        if part is None:
+            topology.append([part_id, None])
+        else:
+            number_of_nodes, blocks = get_part_topology(part)
+            topology.append([part_id, number_of_nodes, [[str(element_type), n] for element_type, n in blocks]])
+    return hashlib.sha1(json.dumps(topology).encode("utf-8")).hexdigest()
+
+
+def is_reloadable_object(obj: Object) -> bool:
+    return (obj.type == "MESH" and "ensight_case_path" in obj and "ensight_files" in obj
+            and not is_proxy_object(obj))
+
+
+class ReloadEnsightCase(Operator):
+    """Update objects imported from EnSight Gold case whose files have changed on disk"""
+    bl_idname = "blender_ensightreader.reload_ensight_case"
+    bl_label = "Reload EnSight Case"
+    bl_options = {"REGISTER", "UNDO"}
+
+    which: EnumProperty(
+        name="Objects to reload",
+        description="Which imported objects should be reloaded",
+        items=[("ALL", "All", "Reload all objects imported from EnSight cases in the scene"),
+               ("SELECTED", "Selected", "Reload selected objects")],
+        default="ALL")
+
+    @classmethod
+    def poll(cls, context) -> bool:
+        return context.mode == "OBJECT"
+
+    def execute(self, context) -> Set[str]:
+        objects = context.selected_objects if self.which == "SELECTED" else context.scene.objects
+        objects = [obj for obj in objects if is_reloadable_object(obj) and files_changed(obj["ensight_files"])]
+
+        if not objects:
+            self.report({"INFO"}, "EnSight objects are up to date")
+            return {"FINISHED"}
+
+        objects_by_case: Dict[str, List[Object]] = {}
+        for obj in objects:
+            objects_by_case.setdefault(obj["ensight_case_path"], []).append(obj)
+
+        # importing the rebuilt parts changes selection, restore it afterwards
+        selected_objects = list(context.selected_objects)
+        active_object = context.view_layer.objects.active
+
+        updated_objects: List[Object] = []
+        rebuilt_objects: List[Object] = []
+        for case_path, case_objects in objects_by_case.items():
+            self.report({"INFO"}, f"Reloading {len(case_objects)} objects from {case_path}")
+            forget_player(case_path)  # animation has to see the new files too
+            case = read_case(case_path)
+
+            objects_to_rebuild = []
+            for obj in case_objects:
+                if self.can_update_in_place(case, obj):
+                    self.update_in_place(case, obj)
+                    updated_objects.append(obj)
+                else:
+                    objects_to_rebuild.append(obj)
+            rebuilt_objects += self.rebuild_objects(case_path, objects_to_rebuild)
+
+        if rebuilt_objects:
+            bpy.ops.object.select_all(action="DESELECT")
+            for obj in selected_objects:
+                obj.select_set(True)
+            context.view_layer.objects.active = active_object
+
+        self.report({"INFO"}, f"Updated {len(updated_objects)} EnSight objects in place,"
+                              f" rebuilt {len(rebuilt_objects)}")
+        return {"FINISHED"}
+
+    @staticmethod
+    def can_update_in_place(case: EnsightCaseFile, obj: Object) -> bool:
+        """Return True if the object has the same topology and holds only data read straight from the case"""
+        import_options = obj["ensight_import_options"]
+        if obj.data.shape_keys is not None:
+            return False  # coordinates of all time steps would have to be read again
+        if (import_options["lod_target_faces"] or import_options["lod_grid_resolution"]) \
+                and not obj.get("ensight_full_resolution"):
+            return False  # clustered vertices are not nodes of the part
+        # tensor components and derived variables are computed at import
+        variable_names = [name for name in obj["ensight_variables"].split(",") if name]
+        if any(name not in case.variables for name in variable_names):
+            return False
+
+        geofile = get_geometry_file(case, obj["ensight_timestep"])
+        return get_topology_key(geofile, get_object_part_ids(obj)) == obj["ensight_topology"]
+
+    def update_in_place(self, case: EnsightCaseFile, obj: Object):
+        timestep = obj["ensight_timestep"]
+        geofile = get_geometry_file(case, timestep)
+        variable_names = [name for name in obj["ensight_variables"].split(",") if name]
+        variables = [get_variable_file(case, name, timestep) for name in variable_names]
+        part_ids = get_object_part_ids(obj)
+
+        requests = {part_id: [COORDINATES_KEY] + variable_names for part_id in part_ids}
+        arrays = read_timestep_arrays(timestep, geofile, variables, requests)
+        update_object_from_arrays(obj, timestep, {key: arr for key, arr in arrays.items() if arr.shape[0] > 0})
+
+        obj["ensight_files"] = get_file_identities([case.casefile_path, geofile.file_path] +
+                                                   [variable.file_path for variable in variables])
+        self.report({"INFO"}, f"Updated {obj.name} in place")
+
+    def rebuild_objects(self, case_path: str, objects: List[Object]) -> List[Object]:
+        """Import parts of given objects again and swap the new meshes into them"""
+        # objects imported with the same options are rebuilt by a single import, merged objects by their own
+        objects_by_import: Dict[Tuple[int, str, Optional[str]], Dict[Tuple[int, ...], Object]] = {}
+        for obj in objects:
+            import_options = obj["ensight_import_options"].to_dict()
+            if obj.get("ensight_full_resolution"):
+                import_options.update(lod_target_faces=0, lod_grid_resolution=0, lod_keep_full_resolution=False)
+            else:
+                import_options.update(lod_keep_full_resolution=False)
+            key = (obj["ensight_timestep"], json.dumps(import_options, sort_keys=True),
+                   obj.name if import_options["merge_parts"] else None)
+            objects_by_import.setdefault(key, {})[tuple(sorted(get_object_part_ids(obj)))] = obj
+
+        rebuilt_objects = []
+        for (timestep, import_options, _), objects_by_part_ids in objects_by_import.items():
+            part_ids = sorted({part_id for part_ids in objects_by_part_ids for part_id in part_ids})
+            result = bpy.ops.blender_ensightreader.import_ensight_gold(
+                filepath=case_path,
+                timestep=timestep,
+                part_ids=",".join(map(str, part_ids)),
+                create_material=False,
+                **json.loads(import_options))
+            if result != {"FINISHED"}:
+                self.report({"ERROR"}, f"Failed to reload parts from {case_path}")
+                continue
+
+            # the importer leaves just the newly created objects selected
+            for new_obj in list(bpy.context.selected_objects):
+                new_part_ids = tuple(sorted(get_object_part_ids(new_obj)))
+                obj = objects_by_part_ids.pop(new_part_ids, None)
+                if obj is None and len(objects_by_part_ids) == 1 and json.loads(import_options)["merge_parts"]:
+                    obj = objects_by_part_ids.popitem()[1]  # some of the merged parts are gone
+                if obj is None:
+                    new_mesh = new_obj.data
+                    bpy.data.objects.remove(new_obj)
+                    bpy.data.meshes.remove(new_mesh)
+                    continue
+                replace_object_geometry(obj, new_obj)
+                self.report({"INFO"}, f"Rebuilt {obj.name}")
+                rebuilt_objects.append(obj)
+
+            for obj in objects_by_part_ids.values():
+                self.report({"WARNING"}, f"Parts of {obj.name} are no longer in the case, not reloading it")
+
+        return rebuilt_objects
+
+
+def menu_func_reload(self, context):
+    self.layout.operator(ReloadEnsightCase.bl_idname, text="Reload EnSight Case")
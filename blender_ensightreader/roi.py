@@ -0,0 +1,199 @@
+# Copyright (c) 2022 Tomas Karabela
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Region of interest: spatial filtering of parts
+
+Bounding boxes of parts are computed from node coordinates only (see `read_part_bounding_box()`)
+and cached for each geometry file (keyed by file path, size and modification time), in memory
+and optionally as a JSON file for each case in the cache directory. Parts whose box doesn't
+intersect the region are not read at all; parts crossing its boundary can be cropped to polygons
+reaching into the region with `crop_part_mesh_data()`.
+
+"""
+
+import hashlib
+import json
+import os
+import os.path as op
+import threading
+from typing import Dict, Optional
+import numpy as np
+from .meshdata import PartMeshData, VariableAttribute, compact_nodes
+from .cache import SessionMemory
+
+BOUNDING_BOX_CACHE_FORMAT_VERSION = 1
+
+
+def boxes_intersect(a: np.ndarray, b: np.ndarray) -> bool:
+    """Return True if ``(2, 3)`` boxes of minimum and maximum coordinates intersect (or touch)"""
+    return bool(np.all(a[0] <= b[1]) and np.all(b[0] <= a[1]))
+
+
+def box_contains(outer: np.ndarray, inner: np.ndarray) -> bool:
+    return bool(np.all(outer[0] <= inner[0]) and np.all(inner[1] <= outer[1]))
+
+
+class BoundingBoxCache:
+    """
+    Bounding boxes of parts, keyed by geometry file and part ID
+
+    This can be used from multiple threads at once. If directory is given, boxes are
+    loaded from and saved to ``bboxes-<hash of case path>.json`` there.
+    """
+
+    # boxes computed in this Blender session, shared by all caches
+    _memory = SessionMemory(max_entries=100_000)
+
+    def __init__(self, case_path: str, directory: Optional[str] = None):
+        self.file_path = None
+        self._entries: Dict[str, np.ndarray] = {}
+        self._modified = False
+        self._lock = threading.Lock()
+
+        if directory:
+            case_hash = hashlib.sha1(op.abspath(case_path).encode("utf-8")).hexdigest()
+            self.file_path = op.join(directory, f"bboxes-{case_hash}.json")
+            try:
+                with open(self.file_path, encoding="utf-8") as fp:
+                    data = json.load(fp)
+                if data.get("version") == BOUNDING_BOX_CACHE_FORMAT_VERSION:
+                    self._entries = {key: np.array(value, dtype=np.float32).reshape((2, 3))
+                                     for key, value in data["bounding_boxes"].items()}
+            except (OSError, ValueError, KeyError):
+                pass
+
+    @staticmethod
+    def get_file_key(geometry_file_path: str) -> str:
+        st = os.stat(geometry_file_path)
+        return f"{op.abspath(geometry_file_path)}|{st.st_size}|{st.st_mtime_ns}"
+
+    def get(self, file_key: str, part_id: int) -> Optional[np.ndarray]:
+        key = f"{file_key}|{part_id}"
+        bounding_box = self._memory.get(key)
+        if bounding_box is None:
+            with self._lock:
+                bounding_box = self._entries.get(key)
+        return bounding_box
+
+    def put(self, file_key: str, part_id: int, bounding_box: np.ndarray):
+        key = f"{file_key}|{part_id}"
+        self._memory.put(key, bounding_box)
+        with self._lock:
+            self._entries[key] = bounding_box
+            self._modified = True
+
+    def save(self):
+        if self.file_path is None or not self._modified:
+            return
+        os.makedirs(op.dirname(self.file_path), exist_ok=True)
+        tmp_path = f"{self.file_path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(tmp_path, "w", encoding="utf-8") as fp:
+            json.dump({"version": BOUNDING_BOX_CACHE_FORMAT_VERSION,
+                       "bounding_boxes": {key: bounding_box.ravel().tolist()
+                                          for key, bounding_box in self._entries.items()}},
+                      fp)
+        os.replace(tmp_path, self.file_path)
+        self._modified = False
+
+
+def crop_part_mesh_data(mesh_data: PartMeshData, bounding_box: np.ndarray) -> PartMeshData:
+    """
+    Keep only polygons and edges with at least one vertex inside ``(2, 3)`` box
+
+    Vertices which are not used by the remaining polygons and edges are left out, point and face
+    attributes, ``node_index`` and ``polygon_element`` are kept in sync. Point clouds (parts with
+    no polygons or edges) keep vertices inside the box.
+
+    Returns:
+        ``mesh_data`` itself if nothing is left out, otherwise its cropped copy
+    """
+    vertices = mesh_data.vertices.reshape((-1, 3))
+    inside = np.all((vertices >= bounding_box[0]) & (vertices <= bounding_box[1]), axis=1)
+    if inside.all():
+        return mesh_data
+    is_point_cloud = not mesh_data.has_cells and mesh_data.edges is None
+
+    vertex_index, loop_start, loop_total = mesh_data.vertex_index, mesh_data.loop_start, mesh_data.loop_total
+    number_of_polygons = loop_start.shape[0]
+
+    # number of loops inside the box for each polygon, from cumulative sum over all loops
+    loops_inside = np.zeros((vertex_index.shape[0] + 1,), dtype=np.int64)
+    np.cumsum(inside[vertex_index], out=loops_inside[1:])
+    keep_polygon = loops_inside[loop_start + loop_total] > loops_inside[loop_start]
+    del loops_inside
+
+    edges = mesh_data.edges
+    keep_edge = inside[edges.reshape((-1, 2))].any(axis=1) if edges is not None else None
+    if keep_polygon.all() and (keep_edge is None or keep_edge.all()) and mesh_data.node_index is None \
+            and not is_point_cloud:
+        # vertices of the part are its nodes, all of them are used (except for free nodes)
+        return mesh_data
+
+    vertex_index = vertex_index[np.repeat(keep_polygon, loop_total)]
+    loop_total = loop_total[keep_polygon]
+    loop_start = np.cumsum(loop_total, dtype=np.int32)
+    loop_start -= loop_total
+
+    number_of_loops = vertex_index.shape[0]
+    if is_point_cloud:
+        used_vertices = inside
+    elif edges is not None:
+        edges = edges.reshape((-1, 2))[keep_edge].ravel()
+        used_vertices, renumbered = compact_nodes(np.concatenate([vertex_index, edges]), vertices.shape[0])
+        vertex_index, edges = renumbered[:number_of_loops], renumbered[number_of_loops:]
+    else:
+        used_vertices, vertex_index = compact_nodes(vertex_index, vertices.shape[0])
+
+    attributes = []
+    for attribute in mesh_data.attributes:
+        if attribute.blender_domain == "FACE":
+            if number_of_polygons == 0:
+                data = attribute.data  # edges only, there is nothing to crop
+            else:
+                data = attribute.data.reshape((number_of_polygons, -1))[keep_polygon]
+        else:
+            data = attribute.data.reshape((vertices.shape[0], -1))[used_vertices]
+        attributes.append(VariableAttribute(attribute.name, attribute.blender_type, attribute.blender_domain,
+                                            data.ravel()))
+
+    if mesh_data.node_index is not None:
+        node_index = mesh_data.node_index[used_vertices]
+    else:
+        node_index = np.flatnonzero(used_vertices).astype(np.int32)
+
+    messages = list(mesh_data.messages)
+    messages.append(("INFO", f"Cropped part {mesh_data.part_name} to region of interest:"
+                             f" {int(keep_polygon.sum())} of {number_of_polygons} polygons,"
+                             f" {node_index.shape[0]} of {vertices.shape[0]} vertices"))
+
+    return PartMeshData(
+        part_id=mesh_data.part_id,
+        part_name=mesh_data.part_name,
+        vertices=vertices[used_vertices].ravel(),
+        vertex_index=vertex_index,
+        loop_start=loop_start,
+        loop_total=loop_total,
+        attributes=attributes,
+        messages=messages,
+        node_index=node_index,
+        polygon_element=mesh_data.polygon_element[keep_polygon] if mesh_data.polygon_element is not None else None,
+        edges=edges,
+    )
@@ -0,0 +1,212 @@
+# Copyright (c) 2022 Tomas Karabela
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Extraction of boundary faces ("skin") from volume element blocks
+
+A face is on the boundary if no other element has a face with the same set of nodes.
+Faces are grouped by number of nodes, the nodes of each face are sorted and packed
+into integer keys, the keys are sorted and faces whose key occurs exactly once are kept.
+Everything is done with whole-array NumPy operations, processing the elements in chunks
+to limit the size of temporary arrays.
+
+"""
+
+from typing import List, Dict, Tuple, BinaryIO
+import numpy as np
+from .ensightreader import GeometryPart, ElementType
+
+
+# Faces of volume elements (0-based indices into element connectivity), ordered
+# so that the normals point outwards. Quadratic elements list the corner nodes
+# first, so their corner faces are the same as for the linear elements.
+_TETRA_FACES = [(0, 2, 1), (0, 1, 3), (1, 2, 3), (0, 3, 2)]
+_PYRAMID_FACES = [(0, 3, 2, 1), (0, 1, 4), (1, 2, 4), (2, 3, 4), (3, 0, 4)]
+_PENTA_FACES = [(0, 2, 1), (3, 4, 5), (0, 1, 4, 3), (1, 2, 5, 4), (2, 0, 3, 5)]
+_HEXA_FACES = [(0, 3, 2, 1), (4, 5, 6, 7), (0, 1, 5, 4), (1, 2, 6, 5), (2, 3, 7, 6), (3, 0, 4, 7)]
+
+FACES_PER_ELEMENT: Dict[ElementType, List[Tuple[int, ...]]] = {
+    ElementType.TETRA4: _TETRA_FACES,
+    ElementType.TETRA10: _TETRA_FACES,
+    ElementType.PYRAMID5: _PYRAMID_FACES,
+    ElementType.PYRAMID13: _PYRAMID_FACES,
+    ElementType.PENTA6: _PENTA_FACES,
+    ElementType.PENTA15: _PENTA_FACES,
+    ElementType.HEXA8: _HEXA_FACES,
+    ElementType.HEXA20: _HEXA_FACES,
+}
+
+CHUNK_SIZE = 1 << 20  # elements processed at once when building face keys
+
+
+class _FaceSource:
+    """
+    Faces with ``k`` nodes taken from one element block
+
+    Face ``i`` is ``connectivity[i // nf, face_table[i % nf]]`` where ``nf`` is the number
+    of faces with ``k`` nodes per element. NFACED faces are given explicitly as ``(m, k)``
+    connectivity with trivial face table. ``row_element`` gives the element (numbered
+    across all blocks of the part) for each row of ``connectivity``.
+    """
+
+    def __init__(self, connectivity: np.ndarray, face_table: np.ndarray, row_element: np.ndarray):
+        self.connectivity = connectivity
+        self.face_table = face_table
+        self.row_element = row_element
+
+    @property
+    def number_of_faces(self) -> int:
+        return self.connectivity.shape[0] * self.face_table.shape[0]
+
+    def iter_chunks(self):
+        for start in range(0, self.connectivity.shape[0], CHUNK_SIZE):
+            elements = self.connectivity[start:start+CHUNK_SIZE]
+            yield elements[:, self.face_table].reshape((-1, self.face_table.shape[1]))
+
+    def take(self, face_indices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Return connectivity of given faces and elements they belong to"""
+        nf = self.face_table.shape[0]
+        row_indices, local_face_indices = np.divmod(face_indices, nf)
+        return (self.connectivity[row_indices[:, np.newaxis], self.face_table[local_face_indices]],
+                self.row_element[row_indices])
+
+
+def _find_unique_faces(sources: List[_FaceSource], k: int, max_node: int) -> np.ndarray:
+    """Return indices of faces (into concatenation of all sources) which occur exactly once"""
+    number_of_faces = sum(source.number_of_faces for source in sources)
+
+    # sorted nodes of each face are packed into as few uint64 words as possible
+    bits = max(int(max_node).bit_length(), 1)
+    nodes_per_word = 64 // bits
+    number_of_words = -(-k // nodes_per_word)
+    keys = [np.empty((number_of_faces,), dtype=np.uint64) for _ in range(number_of_words)]
+
+    offset = 0
+    for source in sources:
+        for faces in source.iter_chunks():
+            faces.sort(axis=1)
+            faces = faces.astype(np.uint64)
+            n = faces.shape[0]
+            for w, key in enumerate(keys):
+                columns = range(w*nodes_per_word, min((w+1)*nodes_per_word, k))
+                word = key[offset:offset+n]
+                word[:] = 0
+                for column in columns:
+                    word <<= np.uint64(bits)
+                    word |= faces[:, column]
+            offset += n
+
+    # np.lexsort uses the last key as the primary one
+    order = np.lexsort(keys[::-1]) if number_of_words > 1 else np.argsort(keys[0])
+
+    same_as_next = np.ones((max(number_of_faces - 1, 0),), dtype=bool)
+    for i in range(len(keys)):
+        key = keys[i][order]
+        keys[i] = None  # free memory before we allocate another sorted copy
+        same_as_next &= key[1:] == key[:-1]
+        del key
+
+    is_unique = np.ones((number_of_faces,), dtype=bool)
+    is_unique[1:] &= ~same_as_next
+    is_unique[:-1] &= ~same_as_next
+
+    return np.sort(order[is_unique])
+
+
+def extract_boundary_faces(part: GeometryPart, fp: BinaryIO) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[str]]:
+    """
+    Find boundary faces of volume element blocks in given part
+
+    Faces are matched across all volume blocks of the part, so that faces between
+    eg. hexahedra and prisms are correctly recognized as interior.
+
+    Args:
+        part: part with volume elements
+        fp: opened geometry file
+
+    Returns:
+        tuple ``(polygon_node_counts, polygon_connectivity, polygon_element, messages)`` with boundary faces
+        in the same format as ``UnstructuredElementBlock.read_connectivity_nsided()``
+        (node indices are numbered from 1), element of each face (numbered from 0 across all
+        element blocks of the part, in order), and list of warnings about skipped blocks
+    """
+    sources_per_k: Dict[int, List[_FaceSource]] = {}
+    max_node = 0
+    messages = []
+
+    element_offset = 0
+    for block in part.element_blocks:
+        block_element_offset = element_offset
+        element_offset += block.number_of_elements
+        if block.element_type.dimension != 3:
+            continue
+
+        if block.element_type == ElementType.NFACED:
+            polyhedra_face_counts, face_node_counts, face_connectivity = block.read_connectivity_nfaced(fp)
+            face_offsets = np.cumsum(face_node_counts, dtype=np.int64) - face_node_counts
+            face_element = np.repeat(np.arange(block_element_offset, element_offset, dtype=np.int32),
+                                     polyhedra_face_counts)
+            for k in np.unique(face_node_counts):
+                face_indices = np.flatnonzero(face_node_counts == k)
+                connectivity = face_connectivity[face_offsets[face_indices, np.newaxis] + np.arange(k)]
+                face_table = np.arange(k, dtype=np.intp)[np.newaxis, :]
+                sources_per_k.setdefault(int(k), []).append(_FaceSource(connectivity, face_table,
+                                                                        face_element[face_indices]))
+            if face_connectivity.shape[0] > 0:
+                max_node = max(max_node, int(face_connectivity.max()))
+        elif block.element_type in FACES_PER_ELEMENT:
+            connectivity = block.read_connectivity(fp)
+            row_element = np.arange(block_element_offset, element_offset, dtype=np.int32)
+            faces = FACES_PER_ELEMENT[block.element_type]
+            for k in sorted({len(face) for face in faces}):
+                face_table = np.asarray([face for face in faces if len(face) == k], dtype=np.intp)
+                sources_per_k.setdefault(k, []).append(_FaceSource(connectivity, face_table, row_element))
+            if connectivity.shape[0] > 0:
+                max_node = max(max_node, int(connectivity.max()))
+        else:
+            messages.append(f"Skipping {block.element_type.value} element block - cannot extract its surface")
+
+    polygon_node_counts_ = []
+    polygon_connectivity_ = []
+    polygon_element_ = []
+
+    for k, sources in sorted(sources_per_k.items()):
+        unique_face_indices = _find_unique_faces(sources, k, max_node)
+
+        source_start = 0
+        for source in sources:
+            source_stop = source_start + source.number_of_faces
+            lo, hi = np.searchsorted(unique_face_indices, [source_start, source_stop])
+            faces, face_element = source.take(unique_face_indices[lo:hi] - source_start)
+            polygon_connectivity_.append(faces.ravel())
+            polygon_element_.append(face_element)
+            polygon_node_counts_.append(np.full((faces.shape[0],), k, dtype=np.int32))
+            source_start = source_stop
+
+    if polygon_connectivity_:
+        polygon_node_counts = np.concatenate(polygon_node_counts_)
+        polygon_connectivity = np.concatenate(polygon_connectivity_).astype(np.int32, copy=False)
+        polygon_element = np.concatenate(polygon_element_)
+    else:
+        polygon_node_counts = np.ndarray((0,), dtype=np.int32)
+        polygon_connectivity = np.ndarray((0,), dtype=np.int32)
+        polygon_element = np.ndarray((0,), dtype=np.int32)
+
+    return polygon_node_counts, polygon_connectivity, polygon_element, messages
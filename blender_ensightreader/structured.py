@@ -0,0 +1,545 @@
+# Copyright (c) 2022 Tomas Karabela
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Structured (``block``) parts of EnSight Gold geometry
+
+ensightreader only parses unstructured parts, so geometry files are parsed here instead:
+unstructured parts are still handed to `GeometryPart.from_file()`, structured ones become
+`StructuredPart` (with no element blocks, their connectivity is implied by the I/J/K dimensions).
+Use `read_case()` from this module instead of the one from ensightreader to get case whose
+geometry and variable files understand structured parts.
+
+Surfaces of structured blocks are generated from index arithmetic alone (see `get_structured_faces()`),
+nothing is stored in the file and no volume cells are ever built.
+
+"""
+
+import os
+import os.path as op
+import re
+from dataclasses import dataclass, fields
+from typing import BinaryIO, Dict, Optional, Tuple
+import numpy as np
+from . import ensightreader
+from .ensightreader import GeometryPart, EnsightGeometryFile, EnsightVariableFile, EnsightGeometryFileSet, \
+    EnsightVariableFileSet, EnsightCaseFile, IdHandling, ChangingGeometry, VariableLocation, VariableType, \
+    ElementType, EnsightReaderError
+
+LINE_SIZE = 80
+INT_SIZE = 4
+FLOAT_SIZE = 4
+
+BLOCK_TYPES = ("curvilinear", "rectilinear", "uniform")
+
+# I/J/K axis of each surface option
+PLANE_AXES = {"I": 0, "J": 1, "K": 2}
+
+VALUES_FOR_VARIABLE_TYPE = {
+    VariableType.SCALAR: 1,
+    VariableType.VECTOR: 3,
+    VariableType.TENSOR_SYMM: 6,
+    VariableType.TENSOR_ASYM: 9,
+}
+
+
+def _read_line(fp: BinaryIO) -> str:
+    data = fp.read(LINE_SIZE)
+    if len(data) != LINE_SIZE:
+        raise EnsightReaderError(f"Only read {len(data)} bytes, expected {LINE_SIZE} bytes", fp)
+    return data.decode("ascii", "replace")
+
+
+def _peek_line(fp: BinaryIO) -> str:
+    line = _read_line(fp)
+    fp.seek(-LINE_SIZE, os.SEEK_CUR)
+    return line
+
+
+def _read_array(fp: BinaryIO, count: int, dtype) -> np.ndarray:
+    data = fp.read(count * 4)
+    if len(data) != count * 4:
+        raise EnsightReaderError(f"Only read {len(data)} bytes, expected {count * 4} bytes", fp)
+    return np.frombuffer(data, dtype=dtype)
+
+
+@dataclass
+class StructuredPart(GeometryPart):
+    """
+    Structured part in EnSight Gold geometry file
+
+    Nodes are numbered with I index changing fastest, then J, then K; cells likewise,
+    with ``max(n - 1, 1)`` cells along each axis with ``n`` nodes (so that 2D and 1D blocks
+    have cells, too). Per-element variables have one value for each cell.
+
+    Attributes:
+        block_type: ``"curvilinear"``, ``"rectilinear"`` or ``"uniform"``
+        dims: number of nodes along I, J and K axes
+        coordinates_offset: offset to node coordinates (all X, then all Y and Z for curvilinear blocks,
+            X, Y and Z of each axis for rectilinear blocks, origin and spacing for uniform blocks)
+        iblanks_offset: offset to iblanking values (one for each node), or None if not iblanked
+        ghost_flags_offset: offset to ghost flags (one for each cell), or None if there are none
+    """
+    block_type: str = "curvilinear"
+    dims: Tuple[int, int, int] = (1, 1, 1)
+    coordinates_offset: int = 0
+    iblanks_offset: Optional[int] = None
+    ghost_flags_offset: Optional[int] = None
+
+    @property
+    def dimension(self) -> int:
+        """Number of axes with more than one node"""
+        return sum(n > 1 for n in self.dims)
+
+    @property
+    def cell_dims(self) -> Tuple[int, int, int]:
+        return tuple(max(n - 1, 1) for n in self.dims)
+
+    @property
+    def number_of_cells(self) -> int:
+        ci, cj, ck = self.cell_dims
+        return ci * cj * ck
+
+    @property
+    def number_of_elements(self) -> int:
+        return self.number_of_cells
+
+    def is_volume(self) -> bool:
+        return self.dimension == 3
+
+    def is_surface(self) -> bool:
+        return self.dimension == 2
+
+    def read_axis_coordinates(self, fp: BinaryIO) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return coordinates of nodes along I, J and K axes (for rectilinear and uniform blocks)"""
+        ni, nj, nk = self.dims
+        fp.seek(self.coordinates_offset)
+        if self.block_type == "rectilinear":
+            values = _read_array(fp, ni + nj + nk, np.float32)
+            return values[:ni], values[ni:ni+nj], values[ni+nj:]
+        elif self.block_type == "uniform":
+            origin_and_delta = _read_array(fp, 6, np.float32)
+            return tuple(origin_and_delta[c] + origin_and_delta[3+c] * np.arange(n, dtype=np.float32)
+                         for c, n in enumerate(self.dims))
+        raise ValueError("Curvilinear block has no axis coordinates")
+
+    def read_nodes(self, fp: BinaryIO, node_index: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Read node coordinates for this part (or given nodes only)
+
+        Returns:
+            2D ``(n, 3)`` array of float32 with node coordinates
+        """
+        if self.block_type == "curvilinear":
+            fp.seek(self.coordinates_offset)
+            arr = _read_array(fp, 3*self.number_of_nodes, np.float32).reshape((self.number_of_nodes, 3), order="F")
+            return arr if node_index is None else arr[node_index]
+
+        # nodes of rectilinear and uniform blocks are computed from their I, J, K indices
+        ni, nj, _ = self.dims
+        if node_index is None:
+            node_index = np.arange(self.number_of_nodes, dtype=np.int64)
+        i, j, k = node_index % ni, (node_index // ni) % nj, node_index // (ni * nj)
+        xs, ys, zs = self.read_axis_coordinates(fp)
+        return np.stack([xs[i], ys[j], zs[k]], axis=1)
+
+    @classmethod
+    def from_block(cls, fp: BinaryIO, node_id_handling: IdHandling, element_id_handling: IdHandling,
+                  changing_geometry: Optional[ChangingGeometry], offset: int, part_id: int,
+                  part_name: str) -> "StructuredPart":
+        """Parse structured part, ``fp`` is positioned at its ``block`` line"""
+        block_line = _read_line(fp)
+        keywords = block_line.rstrip("\x00 ").split()[1:]
+        block_types = [keyword for keyword in keywords if keyword in BLOCK_TYPES]
+        if "range" in keywords:
+            raise EnsightReaderError(f"'block range' is not supported (part id {part_id})", fp)
+        unknown_keywords = set(keywords) - set(BLOCK_TYPES) - {"iblanked", "with_ghost"}
+        if unknown_keywords or len(block_types) > 1:
+            raise EnsightReaderError(f"Unexpected 'block' line: {block_line!r}", fp)
+        block_type = block_types[0] if block_types else "curvilinear"
+
+        dims = tuple(int(n) for n in _read_array(fp, 3, np.int32))
+        if any(n < 1 for n in dims):
+            raise EnsightReaderError(f"Bad dimensions of structured part id {part_id}: {dims}", fp)
+        number_of_nodes = dims[0] * dims[1] * dims[2]
+
+        coordinates_offset = fp.tell()
+        if block_type == "curvilinear":
+            fp.seek(3 * number_of_nodes * FLOAT_SIZE, os.SEEK_CUR)
+        elif block_type == "rectilinear":
+            fp.seek(sum(dims) * FLOAT_SIZE, os.SEEK_CUR)
+        else:
+            fp.seek(6 * FLOAT_SIZE, os.SEEK_CUR)
+
+        iblanks_offset = None
+        if "iblanked" in keywords:
+            iblanks_offset = fp.tell()
+            fp.seek(number_of_nodes * INT_SIZE, os.SEEK_CUR)
+
+        part = cls(
+            offset=offset,
+            part_id=part_id,
+            part_name=part_name,
+            number_of_nodes=number_of_nodes,
+            element_blocks=[],
+            node_id_handling=node_id_handling,
+            element_id_handling=element_id_handling,
+            changing_geometry=changing_geometry,
+            block_type=block_type,
+            dims=dims,
+            coordinates_offset=coordinates_offset,
+            iblanks_offset=iblanks_offset,
+        )
+
+        # optional sections, up to the next part
+        file_len = os.fstat(fp.fileno()).st_size
+        while fp.tell() != file_len:
+            line = _peek_line(fp)
+            if line.startswith("part"):
+                break
+            _read_line(fp)
+            if line.startswith("ghost_flags"):
+                part.ghost_flags_offset = fp.tell()
+                fp.seek(part.number_of_cells * INT_SIZE, os.SEEK_CUR)
+            elif line.startswith("node_ids"):
+                fp.seek(number_of_nodes * INT_SIZE, os.SEEK_CUR)
+            elif line.startswith("element_ids"):
+                fp.seek(part.number_of_cells * INT_SIZE, os.SEEK_CUR)
+            else:
+                raise EnsightReaderError(f"Unexpected line in structured part id {part_id}: {line!r}", fp)
+
+        return part
+
+
+def is_structured_part(part: GeometryPart) -> bool:
+    return isinstance(part, StructuredPart)
+
+
+def read_geometry_file(file_path: str, changing_geometry_per_part: bool) -> EnsightGeometryFile:
+    """Parse EnSight Gold geometry file, which may contain both unstructured and structured parts"""
+    extents = None
+    parts: Dict[int, GeometryPart] = {}
+
+    with open(file_path, "rb") as fp:
+        file_len = os.fstat(fp.fileno()).st_size
+
+        first_line = _read_line(fp)
+        if not first_line.lower().startswith("c binary"):
+            raise EnsightReaderError("Only 'C Binary' files are supported", fp)
+        description_line1 = _read_line(fp)
+        description_line2 = _read_line(fp)
+
+        m = re.match(r"node id ([a-z]+)", _read_line(fp))
+        if not m:
+            raise EnsightReaderError("Unexpected 'node id' line", fp)
+        node_id_handling = IdHandling(m.group(1))
+        m = re.match(r"element id ([a-z]+)", _read_line(fp))
+        if not m:
+            raise EnsightReaderError("Unexpected 'element id' line", fp)
+        element_id_handling = IdHandling(m.group(1))
+
+        if fp.tell() != file_len and _peek_line(fp).startswith("extents"):
+            _read_line(fp)
+            extents = _read_array(fp, 6, np.float32).copy()
+
+        while fp.tell() != file_len:
+            offset = fp.tell()
+            part_line = _read_line(fp)
+            if not part_line.startswith("part"):
+                raise EnsightReaderError("Expected 'part' line", fp)
+            part_id = int(_read_array(fp, 1, np.int32)[0])
+            part_name = _read_line(fp).rstrip("\x00 ")
+            if _peek_line(fp).startswith("block"):
+                changing_geometry = None
+                if changing_geometry_per_part:
+                    changing_geometry = next((value for value in ChangingGeometry if value.value in part_line), None)
+                    if changing_geometry is None:
+                        raise EnsightReaderError("Expected no_change/coord_change/conn_change in 'part' line", fp)
+                part = StructuredPart.from_block(fp, node_id_handling, element_id_handling, changing_geometry,
+                                                 offset, part_id, part_name)
+            else:
+                fp.seek(offset)
+                part = GeometryPart.from_file(fp, node_id_handling=node_id_handling,
+                                              element_id_handling=element_id_handling,
+                                              changing_geometry_per_part=changing_geometry_per_part)
+            if part.part_id in parts:
+                raise EnsightReaderError(f"Duplicate part id: {part.part_id}", fp)
+            parts[part.part_id] = part
+
+    return EnsightGeometryFile(
+        file_path=str(file_path),
+        description_line1=description_line1,
+        description_line2=description_line2,
+        node_id_handling=node_id_handling,
+        element_id_handling=element_id_handling,
+        extents=extents,
+        parts=parts,
+        changing_geometry_per_part=changing_geometry_per_part,
+    )
+
+
+def read_variable_file(file_path: str, variable_name: str, variable_location: VariableLocation,
+                       variable_type: VariableType, geofile: EnsightGeometryFile) -> EnsightVariableFile:
+    """
+    Parse EnSight Gold variable file for geometry with structured parts
+
+    Data of structured parts is preceded by ``block`` line instead of ``coordinates``
+    or element type line. Per-element data of structured parts has no entry
+    in ``part_element_offsets``, it's read with `read_structured_element_data()`.
+    """
+    part_offsets: Dict[int, int] = {}
+    part_element_offsets: Dict[Tuple[int, ElementType], int] = {}
+    part_per_node_undefined_values: Dict[int, float] = {}
+    part_per_element_undefined_values: Dict[Tuple[int, ElementType], float] = {}
+    k = VALUES_FOR_VARIABLE_TYPE[variable_type]
+
+    with open(file_path, "rb") as fp:
+        file_len = os.fstat(fp.fileno()).st_size
+        description_line = _read_line(fp)
+
+        while fp.tell() != file_len:
+            part_offset = fp.tell()
+            part_line = _read_line(fp)
+            if not part_line.startswith("part"):
+                raise EnsightReaderError(f"Expected 'part' line, got: {part_line!r}", fp)
+            part_id = int(_read_array(fp, 1, np.int32)[0])
+            part = geofile.parts.get(part_id)
+            if part is None:
+                raise EnsightReaderError(f"Variable file has data for part id {part_id}, "
+                                         f"but this part is not in geofile {geofile.file_path}", fp)
+            if part_id in part_offsets:
+                raise EnsightReaderError(f"Duplicate definition of part id {part_id}", fp)
+            part_offsets[part_id] = part_offset
+
+            if is_structured_part(part):
+                block_line = _read_line(fp)
+                if not block_line.startswith("block"):
+                    raise EnsightReaderError(f"Expected 'block' line, got: {block_line!r}", fp)
+                if "partial" in block_line:
+                    raise EnsightReaderError(f"'block partial' is not supported (part id {part_id})", fp)
+                undefined_value = None
+                if "undef" in block_line:
+                    undefined_value = float(_read_array(fp, 1, np.float32)[0])
+                if variable_location == VariableLocation.PER_NODE:
+                    if undefined_value is not None:
+                        part_per_node_undefined_values[part_id] = undefined_value
+                    fp.seek(part.number_of_nodes * k * FLOAT_SIZE, os.SEEK_CUR)
+                else:
+                    fp.seek(part.number_of_cells * k * FLOAT_SIZE, os.SEEK_CUR)
+            elif variable_location == VariableLocation.PER_NODE:
+                coordinates_line = _read_line(fp)
+                if not coordinates_line.startswith("coordinates"):
+                    raise EnsightReaderError(f"Expected 'coordinates' line, got: {coordinates_line!r}", fp)
+                if "undef" in coordinates_line:
+                    part_per_node_undefined_values[part_id] = float(_read_array(fp, 1, np.float32)[0])
+                elif "partial" in coordinates_line:
+                    raise EnsightReaderError(f"'coordinates partial' is not supported (part id {part_id})", fp)
+                fp.seek(part.number_of_nodes * k * FLOAT_SIZE, os.SEEK_CUR)
+            else:
+                while fp.tell() != file_len:
+                    part_element_offset = fp.tell()
+                    element_type_line = _peek_line(fp)
+                    if element_type_line.startswith("part"):
+                        break
+                    _read_line(fp)
+                    try:
+                        element_type = ElementType.parse_from_line(element_type_line)
+                    except ValueError as e:
+                        raise EnsightReaderError("Bad element type", fp) from e
+                    if "undef" in element_type_line:
+                        part_per_element_undefined_values[part_id, element_type] = \
+                            float(_read_array(fp, 1, np.float32)[0])
+                    elif "partial" in element_type_line:
+                        raise EnsightReaderError(f"'element_type partial' is not supported (part id {part_id})", fp)
+                    blocks = [block for block in part.element_blocks if block.element_type == element_type]
+                    if len(blocks) != 1:
+                        raise EnsightReaderError(f"Variable file has data for part id {part_id}, element type"
+                                                 f" {element_type}, which is not in geofile {geofile.file_path}"
+                                                 f" exactly once", fp)
+                    part_element_offsets[part_id, element_type] = part_element_offset
+                    fp.seek(blocks[0].number_of_elements * k * FLOAT_SIZE, os.SEEK_CUR)
+
+    return EnsightVariableFile(
+        file_path=str(file_path),
+        description_line=description_line,
+        variable_name=variable_name,
+        variable_location=variable_location,
+        variable_type=variable_type,
+        part_offsets=part_offsets,
+        part_element_offsets=part_element_offsets,
+        geometry_file=geofile,
+        part_per_node_undefined_values=part_per_node_undefined_values,
+        part_per_element_undefined_values=part_per_element_undefined_values,
+    )
+
+
+def read_structured_element_data_header(variable: EnsightVariableFile, part: StructuredPart,
+                                        fp: BinaryIO) -> Optional[Tuple[int, Optional[float]]]:
+    """
+    Return ``(offset, undefined_value)`` of per-element values of structured part
+
+    Returns None if the variable is not defined for the part.
+    """
+    offset = variable.part_offsets.get(part.part_id)
+    if offset is None:
+        return None
+    # 'part' line, part number, 'block' line, undefined value
+    fp.seek(offset + LINE_SIZE + INT_SIZE)
+    offset += 2*LINE_SIZE + INT_SIZE
+    undefined_value = None
+    if "undef" in _read_line(fp):
+        undefined_value = float(_read_array(fp, 1, np.float32)[0])
+        offset += FLOAT_SIZE
+    return offset, undefined_value
+
+
+def _fill_wildcard(filename: str, value: int) -> str:
+    return re.sub(r"\*+", lambda m: str(value).zfill(len(m.group(0))), filename, count=1)
+
+
+@dataclass
+class StructuredGeometryFileSet(EnsightGeometryFileSet):
+    """`EnsightGeometryFileSet` giving geometry files parsed by `read_geometry_file()`"""
+
+    def read_file(self, timestep: int = 0) -> EnsightGeometryFile:
+        """
+        Parse geometry file of given time step without caching it (unlike `get_file()`)
+
+        This is safe to call from multiple threads, the cache of `get_file()` is a plain dict.
+        """
+        return self._get_file(timestep)
+
+    def _get_file(self, timestep: int = 0) -> EnsightGeometryFile:
+        if self.timeset is None:
+            timestep_filename = self.filename
+        else:
+            timestep_filename = _fill_wildcard(self.filename, self.timeset.filename_numbers[timestep])
+        return read_geometry_file(op.join(self.casefile_dir_path, timestep_filename),
+                                  changing_geometry_per_part=self.changing_geometry_per_part)
+
+
+@dataclass
+class StructuredVariableFileSet(EnsightVariableFileSet):
+    """`EnsightVariableFileSet` giving variable files parsed by `read_variable_file()` if there are structured parts"""
+
+    def _get_file(self, timestep: int = 0, geofile: Optional[EnsightGeometryFile] = None) -> EnsightVariableFile:
+        geofile_ = geofile if geofile is not None else self.get_geofile_for_timestep(timestep)
+        if not any(is_structured_part(part) for part in geofile_.parts.values()):
+            return super()._get_file(timestep, geofile_)
+
+        if self.timeset is None:
+            timestep_filename = self.filename
+        else:
+            timestep_filename = _fill_wildcard(self.filename, self.timeset.filename_numbers[timestep])
+        return read_variable_file(op.join(self.casefile_dir_path, timestep_filename),
+                                  variable_name=self.variable_name, variable_location=self.variable_location,
+                                  variable_type=self.variable_type, geofile=geofile_)
+
+
+def _copy_as(obj, cls, **changes):
+    values = {f.name: getattr(obj, f.name) for f in fields(obj)}
+    values.update(changes)
+    return cls(**values)
+
+
+def read_case(path: str) -> EnsightCaseFile:
+    """Read EnSight Gold case (like `ensightreader.read_case()`), supporting structured parts"""
+    case = ensightreader.read_case(path)
+    case.geometry_model = _copy_as(case.geometry_model, StructuredGeometryFileSet)
+    case.variables = {name: _copy_as(variable, StructuredVariableFileSet, geometry_model=case.geometry_model)
+                      for name, variable in case.variables.items()}
+    return case
+
+
+# -----------------------------------------------------------------------------
+# Surfaces of structured blocks
+# - quads are generated for a plane of nodes from strides of the node numbering;
+#   volume cells are never built, 3D blocks only give their boundary (or a single plane)
+# -----------------------------------------------------------------------------
+
+def _get_plane_quads(dims: Tuple[int, int, int], axis: int, index: int,
+                     flip: bool) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return quads of plane of nodes with given index along given axis and the cell of each quad
+
+    Quads are oriented so that their normal points along the axis (against it if ``flip``),
+    for right-handed grids.
+    """
+    u, v = (axis + 1) % 3, (axis + 2) % 3
+    node_strides = (1, dims[0], dims[0] * dims[1])
+    cell_dims = tuple(max(n - 1, 1) for n in dims)
+    cell_strides = (1, cell_dims[0], cell_dims[0] * cell_dims[1])
+    nu, nv = dims[u] - 1, dims[v] - 1
+
+    base = (index * node_strides[axis] + np.arange(nv, dtype=np.int64)[:, np.newaxis] * node_strides[v]
+            + np.arange(nu, dtype=np.int64)[np.newaxis, :] * node_strides[u]).ravel()
+    su, sv = node_strides[u], node_strides[v]
+    corners = [base, base + sv, base + su + sv, base + su] if flip else [base, base + su, base + su + sv, base + sv]
+    quads = np.stack(corners, axis=1).astype(np.int32)
+
+    cell_index = (min(index, cell_dims[axis] - 1) * cell_strides[axis]
+                  + np.arange(nv, dtype=np.int64)[:, np.newaxis] * cell_strides[v]
+                  + np.arange(nu, dtype=np.int64)[np.newaxis, :] * cell_strides[u]).ravel().astype(np.int32)
+    return quads, cell_index
+
+
+def get_structured_faces(dims: Tuple[int, int, int], surface: str = "BOUNDARY",
+                         plane_index: int = 0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Return connectivity of surface of structured block with given dimensions
+
+    2D blocks give all their quads, 1D blocks their line segments. 3D blocks give quads of their
+    six boundary faces (``surface="BOUNDARY"``) or of one plane of nodes (``surface`` is ``"I"``, ``"J"``
+    or ``"K"``, ``plane_index`` counts from the end if negative and must be within the block).
+
+    Returns:
+        tuple ``(quads, edges, cell_index)``, ``quads`` is ``(n, 4)`` int32 array of nodes (numbered from 0),
+        ``edges`` is ``(m, 2)`` int32 array of nodes, ``cell_index`` gives cell for each quad (or edge,
+        if there are no quads)
+    """
+    no_quads = np.empty((0, 4), dtype=np.int32)
+    no_edges = np.empty((0, 2), dtype=np.int32)
+    axes = [axis for axis, n in enumerate(dims) if n > 1]
+
+    if len(axes) == 0:
+        return no_quads, no_edges, np.empty((0,), dtype=np.int32)
+    elif len(axes) == 1:
+        axis = axes[0]
+        stride = (1, dims[0], dims[0] * dims[1])[axis]
+        start = np.arange(dims[axis] - 1, dtype=np.int32) * stride
+        return no_quads, np.stack([start, start + stride], axis=1), np.arange(dims[axis] - 1, dtype=np.int32)
+    elif len(axes) == 2:
+        flat_axis = next(axis for axis in range(3) if axis not in axes)
+        quads, cell_index = _get_plane_quads(dims, flat_axis, 0, flip=False)
+        return quads, no_edges, cell_index
+
+    if surface in PLANE_AXES:
+        axis = PLANE_AXES[surface]
+        index = plane_index + dims[axis] if plane_index < 0 else plane_index
+        if not 0 <= index < dims[axis]:
+            raise ValueError(f"plane {surface}={plane_index} is outside of block with {dims[axis]} nodes"
+                             f" along {surface}")
+        quads, cell_index = _get_plane_quads(dims, axis, index, flip=False)
+        return quads, no_edges, cell_index
+
+    faces = [_get_plane_quads(dims, axis, index, flip=index == 0)
+             for axis in range(3) for index in (0, dims[axis] - 1)]
+    return (np.concatenate([quads for quads, _ in faces]), no_edges,
+            np.concatenate([cell_index for _, cell_index in faces]))
@@ -0,0 +1,72 @@
+# Copyright (c) 2022 Tomas Karabela
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Time steps of cases whose geometry and variables have different time sets
+
+Time step of the case (the one imported, animated or converted by the batch script) is an index
+into the time set with the most steps. Files with another time set use their last time step at or
+before its time value (or their first one), files without time set are the same in all time steps.
+
+This doesn't need Blender, so that the batch script can use it outside of Blender.
+
+"""
+
+import bisect
+from typing import Optional
+
+from .ensightreader import EnsightCaseFile, EnsightGeometryFile, EnsightVariableFile, Timeset
+
+
+def get_case_timeset(case: EnsightCaseFile) -> Optional[Timeset]:
+    """Return time set with the most steps, or None if the case is not transient"""
+    timesets = [case.geometry_model.timeset] + [variable.timeset for variable in case.variables.values()]
+    return max([timeset for timeset in timesets if timeset is not None],
+               key=lambda timeset: timeset.number_of_steps, default=None)
+
+
+def get_number_of_timesteps(case: EnsightCaseFile) -> int:
+    case_timeset = get_case_timeset(case)
+    return case_timeset.number_of_steps if case_timeset is not None else 1
+
+
+def get_file_timestep(case: EnsightCaseFile, timeset: Optional[Timeset], timestep: int) -> int:
+    """Return time step of file with given time set matching time step of the case"""
+    if timeset is None:
+        return 0
+    case_timeset = get_case_timeset(case)
+    timestep = min(max(timestep, 0), case_timeset.number_of_steps - 1)
+    if timeset.timeset_id == case_timeset.timeset_id:
+        return timestep
+    time_value = case_timeset.time_values[timestep]
+    return min(max(bisect.bisect_right(timeset.time_values, time_value) - 1, 0), timeset.number_of_steps - 1)
+
+
+def get_geometry_file(case: EnsightCaseFile, timestep: int) -> EnsightGeometryFile:
+    """Return geometry file for time step of the case (like ``case.get_geometry_model()``)"""
+    return case.get_geometry_model(get_file_timestep(case, case.geometry_model.timeset, timestep))
+
+
+def get_variable_file(case: EnsightCaseFile, name: str, timestep: int) -> EnsightVariableFile:
+    """Return variable file for time step of the case (like ``case.get_variable()``)"""
+    variable = case.variables[name]
+    # ensightreader can't tell which geometry file belongs to variable with another time set
+    return variable.get_file(get_file_timestep(case, variable.timeset, timestep),
+                             geofile=get_geometry_file(case, timestep))
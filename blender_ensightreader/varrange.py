@@ -0,0 +1,217 @@
+# Copyright (c) 2022 Tomas Karabela
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Streaming min/max of variables, for setting the palette range
+
+Values are reduced chunk by chunk straight from a memory map of the variable file,
+so that nothing is decoded into full arrays and time steps can be scanned without
+importing them. For vectors, the range of magnitude is computed; undefined values
+(``coordinates undef`` / ``element_type undef``) are skipped.
+
+Ranges are cached for each variable file and part (keyed by file path, size and modification time),
+in memory and optionally as a JSON file for each case in the cache directory.
+
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import os.path as op
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from .ensightreader import EnsightVariableFile, VariableLocation, VariableType
+from .structured import is_structured_part, read_structured_element_data_header
+from .cache import SessionMemory
+
+# values reduced at once; keeps temporary arrays small enough for the CPU cache
+CHUNK_SIZE = 1 << 16
+
+# header of the data in variable file: 'part' line, part number and 'coordinates' line
+NODE_DATA_HEADER_SIZE = 80 + 4 + 80
+# header of the data of one element block: element type line
+ELEMENT_DATA_HEADER_SIZE = 80
+
+RANGE_CACHE_FORMAT_VERSION = 1
+
+ValueRange = Tuple[float, float]  # (min, max); min > max if there are no values
+
+
+def is_range_supported(variable: EnsightVariableFile) -> bool:
+    return variable.variable_type in (VariableType.SCALAR, VariableType.VECTOR)
+
+
+def reduce_range(ranges: Iterable[ValueRange]) -> ValueRange:
+    """Combine ranges into one (empty ranges are ignored)"""
+    low, high = np.inf, -np.inf
+    for range_low, range_high in ranges:
+        low = min(low, range_low)
+        high = max(high, range_high)
+    return float(low), float(high)
+
+
+def is_empty_range(value_range: ValueRange) -> bool:
+    return value_range[0] > value_range[1]
+
+
+def _get_data_blocks(variable: EnsightVariableFile, part_id: int,
+                     mm: mmap.mmap) -> List[Tuple[int, int, Optional[float]]]:
+    """Return ``(offset, number_of_values, undefined_value)`` for each data block of the part"""
+    part = variable.geometry_file.parts.get(part_id)
+    if part is None:
+        return []
+
+    if variable.variable_location == VariableLocation.PER_NODE:
+        offset = variable.part_offsets.get(part_id)
+        if offset is None:
+            return []
+        undefined_value = variable.part_per_node_undefined_values.get(part_id)
+        header_size = NODE_DATA_HEADER_SIZE + (4 if undefined_value is not None else 0)
+        return [(offset + header_size, part.number_of_nodes, undefined_value)]
+    elif is_structured_part(part):
+        header = read_structured_element_data_header(variable, part, mm)
+        if header is None:
+            return []
+        offset, undefined_value = header
+        return [(offset, part.number_of_cells, undefined_value)]
+    else:
+        blocks = []
+        for element_type in variable.iter_part_id_element_types(part_id):
+            offset = variable.part_element_offsets[part_id, element_type]
+            undefined_value = variable.part_per_element_undefined_values.get((part_id, element_type))
+            header_size = ELEMENT_DATA_HEADER_SIZE + (4 if undefined_value is not None else 0)
+            blocks.append((offset + header_size, part.get_number_of_elements_of_type(element_type),
+                           undefined_value))
+        return blocks
+
+
+def _reduce_block(mm: mmap.mmap, offset: int, n: int, k: int, undefined_value: Optional[float]) -> ValueRange:
+    """Range of block of ``n`` values with ``k`` components (stored one component after another)"""
+    low, high = np.inf, -np.inf
+    for start in range(0, n, CHUNK_SIZE):
+        count = min(CHUNK_SIZE, n - start)
+        components = [np.frombuffer(mm, dtype=np.float32, count=count, offset=offset + 4*(c*n + start))
+                      for c in range(k)]
+
+        if k == 1:
+            values = components[0]
+        else:
+            # compare squared magnitudes, sqrt is only taken of the result
+            values = np.square(components[0])
+            for component in components[1:]:
+                values += np.square(component)
+
+        if undefined_value is not None:
+            defined = components[0] != undefined_value
+            for component in components[1:]:
+                defined &= component != undefined_value
+            values = values[defined]
+        if values.shape[0] == 0:
+            continue
+
+        low = min(low, float(values.min()))
+        high = max(high, float(values.max()))
+
+    if k > 1 and low <= high:
+        low, high = float(np.sqrt(low)), float(np.sqrt(high))
+    return low, high
+
+
+def compute_variable_part_range(variable: EnsightVariableFile, part_id: int, mm: mmap.mmap) -> ValueRange:
+    """Return range of variable (magnitude for vectors) for given part, ``mm`` being map of the variable file"""
+    k = 3 if variable.variable_type == VariableType.VECTOR else 1
+    return reduce_range(_reduce_block(mm, offset, n, k, undefined_value)
+                        for offset, n, undefined_value in _get_data_blocks(variable, part_id, mm))
+
+
+class VariableRangeCache:
+    """
+    Ranges of variables for each variable file and part
+
+    This can be used from multiple threads at once. If directory is given, ranges are
+    loaded from and saved to ``ranges-<hash of case path>.json`` there.
+    """
+
+    # ranges computed in this Blender session, shared by all caches
+    _memory = SessionMemory(max_entries=100_000)
+
+    def __init__(self, case_path: str, directory: Optional[str] = None):
+        self.file_path = None
+        self._entries: Dict[str, ValueRange] = {}
+        self._modified = False
+        self._lock = threading.Lock()
+
+        if directory:
+            case_hash = hashlib.sha1(op.abspath(case_path).encode("utf-8")).hexdigest()
+            self.file_path = op.join(directory, f"ranges-{case_hash}.json")
+            try:
+                with open(self.file_path, encoding="utf-8") as fp:
+                    data = json.load(fp)
+                if data.get("version") == RANGE_CACHE_FORMAT_VERSION:
+                    self._entries = {key: tuple(value) for key, value in data["ranges"].items()}
+            except (OSError, ValueError, KeyError):
+                pass
+
+    @staticmethod
+    def get_file_key(variable: EnsightVariableFile) -> str:
+        st = os.stat(variable.file_path)
+        return f"{op.abspath(variable.file_path)}|{st.st_size}|{st.st_mtime_ns}"
+
+    def get_variable_range(self, variable: EnsightVariableFile, part_ids: Iterable[int]) -> ValueRange:
+        """Return range of variable over given parts, reading the variable file only if needed"""
+        file_key = self.get_file_key(variable)
+        keys = {part_id: f"{file_key}|{part_id}" for part_id in part_ids}
+        ranges = {}
+        for part_id, key in keys.items():
+            value_range = self._memory.get(key)
+            if value_range is None:
+                with self._lock:
+                    value_range = self._entries.get(key)
+            if value_range is not None:
+                ranges[part_id] = value_range
+
+        missing_part_ids = [part_id for part_id in keys if part_id not in ranges]
+        if missing_part_ids:
+            with open(variable.file_path, "rb") as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for part_id in missing_part_ids:
+                    ranges[part_id] = compute_variable_part_range(variable, part_id, mm)
+
+            with self._lock:
+                for part_id in missing_part_ids:
+                    self._memory.put(keys[part_id], ranges[part_id])
+                    self._entries[keys[part_id]] = ranges[part_id]
+                self._modified = True
+
+        return reduce_range(ranges.values())
+
+    def save(self):
+        if self.file_path is None or not self._modified:
+            return
+        os.makedirs(op.dirname(self.file_path), exist_ok=True)
+        tmp_path = f"{self.file_path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(tmp_path, "w", encoding="utf-8") as fp:
+            # empty ranges have infinite bounds, which are written as Infinity (this loads back fine)
+            json.dump({"version": RANGE_CACHE_FORMAT_VERSION,
+                       "ranges": {key: [float(low), float(high)] for key, (low, high) in self._entries.items()}},
+                      fp)
+        os.replace(tmp_path, self.file_path)
+        self._modified = False